@@ -0,0 +1,112 @@
+"""
+Work-precision benchmark of the integrators and time steps on the box,
+tetrahedron and 1D rigs (simulators/work_precision.py): a table of the
+error metrics and wall times of every configuration against a reference
+run, a plot of error vs. wall time per rig, and the cheapest
+configuration that meets the targets. Examples:
+    python benchmark_integrators.py
+    python benchmark_integrators.py --rigs box 1D --dts 0.01 0.005 0.002 \\
+        --target max_error=1e-3 --target slack_timing_error=0.01 \\
+        --csv work_precision.csv --plot work_precision.png
+"""
+
+# need to do linear alg
+import numpy as np
+import argparse
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from simulators import rigs
+from simulators import integrators
+from simulators import work_precision
+
+# name -> (rig, initial conditions, t_end): the scripts' runs (the 1D
+# results plots go to 5 s.)
+def get_rigs():
+    return {'box':(rigs.box_rig(), rigs.box_initial_conditions, 2.0),
+            'tetrahedron':(rigs.tetrahedron_rig(), rigs.tetrahedron_initial_conditions, 2.0),
+            '1D':(rigs.one_d_rig(), rigs.one_d_initial_conditions, 5.0)}
+
+# A helper: 'metric=value' -> (metric, value).
+def parse_target(text):
+    metric, _, value = text.partition('=')
+    if metric not in work_precision.METRICS:
+        raise argparse.ArgumentTypeError('Unknown metric ' + metric + ', use one of '
+                                         + ', '.join(work_precision.METRICS) + '.')
+    return metric, float(value)
+
+# Error vs. wall time, one row of axes per rig and one column per metric,
+# one line per integrator through its time steps.
+def plot_work_precision(rows, metrics, filename):
+    names = list(dict.fromkeys(row['rig'] for row in rows))
+    fig, axes = plt.subplots(len(names), len(metrics), squeeze=False,
+                             figsize=(4 * len(metrics), 3.5 * len(names)))
+    for r, name in enumerate(names):
+        for c, metric in enumerate(metrics):
+            ax = axes[r, c]
+            for method in integrators.INTEGRATORS:
+                points = [row for row in rows if row['rig'] == name
+                          and row['integrator'] == method]
+                if len(points) == 0:
+                    continue
+                # log axes: zeros (e.g. no events missed) sit at the bottom.
+                err = np.array([row[metric] for row in points], dtype=float)
+                ax.loglog([row['wall_time'] for row in points], np.maximum(err, 1E-16),
+                          'o-', label=method)
+            ax.set(xlabel='Wall time (s)', ylabel=metric, title=name)
+            ax.grid(True, which='both', alpha=0.3)
+    axes[0, 0].legend()
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+if __name__ == '__main__':
+    all_rigs = get_rigs()
+    parser = argparse.ArgumentParser(description='Work-precision benchmark of the integrators.')
+    parser.add_argument('--rigs', nargs='+', default=list(all_rigs), choices=list(all_rigs))
+    parser.add_argument('--integrators', nargs='+', default=list(integrators.INTEGRATORS),
+                        choices=list(integrators.INTEGRATORS))
+    parser.add_argument('--dts', nargs='+', type=float, default=[0.01, 0.005, 0.002, 0.001],
+                        help='time steps (s), each dividing the largest one')
+    parser.add_argument('--t-end', type=float, default=None,
+                        help='simulated time (s) (default per rig: 2, 2, 5)')
+    parser.add_argument('--reference-dt', type=float, default=None,
+                        help='rk4 reference step (default: a tenth of the smallest dt)')
+    parser.add_argument('--repeats', type=int, default=3, help='timing runs, best is kept')
+    parser.add_argument('--target', type=parse_target, action='append', default=None,
+                        help='metric=value to meet (default: max_error=1e-3 and '
+                             + 'slack_timing_error=0.01)')
+    parser.add_argument('--csv', default=None, help='write the table here')
+    parser.add_argument('--plot', default='work_precision.png', help='write the plot here')
+    args = parser.parse_args()
+    targets = dict(args.target) if args.target is not None else \
+              {'max_error':1E-3, 'slack_timing_error':0.01}
+
+    rows = []
+    for name in args.rigs:
+        rig, ics, t_end = all_rigs[name]
+        if args.t_end is not None:
+            t_end = args.t_end
+        pos0 = np.array([pos for pos, _ in ics.values()])
+        vel0 = np.array([vel for _, vel in ics.values()])
+        bench = work_precision.WorkPrecision(rig, pos0, vel0, t_end, dts=args.dts,
+                                             methods=args.integrators,
+                                             reference_dt=args.reference_dt,
+                                             repeats=args.repeats, name=name)
+        rows += bench.run(verbose=True)
+        print(name + ': reference ' + bench.reference + ' at dt = ' + str(bench.reference_dt) + ', its own '
+              + 'max_error ~ ' + '{:.2g}'.format(bench.reference_error['max_error'])
+              + ' m, slack_timing_error ~ '
+              + '{:.2g}'.format(bench.reference_error['slack_timing_error']) + ' s')
+    work_precision.print_table(rows)
+    if args.csv is not None:
+        work_precision.save_table(rows, args.csv)
+    plot_work_precision(rows, ['max_error', 'slack_timing_error', 'V_drift'], args.plot)
+    print('Targets: ' + ', '.join(metric + ' <= ' + str(value)
+                                  for metric, value in targets.items()))
+    for name, row in work_precision.get_cheapest(rows, targets).items():
+        if row is None:
+            print(name + ': no configuration meets the targets.')
+        else:
+            print(name + ': cheapest is ' + row['integrator'] + ' at dt = ' + str(row['dt'])
+                  + ', ' + '{:.3g}'.format(row['wall_time']) + ' s')
@@ -11,15 +11,29 @@ class PointMass3D:
     # position/velocity (which an initial condition is assigned at 
     # time of instantiation.)
 
-    def __init__(self, m, g, initial_pos, initial_vel):
+    def __init__(self, m, g, initial_pos, initial_vel, contiguous=False):
         # just keep track of all these, nothing special (yet)
         # TO-DO: lots of checks here.
         self.m = m
         # IMPORTANT: we assume that 'g' is an absolute value.
         # example, pass in g = 9.8, NOT g = -9.8
         self.g = g
-        self.pos = initial_pos
-        self.vel = initial_vel
+        # With contiguous=True, the state lives in one preallocated 6-element
+        # buffer, and pos / vel are views into it. The setters then copy
+        # into the buffer instead of rebinding, and the out= arguments below
+        # let a simulation loop step without allocating any new arrays.
+        self.contiguous = contiguous
+        if contiguous:
+            self.state = np.zeros(6)
+            self.pos = self.state[0 : 3]
+            self.vel = self.state[3 : 6]
+            self.pos[:] = initial_pos
+            self.vel[:] = initial_vel
+            # scratch space for euler_step
+            self._scratch = np.zeros(6)
+        else:
+            self.pos = initial_pos
+            self.vel = initial_vel
 
     # Point masses can have their position/velocity assigned,
     # and can return their position/velocity and state (which is just the
@@ -31,7 +45,15 @@ class PointMass3D:
     def get_vel(self):
         return self.vel
 
-    def get_state(self):
+    # In contiguous mode with no 'out', this returns the state buffer itself
+    # (not a copy), so it changes when the state is set.
+    def get_state(self, out=None):
+        if out is not None:
+            out[0 : 3] = self.pos
+            out[3 : 6] = self.vel
+            return out
+        if self.contiguous:
+            return self.state
         return np.concatenate((self.pos, self.vel))
 
     # Kinetic and potential energy
@@ -48,16 +70,26 @@ class PointMass3D:
         # print(PE)
         return PE
 
+    # (in contiguous mode, these copy into the state buffer.)
     def set_pos(self, pos):
-        self.pos = pos
+        if self.contiguous:
+            self.pos[:] = pos
+        else:
+            self.pos = pos
 
     def set_vel(self, vel):
-        self.vel = vel
+        if self.contiguous:
+            self.vel[:] = vel
+        else:
+            self.vel = vel
 
     def set_state(self, state):
         # three dimensions
-        self.pos = state[0 : 3]
-        self.vel = state[3 : 6]
+        if self.contiguous:
+            self.state[:] = state
+        else:
+            self.pos = state[0 : 3]
+            self.vel = state[3 : 6]
 
     # "The Big One:"
     # Calculates the acceleration of this point mass given the 
@@ -70,12 +102,16 @@ class PointMass3D:
     # when you call this function!
     # Takes in a list of 1D ndarrays, each with three elements,
     # and returns a single 1D ndarray with three elements.
-    def calculate_accel(self, forces_list):
+    # (If 'out' is passed in, the acceleration is written there instead.)
+    def calculate_accel(self, forces_list, out=None):
         # The forces vectors are in R^3.
         # The helper function will sum them up:
-        sum_forces = self.calculate_sum_forces(forces_list)
+        sum_forces = self.calculate_sum_forces(forces_list, out=out)
         # Since linear algebra,
-        accel = (1 / (self.m)) * sum_forces
+        if out is None:
+            accel = (1 / (self.m)) * sum_forces
+        else:
+            accel = np.multiply(sum_forces, 1 / (self.m), out=out)
         # For the adding of gravity, we assume that the final dimension
         # is the direction of gravity.
         # E.g., in 3D, is -Z (if X,Y,Z).
@@ -87,9 +123,14 @@ class PointMass3D:
     # Takes in a list of forces and adds them element-wise
     # (this is \sum F).
     # The input is a list of 1D, three-element ndarrays
-    def calculate_sum_forces(self, forces_list):
-        # preallocate the sum.
-        sum_forces = np.zeros(3)
+    # (or equivalently, an ndarray with one force per row.)
+    def calculate_sum_forces(self, forces_list, out=None):
+        # preallocate the sum, or reuse the one passed in.
+        if out is None:
+            sum_forces = np.zeros(3)
+        else:
+            sum_forces = out
+            sum_forces.fill(0.)
         # iterate over the list of forces.
         for force in forces_list:
             # add this one
@@ -100,8 +141,24 @@ class PointMass3D:
     # A function to interface with the outside world:
     # Returns the \dot x for the point mass (e.g. the velocities
     # and accelerations.) Useful for doing forward integration.
-    def state_deriv(self, forces_list):
+    # Pass in a 6-element 'out' to have it filled instead of allocating.
+    def state_deriv(self, forces_list, out=None):
+        if out is not None:
+            out[0 : 3] = self.vel
+            # the acceleration goes straight into the second half.
+            self.calculate_accel(forces_list, out=out[3 : 6])
+            return out
         # get the acceleration
         accel = self.calculate_accel(forces_list)
         # concatenate to the velocities
         return np.concatenate((self.vel, accel))
+
+    # Forward Euler, in place: state(t+1) = state(t) + dt * state_deriv.
+    # Gives the same result as set_state(get_state() + dt * deriv),
+    # but without allocating when the point mass is contiguous.
+    def euler_step(self, deriv, dt):
+        if not self.contiguous:
+            self.set_state(self.get_state() + dt * deriv)
+            return
+        np.multiply(deriv, dt, out=self._scratch)
+        np.add(self.state, self._scratch, out=self.state)
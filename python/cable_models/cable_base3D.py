@@ -31,6 +31,8 @@ The superclass specifies inputs and outputs:
 from abc import ABC, abstractmethod
 # need to do linear alg
 import numpy as np
+# scalar square root, cheaper than the numpy one on a float
+import math
 
 # make it abstract
 class Cable3D(ABC):
@@ -61,7 +63,11 @@ class Cable3D(ABC):
     # n-dimensional space. Since scalar_force outputs a scalar.
     # Note that here, the position and velocity of the anchor need to be
     # passed in, so the unit vector can be calculated.
-    def force_3d(self, point_pos, point_vel, control_input):
+    # If a 3-element 'out' is passed in, the force vector is written there,
+    # and the length is only computed once (no new arrays are created.)
+    def force_3d(self, point_pos, point_vel, control_input, out=None):
+        if out is not None:
+            return self._force_3d_inplace(point_pos, point_vel, control_input, out)
         # first, get the current length and stretch rate
         ell = self.get_length(point_pos)
         # importantly, here, we need to dot velocity with \hat \bell,
@@ -74,6 +80,18 @@ class Cable3D(ABC):
         # and finally, dot the two.
         return unit_vec * Phi
 
+    # a helper for force_3d with 'out'. Same operations in the same order
+    # as the other path, so the results are identical.
+    def _force_3d_inplace(self, point_pos, point_vel, control_input, out):
+        # \ell_vec = r - b_i, then \ell = || \ell_vec ||
+        np.subtract(point_pos, self.anchor_pos, out=out)
+        ell = math.sqrt(np.dot(out, out))
+        # out becomes the unit vector \hat \ell
+        np.divide(out, ell, out=out)
+        dot_ell = np.dot(point_vel, out)
+        Phi = self.scalar_force(ell, dot_ell, control_input)
+        return np.multiply(out, Phi, out=out)
+
     # a helper. Gets the unit vector between the two anchors,
     # used for calculating the n-dimensional force (scalar times unit vec.)
     # and as part of the chain rule for velocity.
@@ -0,0 +1,33 @@
+"""
+Compare the cable force laws on a scenario file (simulators/scenarios.py):
+every initial condition under every law, in lockstep, with a table of how
+far each law's trajectories get from the reference law's (the first one.)
+See simulators/comparison.py. Example:
+    python compare_models.py scenarios/box.json --laws piecewise linear hybrid_split logistic
+"""
+
+import argparse
+from simulators import scenarios
+from simulators import comparison
+from simulators import force_laws
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare cable force laws on a scenario.')
+    parser.add_argument('scenario_file', help='scenario file (.json, .toml, .yaml)')
+    parser.add_argument('--laws', nargs='+', default=['piecewise', 'linear', 'hybrid_split',
+                                                      'logistic'],
+                        choices=force_laws.LAWS, help='force laws, the reference first')
+    parser.add_argument('--beta', type=float, default=5., help='logistic slope (default 5)')
+    parser.add_argument('--beta-0', type=float, default=0., help='logistic offset (default 0)')
+    parser.add_argument('--tol', type=float, default=1E-3,
+                        help='divergence (m) for time_to_tol (default 1e-3)')
+    args = parser.parse_args()
+
+    scenario = scenarios.load_scenario(args.scenario_file)
+    names, pos0, vel0 = scenario.get_ensemble()
+    comp = comparison.ModelComparison(scenario.rig, pos0, vel0, scenario.dt,
+                                      scenario.num_timesteps, laws=args.laws,
+                                      beta=args.beta, beta_0=args.beta_0,
+                                      equilibrium=scenario.equilibrium)
+    comp.run()
+    comp.print_report(names, tol=args.tol)
@@ -1,2 +1,2 @@
 # include everything from this directly.
-__all__ = ['linear']
+__all__ = ['linear', 'delay']
@@ -0,0 +1,132 @@
+# Delay lines for sensing and actuation latency.
+# Implements a fixed-capacity circular buffer of past signal values,
+# and a wrapper that puts one in front of / behind a SISO controller.
+
+# need to do linear alg
+import numpy as np
+
+class DelayLine:
+    # A ring buffer that returns what was pushed into it 'delay' samples ago.
+    # The signal can be a scalar, a vector (one entry per cable), or
+    # an array (e.g. ensemble members x cables): anything with a fixed shape.
+    # The delay is in samples (timesteps), can be fractional, and can differ
+    # per element, as long as it broadcasts against the signal shape.
+    # Fractional delays are linearly interpolated between the two
+    # neighboring samples.
+    # Everything is preallocated in the constructor, so push() and
+    # read(out=...) do not allocate.
+
+    def __init__(self, delay, shape=(), initial_value=None):
+        # The signal shape, as a tuple, for example (num_cables,)
+        # or (num_members, num_cables).
+        self.shape = tuple(int(n) for n in np.atleast_1d(shape)) if np.size(shape) > 0 else ()
+        self.size = int(np.prod(self.shape)) if len(self.shape) > 0 else 1
+        # Per-element delays, broadcast to the signal shape then flattened.
+        delay = np.broadcast_to(np.asarray(delay, dtype=float), self.shape)
+        if np.any(delay < 0):
+            raise Exception('Delays must be nonnegative (no lookahead), exiting.')
+        delay = np.ravel(delay)
+        # integer part and fractional part of the delay.
+        self.delay_int = np.floor(delay).astype(np.intp)
+        self.delay_frac = delay - self.delay_int
+        # if every delay is an integer, we can skip the second tap.
+        self.is_integer = not np.any(self.delay_frac > 0)
+        # We need the samples at delay_int and delay_int + 1 back from the
+        # newest one, so the capacity is the max integer delay plus two.
+        self.capacity = int(np.max(self.delay_int)) + 2
+        # The buffer itself. Row 'head' is the newest sample.
+        self.buffer = np.zeros((self.capacity, self.size))
+        # a flat view of the buffer, for gathering with np.take.
+        self._flat = self.buffer.reshape(-1)
+        self.head = 0
+        # 'None' means "fill with the first value that is pushed",
+        # i.e., assume the signal was constant before the start.
+        self.primed = False
+        if initial_value is not None:
+            self.reset(initial_value)
+        # Scratch arrays for read(), so that reading doesn't allocate.
+        # The element index of each entry within a row of the buffer:
+        self._elem = np.arange(self.size, dtype=np.intp)
+        self._idx = np.zeros(self.size, dtype=np.intp)
+        self._tap = np.zeros(self.size)
+        self._weight_old = self.delay_frac
+        self._weight_new = 1.0 - self.delay_frac
+        self._scalar_out = np.zeros(1)
+
+    # Fill the whole history with a single value (scalar or signal-shaped).
+    def reset(self, value):
+        self.buffer[:] = np.reshape(np.broadcast_to(value, self.shape), (self.size,))
+        self.head = 0
+        self.primed = True
+
+    # Add the newest sample. Overwrites the oldest one.
+    def push(self, value):
+        if not self.primed:
+            self.reset(value)
+            return
+        self.head += 1
+        if self.head == self.capacity:
+            self.head = 0
+        # assigns into the existing row (no new array.)
+        self.buffer[self.head] = np.reshape(value, (self.size,)) if np.ndim(value) > 1 else value
+
+    # A helper: gather the samples that are 'self.delay_int + extra' back,
+    # into 'out' (flat, length self.size.)
+    def _gather(self, extra, out):
+        # row index of each tap is (head - delay - extra) mod capacity,
+        # and then its flat index is row * size + element.
+        np.subtract(self.head - extra, self.delay_int, out=self._idx)
+        np.mod(self._idx, self.capacity, out=self._idx)
+        np.multiply(self._idx, self.size, out=self._idx)
+        np.add(self._idx, self._elem, out=self._idx)
+        np.take(self._flat, self._idx, out=out)
+
+    # Returns the delayed signal, in the signal shape.
+    # Pass in 'out' (signal-shaped, float) to avoid allocating.
+    def read(self, out=None):
+        if out is None and len(self.shape) > 0:
+            out = np.zeros(self.shape)
+        flat_out = out.reshape(-1) if len(self.shape) > 0 else self._scalar_out
+        self._gather(0, flat_out)
+        if not self.is_integer:
+            # linear interpolation between the sample at floor(delay)
+            # and the one before it:
+            # y = (1 - frac) * x[k - d] + frac * x[k - d - 1]
+            self._gather(1, self._tap)
+            np.multiply(flat_out, self._weight_new, out=flat_out)
+            np.multiply(self._tap, self._weight_old, out=self._tap)
+            np.add(flat_out, self._tap, out=flat_out)
+        # scalar signals come back as a float.
+        if len(self.shape) == 0:
+            return flat_out[0]
+        return out
+
+class DelayedController:
+    # Wraps a SISO controller (for example, linear.AffineFeedback) with
+    # a sensing delay on the cable length it is given, and an actuation
+    # delay on the rest length it commands. Drop-in replacement for the
+    # controller in the simulation scripts: call v(ell) once per timestep.
+    # Delays are in timesteps and can be fractional.
+
+    def __init__(self, controller, sense_delay=0, actuation_delay=0):
+        self.controller = controller
+        self.sense_line = DelayLine(sense_delay)
+        self.actuation_line = DelayLine(actuation_delay)
+
+    def v(self, ell):
+        # what the controller sees is the delayed length,
+        self.sense_line.push(ell)
+        control = self.controller.v(self.sense_line.read())
+        # and what the cable gets is the delayed command.
+        self.actuation_line.push(control)
+        return self.actuation_line.read()
+
+    # Pass through the controller's constants, for e.g. the Lyapunov function.
+    def get_kappa(self):
+        return self.controller.get_kappa()
+
+    def get_bar_ell(self):
+        return self.controller.get_bar_ell()
+
+    def get_bar_v(self):
+        return self.controller.get_bar_v()
@@ -0,0 +1,48 @@
+"""
+Export videos of run files (trajectories/run_file.py) headless and in
+parallel, see visualization/video_export.py. Needs ffmpeg. Example, every
+run from a batch, every 5th step, with the box drawn:
+    python export_videos.py results/runs/box/*.npz --stride 5 --box
+Each video is written next to its run file, with .mp4 for .npz.
+"""
+
+import argparse
+import os
+from trajectories import run_file
+from visualization import video_export
+
+# (the guard is needed for the worker processes on platforms that spawn them.)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export run files to MP4, in parallel.')
+    parser.add_argument('run_files', nargs='+', help='run files (.npz)')
+    parser.add_argument('--out-dir', default=None,
+                        help='directory for the videos (default: next to each run file)')
+    parser.add_argument('--stride', type=int, default=1,
+                        help='animate every stride-th timestep (default 1)')
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--bitrate', type=int, default=1800, help='kbit/s')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--segments', type=int, default=None,
+                        help='segments per video (default: one per worker)')
+    parser.add_argument('--elev', type=float, default=16.)
+    parser.add_argument('--azim', type=float, default=-70.)
+    parser.add_argument('--box', action='store_true',
+                        help='draw the edges of the box rig (anchors A-H)')
+    args = parser.parse_args()
+
+    jobs = []
+    for filename in args.run_files:
+        run = run_file.load_run(filename)
+        scene_kwargs = {'filename':filename, 'stride':args.stride, 'elev':args.elev,
+                        'azim':args.azim,
+                        'equilibrium':run.metadata.get('equilibrium', None)}
+        if args.box:
+            scene_kwargs['box_edges'] = video_export.BOX_EDGES
+        out_name = os.path.splitext(filename)[0] + '.mp4'
+        if args.out_dir is not None:
+            os.makedirs(args.out_dir, exist_ok=True)
+            out_name = os.path.join(args.out_dir, os.path.basename(out_name))
+        jobs.append((video_export.make_run_scene, scene_kwargs, out_name))
+    video_export.export_videos(jobs, fps=args.fps, bitrate=args.bitrate,
+                               num_workers=args.workers, num_segments=args.segments)
@@ -0,0 +1,35 @@
+"""
+Write an interactive HTML viewer for each run file (trajectories/run_file.py),
+see visualization/html_viewer.py. Needs plotly. The files open offline in
+a browser. Example, every run from a batch, with the box drawn:
+    python export_viewer.py results/runs/box/*.npz --box
+Each viewer is written next to its run file, with .html for .npz.
+"""
+
+import argparse
+import os
+from visualization import html_viewer
+from visualization import video_export
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export run files to offline HTML viewers.')
+    parser.add_argument('run_files', nargs='+', help='run files (.npz)')
+    parser.add_argument('--out-dir', default=None,
+                        help='directory for the viewers (default: next to each run file)')
+    parser.add_argument('--keyframes', type=int, default=500,
+                        help='number of slider positions (default 500)')
+    parser.add_argument('--max-points', type=int, default=4000,
+                        help='points per decimated path / plot (default 4000)')
+    parser.add_argument('--box', action='store_true',
+                        help='draw the edges of the box rig (anchors A-H)')
+    args = parser.parse_args()
+
+    for filename in args.run_files:
+        out_name = os.path.splitext(filename)[0] + '.html'
+        if args.out_dir is not None:
+            os.makedirs(args.out_dir, exist_ok=True)
+            out_name = os.path.join(args.out_dir, os.path.basename(out_name))
+        html_viewer.export_run_viewer(filename, out_name, num_keyframes=args.keyframes,
+                                      max_points=args.max_points,
+                                      box_edges=video_export.BOX_EDGES if args.box else None)
+        print(out_name)
@@ -0,0 +1,66 @@
+"""
+Software-in-the-loop: run the plant server (simulators/plant_server.py) for
+a scenario, and/or the reference client (simulators/plant_client.py) that
+closes the loop with the scenario's linear controllers. Example, in two
+shells:
+    python plant_sil.py server scenarios/box.json --ic D
+    python plant_sil.py client scenarios/box.json
+or both in one process, to check the loop and the latency:
+    python plant_sil.py both scenarios/box.json --ic D
+Use --unix /tmp/plant.sock instead of --port for a Unix domain socket.
+"""
+
+import argparse
+import asyncio
+import numpy as np
+from simulators import scenarios
+from simulators import simulation
+from simulators import plant_server
+from simulators import plant_client
+
+def get_sim_factory(scenario, ic_name):
+    ics = scenario.get_initial_conditions()
+    if ic_name is None:
+        ic_name = scenario.initial_conditions[0][0]
+    pos0, vel0 = ics[ic_name]
+    # delays and backend are the client's business here.
+    def make_sim():
+        return simulation.Simulation(scenario.rig, pos0, vel0, scenario.dt,
+                                     scenario.num_timesteps)
+    return make_sim
+
+async def run_both(server, controllers, address):
+    await server.start()
+    try:
+        results = await plant_client.run_client(controllers, address)
+    finally:
+        server.close()
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plant server / controller client over a local socket.')
+    parser.add_argument('mode', choices=['server', 'client', 'both'])
+    parser.add_argument('scenario_file', help='scenario file (.json, .toml, .yaml)')
+    parser.add_argument('--ic', default=None,
+                        help='initial condition name (default: the first one)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None,
+                        help='Unix domain socket path (instead of TCP)')
+    args = parser.parse_args()
+
+    scenario = scenarios.load_scenario(args.scenario_file)
+    address = args.unix if args.unix is not None else (args.host, args.port)
+    if args.mode == 'server':
+        server = plant_server.PlantServer(get_sim_factory(scenario, args.ic), address)
+        print('Serving ' + scenario.name + ' on ' + str(address))
+        asyncio.run(server.serve_forever())
+    else:
+        controllers = plant_client.make_controllers(scenario.rig)
+        if args.mode == 'client':
+            results = asyncio.run(plant_client.run_client(controllers, address))
+        else:
+            server = plant_server.PlantServer(get_sim_factory(scenario, args.ic), address)
+            results = asyncio.run(run_both(server, controllers, address))
+        print('Final state: ' + str(np.round(results.states[-1], 4)))
+        results.print_report()
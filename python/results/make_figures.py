@@ -0,0 +1,112 @@
+"""
+Render the paper figures from the saved results, in parallel, redrawing
+only the ones whose results (or plotting code) changed since last time.
+See visualization/figures.py.
+    python make_figures.py                 # img/ and plots/, as needed
+    python make_figures.py --force         # everything
+    python make_figures.py --out-dir /tmp/figs --workers 4
+(C) Andrew P. Sabelhaus, 2018
+"""
+
+# need to do linear alg
+import numpy as np
+import argparse
+import matplotlib
+from matplotlib.figure import Figure
+# the visualization package is one directory up from here
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from visualization import figures
+from visualization import decimate
+
+RESULTS_DIR = os.path.dirname(os.path.abspath(__file__))
+IMG_DIR = os.path.join(RESULTS_DIR, '..', 'img')
+PLOTS_DIR = os.path.join(RESULTS_DIR, 'plots')
+
+# the timestep of the saved .npy results (as of 2018-09-16.)
+dt = 0.01
+
+# One line per file (a bare .npy array, column 'column' if it's 2D),
+# against time, up to t_end, as in plot_results*.py.
+def plot_series(*filenames, labels=None, column=None, t_end=None, xlabel='Time (sec)',
+                ylabel='', title='', figsize=(5,4), fontsize=12, drop_last=False):
+    with matplotlib.rc_context({'font.size':fontsize, 'figure.autolayout':True}):
+        fig = Figure(figsize=figsize)
+        ax = fig.add_subplot(111)
+        for filename in filenames:
+            data = np.load(filename, mmap_mode='r')
+            if column is not None:
+                data = data[:, column]
+            last = data.shape[0]
+            # (the 3D scripts left off the last timestep.)
+            if drop_last:
+                last -= 1
+            if t_end is not None:
+                last = min(last, int(np.ceil(t_end / dt - 1E-9)))
+            decimate.plot(ax, dt * np.arange(last), data[0:last])
+        ax.set(xlabel=xlabel, ylabel=ylabel, title=title)
+        ax.grid()
+        if labels is not None:
+            ax.legend(labels)
+    return fig
+
+# The figures, written into img_dir and plots_dir.
+def get_tasks(img_dir=IMG_DIR, plots_dir=PLOTS_DIR):
+    test_names = ['A','B','C','D']
+    labels_3D = ['Initial Condition ' + name for name in test_names]
+    names_1D = ['1D_p5pt2_v0', '1D_p5pt5_v10', '1D_p5pt7_vminus5', '1D_p6pt2_v0',
+                '1D_p6pt9_v0', '1D_p6pt9_vminus15']
+    labels_1D = [r'Initial Condition: $x=5.2$, $\dot x = 0$',
+                 r'Initial Condition: $x=5.5$, $\dot x = 10$',
+                 r'Initial Condition: $x=5.7$, $\dot x = -5$',
+                 r'Initial Condition: $x=6.2$, $\dot x = 0$',
+                 r'Initial Condition: $x=6.9$, $\dot x = 0$',
+                 r'Initial Condition: $x=6.9$, $\dot x = -15$']
+    def inputs(prefix, names):
+        return [os.path.join(RESULTS_DIR, prefix + name + '.npy') for name in names]
+    def outputs(directory, name):
+        return [os.path.join(directory, name + ext) for ext in ('.eps', '.png')]
+    return [
+        figures.FigureTask('cable_driven_lyap_plot', plot_series,
+                           inputs('lyap_history_3D_', test_names),
+                           outputs(img_dir, 'cable_driven_lyap_plot'),
+                           {'labels':labels_3D, 'drop_last':True,
+                            'ylabel':'Lyapunov Function (V) Value',
+                            'title':'Cable-Driven Robot Lyapunov Analysis'}),
+        figures.FigureTask('cable_driven_state_err_plot', plot_series,
+                           inputs('norm_err_3D_', test_names),
+                           outputs(img_dir, 'cable_driven_state_err_plot'),
+                           {'labels':labels_3D, 'drop_last':True,
+                            'ylabel':'Total State Error (2-norm)',
+                            'title':'Cable-Driven Robot State Error Analysis'}),
+        figures.FigureTask('cable_control_results_2018-11-5_grav', plot_series,
+                           inputs('', names_1D),
+                           outputs(plots_dir, 'cable_control_results_2018-11-5_grav'),
+                           {'labels':labels_1D, 'column':0, 't_end':5.0,
+                            'figsize':(6.4, 4.8), 'fontsize':10,
+                            'ylabel':'Bar CoM Position (m)',
+                            'title':'Closed-loop slack cable control results'}),
+    ]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the result figures, as needed.')
+    parser.add_argument('names', nargs='*', help='figures to render (default: all)')
+    parser.add_argument('--out-dir', default=None,
+                        help='write every figure here instead of img/ and plots/')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--force', action='store_true', help='render even if up to date')
+    args = parser.parse_args()
+
+    if args.out_dir is None:
+        tasks = get_tasks()
+        manifest = os.path.join(PLOTS_DIR, '.figures.json')
+    else:
+        tasks = get_tasks(args.out_dir, args.out_dir)
+        manifest = os.path.join(args.out_dir, '.figures.json')
+    pipeline = figures.FigurePipeline(manifest)
+    for task in tasks:
+        pipeline.add(task)
+    pipeline.run(names=args.names if len(args.names) > 0 else None,
+                 num_workers=args.workers, force=args.force)
@@ -4,22 +4,27 @@ Plot an initial round of simulations for the 1D cable slackness controller.
 """
 
 # import everything we need
-import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 
-# load the data files we want
-filenames = ['1D_p5pt2_v0.npy', '1D_p5pt5_v10.npy', \
-            '1D_p5pt7_vminus5.npy', '1D_p6pt2_v0.npy', \
-            '1D_p6pt9_v0.npy', '1D_p6pt9_vminus15.npy']
-# corrected for path
-directory = './results/'
-# an easy way 
-correct_for_path = 1
-if correct_for_path:
-    for i in range(len(filenames)):
-        filenames[i] = directory + filenames[i]
+# the results catalogue is one directory up from here
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trajectories import catalogue
+from visualization import decimate
 
+# The results in this directory, indexed by name (see trajectories/catalogue.py.)
+# These files are bare arrays, so tell it the timestep we used
+# (the same for each simulation, as of 2018-09-16.)
+dt = 0.01
+results = catalogue.Catalogue(os.path.dirname(os.path.abspath(__file__)), dt=dt,
+                              exclude=['cache'])
+
+# the ones we want
+names = ['1D_p5pt2_v0', '1D_p5pt5_v10', \
+         '1D_p5pt7_vminus5', '1D_p6pt2_v0', \
+         '1D_p6pt9_v0', '1D_p6pt9_vminus15']
 
 # Make a list of strings identifying these files, used
 # as a legend later.
@@ -30,31 +35,18 @@ datalabels = [r'Initial Condition: $x=5.2$, $\dot x = 0$', \
              r'Initial Condition: $x=6.9$, $\dot x = 0$', \
              r'Initial Condition: $x=6.9$, $\dot x = -15$']
 
-# because I don't want to deal with 3D arrays here,
-# store all the arrays in a dictionary.
-results = {}
-for name in filenames:
-    results[name] = np.load(name)
-
-# recreate the timesteps for plotting. 
-# this assumes we chose the same for each simulation
-# (which we did, as of 2018-09-16)
-t_start = 0.0 
-dt = 0.01
-num_timesteps = 1000
-timesteps = np.arange(t_start, dt*(num_timesteps+1), dt)
-
 # Let's plot the results!
 # make latex available
 plt.rc('text', usetex=True)
 fig, ax = plt.subplots()
 # REMEMBER THAT PYTHON INDEXES FROM 0
-# loop over data. Dictionary.
-for key in results:
-    # we can shorten the amount of time to plot
-    last_timestep = 500;
-    ax.plot(timesteps[0:last_timestep], 
-            results[key][0:last_timestep,0])
+# we can shorten the amount of time to plot (seconds)
+t_end = 5.0
+for name in names:
+    # just the mass position, from the start up to t_end, memory-mapped
+    timesteps, position = results.get_slice(name, t1=t_end, columns=0)
+    # decimated to the axes' resolution (see visualization/decimate.py)
+    decimate.plot(ax, timesteps, position)
 # 1D:
 #ax.plot(timesteps, pm_state_history[:,0])
 # labels
@@ -7,33 +7,24 @@ Plot the Lyapunov function results for the 3D cable driven robot tests.
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
+# the simulation packages are one directory up from here
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from simulators import rigs
+from trajectories import cache
+from trajectories import catalogue
+from visualization import decimate
 
 # The names for each set of files to load
 test_names = ['A','B','C','D']
 
-# creat the filename lists for both the norm error and Lyap results
-filenames_lyap = []
-filenames_norm_err = []
-prefix_lyap = 'lyap_history_3D_'
-prefix_norm_err = 'norm_err_3D_'
-
-for name in test_names:
-    filenames_lyap.append(prefix_lyap + name + '.npy')
-    filenames_norm_err.append(prefix_norm_err + name + '.npy')
-    
-# load the data files we want
-# filenames_lyap = ['lyap_history_A.npy',
-#                   'lyap_history_3D_B.npy']
-
-# corrected for path
-directory = './results/'
-# an easy way 
-correct_for_path = 0
-if correct_for_path:
-    for i in range(len(filenames_lyap)):
-        filenames_lyap[i] = directory + filenames_lyap[i]
-        filenames_norm_err[i] = directory + filenames_norm_err[i]
-
+# The saved results in this directory (the box script's .npy files), by
+# name, e.g. 'lyap_history_3D_A' (see trajectories/catalogue.py.) They're
+# bare arrays, so they use this timestep.
+dt = 0.01
+saved = catalogue.Catalogue(os.path.dirname(os.path.abspath(__file__)), dt=dt,
+                            exclude=['cache'])
 
 # Make a list of strings identifying these files, used
 # as a legend later.
@@ -49,24 +40,43 @@ for name in test_names:
 #              r'Initial Condition: $x=6.9$, $\dot x = 0$', \
 #              r'Initial Condition: $x=6.9$, $\dot x = -15$']
 
-# because I don't want to deal with 3D arrays here,
-# store all the arrays in a dictionary.
+# Get the results through the result cache (trajectories/cache.py): a
+# test is loaded from results/cache/ if its configuration (and the
+# simulation code) was seen before, and only simulated, then stored, on
+# a miss. Set use_cache = 0 to plot the saved .npy files from the box
+# script instead (the published figures, and what make_figures.py draws.)
+# NOTE: only test D's saved files match the current box parameters in
+# simulators/rigs.py. A-C were saved with older ones, so their cached
+# curves are NOT the published ones (V differs by up to ~16.)
+use_cache = 1
+
+num_timesteps = 200
+
+# test name -> (timesteps, values)
 results_lyap = {}
 results_norm_err = {}
-for name in filenames_lyap:
-    results_lyap[name] = np.load(name)
-for name in filenames_norm_err:
-    results_norm_err[name] = np.load(name)
-
-# recreate the timesteps for plotting. 
-# this assumes we chose the same for each simulation
-# (which we did, as of 2018-09-16)
-t_start = 0.0 
-dt = 0.01
-num_timesteps = 200
-timesteps = np.arange(t_start, dt*(num_timesteps+1), dt)
+if use_cache:
+    result_cache = cache.ResultCache(os.path.join(os.path.dirname(
+                                     os.path.abspath(__file__)), 'cache'))
+    box = rigs.box_rig()
+    bar_x = np.concatenate((rigs.box_bar_r, np.array([0, 0, 0])))
+    for i in range(len(test_names)):
+        pos0, vel0 = rigs.box_initial_conditions[test_names[i]]
+        run = result_cache.simulate(box, pos0, vel0, dt, num_timesteps)
+        timesteps = run.get_timesteps()
+        # same post-processing as the box script
+        V_history = np.array(run['V'])
+        results_lyap[test_names[i]] = (timesteps, V_history - np.min(V_history))
+        results_norm_err[test_names[i]] = (timesteps, np.linalg.norm(
+            run['state'] - bar_x, 2, axis=1))
+else:
+    for name in test_names:
+        results_lyap[name] = saved.get_slice('lyap_history_3D_' + name)
+        results_norm_err[name] = saved.get_slice('norm_err_3D_' + name)
 
 # Let's plot the results!
+# (make_figures.py renders these to img/ without windows, in parallel, and
+# only when the results or the plotting code changed.)
 figure_size = (5,4)
 fontsize = 12
 
@@ -79,12 +89,13 @@ plt.rcParams.update({'figure.autolayout': True})
 fig, ax = plt.subplots(figsize=figure_size)
 
 # REMEMBER THAT PYTHON INDEXES FROM 0
-# loop over data. Dictionary.
-for key in results_lyap:
+# loop over the tests.
+for name in test_names:
     # we can shorten the amount of time to plot
+    timesteps, V = results_lyap[name]
     last_timestep = len(timesteps)-1
-    ax.plot(timesteps[0:last_timestep], 
-            results_lyap[key][0:last_timestep])
+    # decimated to the axes' resolution (see visualization/decimate.py)
+    decimate.plot(ax, timesteps[0:last_timestep], V[0:last_timestep])
 # 1D:
 #ax.plot(timesteps, pm_state_history[:,0])
 # labels
@@ -104,11 +115,11 @@ plt.show()
 # Next, for the norm error:
 fig2, ax2 = plt.subplots(figsize=figure_size)
 
-for key in results_norm_err:
+for name in test_names:
     # we can shorten the amount of time to plot
+    timesteps, norm_err = results_norm_err[name]
     last_timestep = len(timesteps)-1
-    ax2.plot(timesteps[0:last_timestep], 
-            results_norm_err[key][0:last_timestep])
+    decimate.plot(ax2, timesteps[0:last_timestep], norm_err[0:last_timestep])
 
 ax2.set(xlabel='Time (sec)', ylabel='Total State Error (2-norm)', 
     title='Cable-Driven Robot State Error Analysis')
@@ -0,0 +1,66 @@
+"""
+One long trajectory of a scenario file's initial condition, time-parallel
+with parareal (simulators/parareal.py), saved as a run file
+(trajectories/run_file.py) with every record_every-th step: the run
+file's dt is the recorded step, and fine_dt the simulated one. Example,
+an hour of the box rig at 1 kHz, on every core:
+    python run_parareal.py scenarios/box.json A --t-end 3600 --dt 0.001 \\
+        --slices 256 --coarse linearized --record-every 100 --out box_A_1h.npz
+"""
+
+import argparse
+from simulators import scenarios
+from simulators import parareal
+from simulators import integrators
+from trajectories import run_file
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time-parallel run of one initial condition.')
+    parser.add_argument('scenario_file', help='scenario file (.json, .toml, .yaml)')
+    parser.add_argument('ic_name', help='name of the initial condition')
+    parser.add_argument('--t-end', type=float, default=None,
+                        help='simulated time (s) (default: the scenario\'s)')
+    parser.add_argument('--dt', type=float, default=None,
+                        help='fine time step (s) (default: the scenario\'s)')
+    parser.add_argument('--slices', type=int, default=32, help='number of time slices')
+    parser.add_argument('--coarse', default='euler',
+                        choices=list(integrators.INTEGRATORS) + ['linearized'],
+                        help='coarse propagator (linearized needs the scenario\'s equilibrium)')
+    parser.add_argument('--coarse-dt', type=float, default=0.01,
+                        help='coarse time step (s) (default 0.01)')
+    parser.add_argument('--tol', type=float, default=1E-9, help='convergence tolerance')
+    parser.add_argument('--record-every', type=int, default=1, help='keep every so many steps')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--out', default=None, help='run file to write')
+    args = parser.parse_args()
+
+    scenario = scenarios.load_scenario(args.scenario_file)
+    ics = scenario.get_initial_conditions()
+    if args.ic_name not in ics:
+        raise Exception('No initial condition ' + args.ic_name + ' in ' + args.scenario_file
+                        + ', it has ' + ', '.join(ics) + '.')
+    pos0, vel0 = ics[args.ic_name]
+    dt = scenario.dt if args.dt is None else args.dt
+    t_end = scenario.dt * scenario.num_timesteps if args.t_end is None else args.t_end
+    num_timesteps = int(round(t_end / dt))
+    par = parareal.Parareal(scenario.rig, pos0, vel0, dt, num_timesteps,
+                            num_slices=args.slices, coarse=args.coarse,
+                            coarse_dt=args.coarse_dt, equilibrium=scenario.equilibrium,
+                            tol=args.tol, record_every=args.record_every)
+    results = par.run(num_workers=args.workers, verbose=True)
+    par.print_report()
+    if args.out is not None:
+        rig = scenario.rig
+        cable_anchors, cable_params, controller_consts = rig.to_dicts()
+        run_file.save_run(args.out, results,
+                          {'cable_tags':rig.tags, 'cable_anchors':cable_anchors,
+                           'cable_params':cable_params, 'controller_consts':controller_consts,
+                           'm':rig.m, 'g':rig.g, 'force_law':rig.get_force_law(),
+                           'dt':dt * args.record_every, 'fine_dt':dt,
+                           'num_timesteps':num_timesteps // args.record_every,
+                           'record_every':args.record_every, 'parareal':
+                           {'slices':par.num_slices, 'coarse':args.coarse,
+                            'iterations':par.num_iterations, 'converged':par.converged,
+                            'tol':args.tol}})
+        print('Wrote ' + args.out)
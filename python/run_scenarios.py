@@ -0,0 +1,27 @@
+"""
+Run scenario files (see simulators/scenarios.py and scenarios/) in parallel,
+writing one run file per initial condition under the output directory.
+Example, every scenario that ships with the code, on all cores:
+    python run_scenarios.py scenarios/*.json --out ./results/runs
+"""
+
+import argparse
+from simulators import batch
+
+# (the guard is needed for the worker processes on platforms that spawn them.)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run scenario files in parallel.')
+    parser.add_argument('scenario_files', nargs='+',
+                        help='scenario files (.json, .toml, .yaml)')
+    parser.add_argument('--out', default='./results/runs',
+                        help='output directory (default ./results/runs)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=16,
+                        help='initial conditions per ensemble task (default 16)')
+    parser.add_argument('--skip-existing', action='store_true',
+                        help="don't re-run initial conditions that already have a run file")
+    args = parser.parse_args()
+
+    batch.run_batch(args.scenario_files, args.out, num_workers=args.workers,
+                    chunk_size=args.chunk_size, skip_existing=args.skip_existing)
@@ -10,7 +10,6 @@ import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
-from matplotlib.animation import FuncAnimation
 import matplotlib.animation as animation
 # for nicer plots / animations,
 import plotly.offline as plyoff
@@ -20,6 +19,9 @@ import plotly.graph_objs as go
 from cable_models import *
 from body_models import *
 from controllers import *
+from trajectories import run_file
+from visualization import cable_animation
+from visualization import decimate
 
 # Parameters for the cables are going to be a dict.
 # Assume that each cable will interpret its dict correctly (polymorphically.)
@@ -173,7 +175,10 @@ pm_pos_initial = np.array([0.3, 0.5, .1])
 pm_vel_initial = np.array([3, 6, 2])
 
 # The body itself:
-pm = point_mass3D.PointMass3D(m, g, pm_pos_initial, pm_vel_initial)
+# (contiguous, so that the loop below can step it in place without
+# allocating new arrays every timestep.)
+pm = point_mass3D.PointMass3D(m, g, pm_pos_initial, pm_vel_initial, 
+                              contiguous=True)
 
 # Let's create a range of timesteps for the simulation.
 # really, don't change the start time from 0, that's meaningless unless
@@ -241,6 +246,11 @@ def get_V(pm, cable_tags, cables, controllers):
 V_history = np.zeros(num_timesteps+1)
 V_history[0] = get_V(pm, cable_tags, cables, controllers)
 
+# Buffers for the step, allocated once:
+# the (vector) force from each cable, and the point mass' state derivative.
+forces_array = np.zeros((len(cable_tags), 3))
+pm_state_deriv = np.zeros(6)
+
 ### Run the simulation.
 
 # The "pythonic" way of iterating over both timesteps and history
@@ -267,21 +277,19 @@ for t in range(num_timesteps):
     # cable force(s).
     pm_pos = pm.get_pos()
     pm_vel = pm.get_vel()
-    # for numerical integration below
-    pm_state = pm.get_state()
 
     # Have each cable calculate its force.
     # Importantly, the "other anchor point" for any cable,
     # when we're simulating only a single point mass,
     # will be that point mass' position and velocity!!
-    forces_list = []
-    # ...need a list for calculating the pointmass state,
+    # Forces are written into the preallocated forces_array, one row per cable.
+    # ...need an array for calculating the pointmass state,
     # but we want a dict for recording and referencing the SCALAR force!
     forces_dict = {}
     # The "pythonic" way of iterating over both cables and control inputs
     # would be to use the 'zip' function, but unsure if that's best here...
     # default to a more MATLAB-ian syntax.
-    for tag in cable_tags:
+    for i, tag in enumerate(cable_tags):
 
         # calculate the control input for this cable based on its length.
         # length calulated by cable. All are connected to the point mass.
@@ -309,9 +317,10 @@ for t in range(num_timesteps):
         # in Sastry's Nonlinear Systems textbook, where the spring
         # force is g(x), and the equations of motion include -g(x).
         # CHECK THIS
-        force_i = -cables[tag].force_3d(pm_pos, pm_vel, control_i)
+        force_i = cables[tag].force_3d(pm_pos, pm_vel, control_i, 
+                                       out=forces_array[i])
+        np.negative(force_i, out=force_i)
         #print(force_i)
-        forces_list.append(force_i)
         
         # For the recording of the force, we want the SCALAR force!
         # This is *not* the norm of the force, it's signed according to the
@@ -324,20 +333,19 @@ for t in range(num_timesteps):
     
     #debugging
     # print('Forces at timestep ' + str(t))
-    # print(forces_list)
+    # print(forces_array)
     # The point mass can then calculate its \dot x
     # (as in, \dot x = f(x, u), really just the vel and accel in one vec.)
-    pm_state_deriv = pm.state_deriv(forces_list)
+    pm.state_deriv(forces_array, out=pm_state_deriv)
 
     # We can then integrate to get state(t+1).
     # later, do something more intelligent (Runge-Kutta, or solve_ivp in numpy)
-    # but for now a simple forward-euler is fine enough
-    pm_state_tp1 = pm_state + dt * pm_state_deriv
+    # but for now a simple forward-euler is fine enough.
+    # This updates the point mass' state in place.
+    pm.euler_step(pm_state_deriv, dt)
 
     # Record everything, set up for next iteration.
-    # Set the new point mass state:
-    pm.set_state(pm_state_tp1)
-    pm_state_history[t+1] = pm_state_tp1
+    pm_state_history[t+1] = pm.get_state()
     force_history.append(forces_dict)
     # and for the Lyapunov candidate,
     V_i = get_V(pm, cable_tags, cables, controllers)
@@ -373,9 +381,7 @@ ax = fig.add_subplot(111, projection='3d')
 # elev = 36.
 az = -70.
 elev = 16.
-# REMEMBER THAT PYTHON INDEXES FROM 0
-# 3D:
-pm_path_line = ax.plot(pm_state_history[0:1,0], pm_state_history[0:1,1], pm_state_history[0:1,2])[0]
+# (the path of the point mass is drawn by the animation renderer below.)
 ax.view_init(elev=elev, azim=az)
 
 # change the density of ticks
@@ -459,96 +465,24 @@ for edge in range(len(box_edges)):
 # Turning off the grid
 ax.grid(False)
 
-# A function to return the desired color for the cable.
-def cable_color_chooser(frameno, tag, force_history, bound):
-        # This cable's force. Index into a list then the dict
-        force = force_history[frameno][tag]
-        # Check if it's slack or not
-        if force <= bound:
-                return 'r'
-        else:
-                return 'g'
-
-# Plot the initial cable vectors
-# Initialize the dictionary of lines per anchor.
-cable_lines_dict = {}
-for tag in cable_tags:
-        anch = cable_anchors[tag]
-        # Organize cable lines into three, 2-element np arrays
-        clx = np.array([pm_state_history[0,0], anch[0]])
-        cly = np.array([pm_state_history[0,1], anch[1]])
-        clz = np.array([pm_state_history[0,2], anch[2]])
-        # Get the right color for this cable
-        # color_i = cable_color_chooser(0, tag, force_history, eps)
-        # at the start, color all the lines green for a demonstration
-        color_i = 'g'
-        # Actually plot the line
-        cable_line_i = ax.plot(clx, cly, clz, color=color_i)[0]
-        # and save it to the dict, so we can continue to update it later
-        cable_lines_dict[tag] = cable_line_i
-
-# The easiest way to do things here are a few functions inside this script.
-
 #############
 ############# START code for animation
 #############
 
-# Used to update the lines used to represent the cables, 
-# from anchors to point mass.
-def update_cable_lines(frameno, pm_state_history, cable_lines_dict, 
-                       cable_tags, cable_anchors, force_history, bound):
-        # As with the initialization,
-        for tag in cable_tags:
-                anch = cable_anchors[tag]
-                # Organize cable lines into three, 2-element np arrays
-                clx = np.array([pm_state_history[frameno-1,0], anch[0]])
-                cly = np.array([pm_state_history[frameno-1,1], anch[1]])
-                clz = np.array([pm_state_history[frameno-1,2], anch[2]])
-                # Pull out this line
-                cable_line_i = cable_lines_dict[tag]
-                # Get the right color for this cable
-                color_i = cable_color_chooser(frameno-1, tag, force_history, eps)
-                # Update it appropriately
-                cable_line_i.set_data(clx, cly)
-                cable_line_i.set_color(color_i)
-                cable_line_i.set_3d_properties(clz)
-
-# Update the animation - this is passed to FuncAnimation
-# Need to pass in all the arguments to update_cable_lines too,
-# messy.
-def ani_update(frameno, pm_state_history, ln, handles, cable_lines_dict, 
-               cable_tags, cable_anchors, force_history, bound):
-        # First, clear out all the scatterplots from prev calls.
-        # The guard evaluates to true if handles is not empty
-        while len(handles) != 0:
-                h = handles.pop()
-                h.remove()
-        # Given a timestep (that's 'frame'),
-        # plot all the data from zero until now.
-        ln.set_data(pm_state_history[0:frameno, 0], pm_state_history[0:frameno, 1])
-        ln.set_3d_properties(pm_state_history[0:frameno, 2])
-        next_h = ax.scatter(pm_state_history[frameno-1,0], pm_state_history[frameno-1,1], pm_state_history[frameno-1,2],
-                color='blue', marker='o', s=60)
-        handles.append(next_h)
-        # Also update the lines from the pointmass to the cable anchors
-        update_cable_lines(frameno, pm_state_history, cable_lines_dict, 
-                           cable_tags, cable_anchors, force_history, bound)
-        return ln
-
-# One way to pass around the handles to the updated positions
-# is to store in a list of those handles,
-# and pass it around
-position_handles_list = []
+# The renderer (visualization/cable_animation.py) creates the cables,
+# the point mass and its path once, and updates them in place each frame.
+# Cables are green when taut, red when slack (force less than eps.)
 
 # finally, run the animation if specified
 run_ani = 1
+# Animate every frame_stride-th timestep (e.g., 10 or more for a 50k-step run.)
+frame_stride = 1
 
 if run_ani:
-        ani = FuncAnimation(fig=fig, func=ani_update, frames=num_timesteps, 
-                        fargs=(pm_state_history, pm_path_line, position_handles_list,
-                                cable_lines_dict, cable_tags, cable_anchors, 
-                                force_history, eps), 
-                        interval=50, blit=False)
+        renderer = cable_animation.CableAnimation(ax, pm_state_history, cable_tags,
+                        cable_anchors, force_history=force_history, bound=eps,
+                        stride=frame_stride)
+        ani = renderer.get_animation(interval=50)
 
 #############
 ############# END code for animation
@@ -580,7 +514,8 @@ min_V = np.min(V_history)
 V_history -= min_V
 
 fig2, ax2 = plt.subplots()
-ax2.plot(timesteps, V_history[1:])
+# decimated to the axes' resolution, for long runs (visualization/decimate.py)
+decimate.plot(ax2, timesteps, V_history[1:])
 plt.show()
 
 # Save the results
@@ -590,3 +525,21 @@ norm_err_filename = './results/norm_err_3D_' + test_name
 
 # np.save(lyap_filename, V_history)
 # np.save(norm_err_filename, norm_err)
+
+# Or, everything from this run in one file with its parameters
+# (see trajectories/run_file.py.) That's also how to get the video without
+# the window open, rendered in parallel (visualization/video_export.py):
+#   python export_videos.py ./results/run_3D_D.npz --box
+# or an interactive viewer that opens offline in a browser (visualization/html_viewer.py):
+#   python export_viewer.py ./results/run_3D_D.npz --box
+save_run = 0
+if save_run:
+        # scalar forces, one column per cable in the order of cable_tags
+        force_array = np.array([[f[tag] for tag in cable_tags] for f in force_history])
+        run_file.save_run('./results/run_3D_' + test_name + '.npz',
+                {'state':pm_state_history, 'force':force_array, 'V':V_history,
+                 'norm_err':norm_err},
+                {'cable_tags':cable_tags, 'cable_anchors':cable_anchors,
+                 'cable_params':cable_params, 'controller_consts':controller_consts,
+                 'm':m, 'g':g, 'dt':dt, 'num_timesteps':num_timesteps, 'eps':eps,
+                 'test_name':test_name})
@@ -0,0 +1,5 @@
+# include everything from this directly.
+__all__ = ['rig', 'rigs', 'kernels', 'simulation', 'scenarios', 'batch', 'checkpoint', 'realtime',
+           'plant_server', 'plant_client', 'stopping',
+           'workspace', 'shared_ensemble', 'sweep', 'geometry',
+           'force_laws', 'comparison', 'force_table', 'integrators', 'work_precision', 'parareal']
@@ -0,0 +1,109 @@
+"""
+Batch runner for scenario files (scenarios.py): runs every initial
+condition of every scenario across a pool of worker processes, and writes
+one run file (trajectories/run_file.py) per initial condition, as
+    <out_dir>/<scenario name>/<initial condition name>.npz
+next to a copy of the scenario, <out_dir>/<scenario name>/scenario.json.
+Initial conditions of the same scenario are simulated together as an
+ensemble, in chunks of chunk_size.
+"""
+
+import json
+import os
+import time
+import concurrent.futures
+from simulators import scenarios
+from simulators import simulation
+from simulators import stopping
+from trajectories import run_file
+from trajectories import cache
+
+# Where the run for one initial condition of a scenario goes.
+def get_run_filename(out_dir, scenario_name, ic_name):
+    return os.path.join(out_dir, scenario_name, ic_name + '.npz')
+
+# Split the scenarios into tasks: (scenario filename, [initial condition names]).
+# With skip_existing, initial conditions that already have a run file are left out.
+def plan_tasks(scenario_files, out_dir, chunk_size=16, skip_existing=False):
+    tasks = []
+    for filename in scenario_files:
+        scenario = scenarios.load_scenario(filename)
+        names = [ic[0] for ic in scenario.initial_conditions]
+        if skip_existing:
+            names = [name for name in names if not os.path.exists(
+                     get_run_filename(out_dir, scenario.name, name))]
+        for i in range(0, len(names), chunk_size):
+            tasks.append((filename, names[i : i + chunk_size]))
+    return tasks
+
+# Run one task, in a worker. The scenario is re-read from its file here,
+# so only file names cross the process boundary.
+# Returns (scenario filename, names, seconds taken).
+def run_task(task, out_dir, eps=1E-10):
+    filename, names = task
+    start = time.time()
+    scenario = scenarios.load_scenario(filename)
+    names, pos0, vel0 = scenario.get_ensemble(names)
+    sim = simulation.Simulation(scenario.rig, pos0, vel0, scenario.dt,
+                                scenario.num_timesteps, **scenario.sim_kwargs)
+    sim.run()
+    cable_anchors, cable_params, controller_consts = scenario.rig.to_dicts()
+    for j, name in enumerate(names):
+        # a single run's slice of each ensemble history (up to where it
+        # stopped, if it stopped early.)
+        arrays = dict(sim.get_member_results(j))
+        arrays.update(sim.get_slack_arrays(j))
+        metadata = {'scenario':scenario.name, 'scenario_file':os.path.abspath(filename),
+                    'initial_condition':name, 'pos0':pos0[j], 'vel0':vel0[j],
+                    'cable_tags':scenario.rig.tags, 'cable_anchors':cable_anchors,
+                    'cable_params':cable_params, 'controller_consts':controller_consts,
+                    'm':scenario.rig.m, 'g':scenario.rig.g,
+                    'force_law':scenario.rig.get_force_law(), 'dt':scenario.dt,
+                    'num_timesteps':scenario.num_timesteps, 'eps':eps,
+                    'slack_bound':sim.slack_bound,
+                    'equilibrium':scenario.equilibrium,
+                    'simulation':scenario.sim_kwargs,
+                    'code_version':cache.get_code_version()}
+        if sim.stopping is not None:
+            metadata['stop_step'] = sim.stop_step[j]
+            metadata['stop_reason'] = stopping.REASONS[sim.stop_reason[j]]
+        run_file.save_run(get_run_filename(out_dir, scenario.name, name),
+                          arrays, metadata)
+    return (filename, names, time.time() - start)
+
+# Run every scenario file. num_workers=1 runs everything in this process
+# (easier for debugging), None uses one worker per core.
+# Returns the list of what run_task returned, in completion order.
+def run_batch(scenario_files, out_dir, num_workers=None, chunk_size=16,
+              skip_existing=False, verbose=True):
+    # set up the output layout first, so workers only write run files.
+    for filename in scenario_files:
+        scenario = scenarios.load_scenario(filename)
+        invalid = scenario.get_invalid_initial_conditions()
+        if verbose and len(invalid) > 0:
+            print('Warning: ' + filename + ': initial conditions outside the anchors\' '
+                  + 'convex hull: ' + ', '.join(invalid))
+        os.makedirs(os.path.join(out_dir, scenario.name), exist_ok=True)
+        with open(os.path.join(out_dir, scenario.name, 'scenario.json'), 'w') as f:
+            json.dump(run_file.to_json_types(scenario.spec), f, indent=1)
+    tasks = plan_tasks(scenario_files, out_dir, chunk_size, skip_existing)
+    done = []
+    if num_workers == 1:
+        for task in tasks:
+            done.append(run_task(task, out_dir))
+            if verbose:
+                _print_done(done[-1], len(done), len(tasks))
+        return done
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = [pool.submit(run_task, task, out_dir) for task in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            done.append(future.result())
+            if verbose:
+                _print_done(done[-1], len(done), len(tasks))
+    return done
+
+# A helper for progress output.
+def _print_done(result, num_done, num_tasks):
+    filename, names, seconds = result
+    print('[' + str(num_done) + '/' + str(num_tasks) + '] ' + os.path.basename(filename)
+          + ': ' + ', '.join(names) + ' (' + '{:.2f}'.format(seconds) + ' s)')
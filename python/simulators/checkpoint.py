@@ -0,0 +1,155 @@
+"""
+Checkpoints of a Simulation (simulation.py): everything needed to carry
+on exactly where it left off. That's the state of every member, the step
+cursor, the histories recorded so far, the delay line buffers, which
+members have stopped early, the slack log so far, and the settings (rig, dt, backend, delays,
+stopping criteria; the forward Euler integrator has no state of its
+own.) Resuming from a checkpoint gives a bit-identical continuation.
+The rig's constants are saved, but a rig with another force law
+(rig.CableRig.get_force_law, e.g. force_laws.LawRig) can't be rebuilt
+from them: restoring one needs new_rig, and fork keeps the live rig.
+
+Checkpoints are run files (trajectories/run_file.py), so they're also
+readable like any other run. Typical use, for a long run:
+    checkpoint.run_with_checkpoints(sim, 'box_long.ckpt.npz', every=5000)
+    ...
+    sim = checkpoint.load_checkpoint('box_long.ckpt.npz')
+    sim.run()
+and to try a controller change from time t0 without redoing [0, t0]:
+    branch = checkpoint.fork(sim, new_rig=rig_with_new_gains)
+"""
+
+# need to do linear alg
+import numpy as np
+import json
+import os
+from simulators import rig
+from simulators import simulation
+from trajectories import run_file
+from trajectories import slack_log
+
+# A snapshot of the simulation, as (arrays, metadata), in memory.
+def get_checkpoint(sim):
+    t = sim.t
+    arrays = {'state':sim.state.copy(),
+              'state_history':sim.state_history[:, 0:t+1].copy(),
+              'control_history':sim.control_history[:, 0:t].copy(),
+              'force_history':sim.force_history[:, 0:t].copy(),
+              'V_history':sim.V_history[:, 0:t+1].copy(),
+              'sense_delay':np.asarray(sim.sense_delay, dtype=float),
+              'actuation_delay':np.asarray(sim.actuation_delay, dtype=float)}
+    cable_anchors, cable_params, controller_consts = sim.rig.to_dicts()
+    metadata = {'checkpoint':True, 't':t, 'dt':sim.dt,
+                'num_timesteps':sim.num_timesteps, 'backend':sim.backend,
+                'integrator':'euler', 'single':sim.single,
+                'cable_tags':sim.rig.tags, 'cable_anchors':cable_anchors,
+                'cable_params':cable_params, 'controller_consts':controller_consts,
+                'm':sim.rig.m, 'g':sim.rig.g, 'force_law':sim.rig.get_force_law(),
+                'delayed':bool(sim.delayed), 'slack_bound':sim.slack_bound}
+    arrays.update(sim.slack_recorder.to_arrays())
+    if sim.delayed:
+        for name, line in [('sense', sim.sense_line), ('actuation', sim.actuation_line)]:
+            arrays[name + '_buffer'] = line.buffer.copy()
+            metadata[name + '_head'] = line.head
+    if sim.stopping is not None:
+        metadata['stopping'] = sim.stopping.to_dict()
+        arrays['active'] = sim.active.copy()
+        arrays['stop_step'] = sim.stop_step.copy()
+        arrays['stop_reason'] = sim.stop_reason.copy()
+        arrays['dwell'] = sim._dwell.copy()
+    return arrays, metadata
+
+# Rebuild a Simulation from a snapshot. Optionally with a different rig
+# (e.g. new controller constants, applied from the checkpoint's time on),
+# a different num_timesteps (must be at least the checkpoint's t), or
+# a different backend. Snapshots of rigs with another force law have to
+# be given new_rig, since only the piecewise rig is rebuilt here.
+def restore(arrays, metadata, new_rig=None, num_timesteps=None, backend=None):
+    if new_rig is None:
+        if metadata.get('force_law', None) is not None:
+            raise Exception('The checkpoint is of a rig with force law '
+                            + json.dumps(metadata['force_law']) + ', which can\'t be '
+                            + 'rebuilt from the checkpoint. Pass it as new_rig.')
+        new_rig = rig.CableRig.from_dicts(metadata['cable_tags'],
+                                          metadata['cable_anchors'],
+                                          metadata['cable_params'],
+                                          metadata['controller_consts'],
+                                          metadata['m'], metadata['g'])
+    if num_timesteps is None:
+        num_timesteps = metadata['num_timesteps']
+    if backend is None:
+        backend = metadata['backend']
+    t = metadata['t']
+    if num_timesteps < t:
+        raise Exception('Cannot restore to fewer timesteps than were already taken.')
+    # initial condition is the start of the history, so the new Simulation
+    # is set up the same way as the original one was.
+    state0 = np.array(arrays['state_history'][:, 0])
+    pos0 = state0[:, 0:3]
+    vel0 = state0[:, 3:6]
+    if metadata['single']:
+        pos0 = pos0[0]
+        vel0 = vel0[0]
+    sim = simulation.Simulation(new_rig, pos0, vel0, metadata['dt'], num_timesteps,
+                                backend=backend,
+                                sense_delay=np.array(arrays['sense_delay']),
+                                actuation_delay=np.array(arrays['actuation_delay']),
+                                stopping=metadata.get('stopping', None),
+                                slack_bound=metadata.get('slack_bound', 1E-10))
+    # then overwrite everything that has happened since.
+    sim.state[:] = arrays['state']
+    sim.t = t
+    sim.state_history[:, 0:t+1] = arrays['state_history']
+    sim.control_history[:, 0:t] = arrays['control_history']
+    sim.force_history[:, 0:t] = arrays['force_history']
+    sim.V_history[:, 0:t+1] = arrays['V_history']
+    if sim.delayed:
+        for name, line in [('sense', sim.sense_line), ('actuation', sim.actuation_line)]:
+            line.buffer[:] = arrays[name + '_buffer']
+            line.head = metadata[name + '_head']
+            line.primed = True
+    if sim.stopping is not None:
+        sim.active = np.array(arrays['active'])
+        sim.stop_step[:] = arrays['stop_step']
+        sim.stop_reason[:] = arrays['stop_reason']
+        sim._dwell[:] = arrays['dwell']
+    sim.slack_recorder = slack_log.SlackRecorder.from_arrays(arrays, new_rig.tags,
+                                                             sim.dt, sim.slack_bound)
+    return sim
+
+# Write a checkpoint file. Written to a temporary name first and then
+# moved into place, so an interruption never leaves a broken checkpoint.
+def save_checkpoint(sim, filename):
+    arrays, metadata = get_checkpoint(sim)
+    tmp_filename = filename + '.tmp'
+    run_file.save_run(tmp_filename, arrays, metadata)
+    os.replace(tmp_filename, filename)
+
+# Read a checkpoint file back into a Simulation. Same options as restore.
+def load_checkpoint(filename, new_rig=None, num_timesteps=None, backend=None):
+    run = run_file.load_run(filename, mmap=False)
+    if not run.metadata.get('checkpoint', False):
+        raise Exception(filename + ' is not a checkpoint.')
+    arrays = {name: run[name] for name in run.keys()}
+    return restore(arrays, run.metadata, new_rig, num_timesteps, backend)
+
+# A copy of the simulation as it is now, that can be continued
+# independently (optionally with a different rig / length / backend;
+# by default the same rig object.) The shared prefix of the histories
+# is copied, not re-simulated.
+def fork(sim, new_rig=None, num_timesteps=None, backend=None):
+    if new_rig is None:
+        new_rig = sim.rig
+    arrays, metadata = get_checkpoint(sim)
+    return restore(arrays, metadata, new_rig, num_timesteps, backend)
+
+# Run to the end, saving a checkpoint every 'every' steps (and at the end.)
+# With early stopping, the end is when every member has stopped, if
+# that's sooner.
+def run_with_checkpoints(sim, filename, every):
+    while sim.t < sim.num_timesteps:
+        sim.run(num_steps=every)
+        save_checkpoint(sim, filename)
+        if sim.stopping is not None and len(sim.active) == 0:
+            break
+    return sim.get_results()
@@ -0,0 +1,164 @@
+"""
+How much does the slackness model matter? Runs the same initial
+conditions under several cable force laws (force_laws.py) in lockstep, as
+one batch: member l M + i is initial condition i under law l, so each
+step does the kinematics, control and Euler update for every variant in
+one vectorized pass with the rig's precomputed constants, and only the
+force law differs per member. Then compares each law against a reference
+law (the first one):
+    comp = comparison.ModelComparison(rig, pos0, vel0, dt, T,
+                                      laws=['piecewise', 'linear', 'hybrid_split', 'logistic'],
+                                      equilibrium=bar_r)
+    comp.run()
+    comp.print_report()
+The 'piecewise' variant matches Simulation (numpy backend) bit for bit.
+See compare_models.py for scenario files.
+"""
+
+# need to do linear alg
+import numpy as np
+from simulators import force_laws
+
+class ModelComparison:
+    # pos0 (M, 3) (or one 3-vector), vel0 (M, 3) or one 3-vector, for M
+    # initial conditions, each run under every law in laws. beta, beta_0
+    # are for the logistic law. equilibrium (3,), if given, is used for
+    # the state errors in the report.
+    # The histories are as in Simulation, per law: get_results(law).
+
+    def __init__(self, rig, pos0, vel0, dt, num_timesteps,
+                 laws=('piecewise', 'linear', 'hybrid_split', 'logistic'),
+                 beta=5., beta_0=0., equilibrium=None):
+        self.rig = rig
+        self.dt = dt
+        self.num_timesteps = num_timesteps
+        self.laws = [force_laws.LAWS[force_laws.get_law(law)] for law in laws]
+        if len(set(self.laws)) != len(self.laws):
+            raise Exception('Each force law can only be compared once.')
+        self.beta = beta
+        self.beta_0 = beta_0
+        self.equilibrium = None if equilibrium is None else np.asarray(equilibrium, dtype=float)
+        pos0 = np.atleast_2d(np.asarray(pos0, dtype=float))
+        M = pos0.shape[0]
+        L = len(self.laws)
+        self.num_ics = M
+        B = L * M
+        n = rig.num_cables
+        T = num_timesteps
+        # the batch: law-major, the same initial conditions for each law.
+        self.member_laws = np.repeat([force_laws.get_law(law) for law in self.laws], M)
+        self.state = np.zeros((B, 6))
+        self.state[:, 0:3] = np.tile(pos0, (L, 1))
+        self.state[:, 3:6] = np.tile(np.broadcast_to(np.asarray(vel0, dtype=float), (M, 3)),
+                                     (L, 1))
+        self.t = 0
+        self.state_history = np.zeros((B, T+1, 6))
+        self.control_history = np.zeros((B, T, n))
+        self.force_history = np.zeros((B, T, n))
+        self.V_history = np.zeros((B, T+1))
+        self.state_history[:, 0] = self.state
+        self.V_history[:, 0] = rig.get_V(self.state)
+        self._deriv = np.zeros((B, 6))
+
+    # One forward Euler step of every variant, as Simulation.step does it.
+    def step(self):
+        if self.t >= self.num_timesteps:
+            raise Exception('Comparison is already at num_timesteps, exiting.')
+        rig = self.rig
+        t = self.t
+        ell, dot_ell, unit = rig.get_kinematics(self.state)
+        control = rig.get_controls(ell)
+        Fs = rig.k * (ell - control)
+        Fd = rig.c * dot_ell
+        F = force_laws.get_forces(self.member_laws, Fs, Fd, self.beta, self.beta_0)
+        self._deriv[:, 0:3] = self.state[:, 3:6]
+        self._deriv[:, 3:6] = rig.get_accel(unit, F)
+        self.state += self.dt * self._deriv
+        self.t += 1
+        self.state_history[:, t+1] = self.state
+        self.control_history[:, t] = control
+        self.force_history[:, t] = F
+        self.V_history[:, t+1] = rig.get_V(self.state)
+
+    def run(self, num_steps=None):
+        if num_steps is None:
+            num_steps = self.num_timesteps - self.t
+        for _ in range(min(num_steps, self.num_timesteps - self.t)):
+            self.step()
+
+    # A helper: the batch rows of a law.
+    def _rows(self, law):
+        l = self.laws.index(force_laws.LAWS[force_laws.get_law(law)])
+        return slice(l * self.num_ics, (l + 1) * self.num_ics)
+
+    # One law's histories, (M, ...) up to the cursor, as Simulation.get_results.
+    def get_results(self, law):
+        rows = self._rows(law)
+        t = self.t
+        return {'state':self.state_history[rows, 0:t+1],
+                'control':self.control_history[rows, 0:t],
+                'force':self.force_history[rows, 0:t], 'V':self.V_history[rows, 0:t+1]}
+
+    # |r_law - r_reference| over time, (M, t+1), and the same for the
+    # velocities.
+    def get_divergence(self, law, reference=None):
+        if reference is None:
+            reference = self.laws[0]
+        a = self.get_results(law)['state']
+        b = self.get_results(reference)['state']
+        return (np.linalg.norm(a[..., 0:3] - b[..., 0:3], axis=2),
+                np.linalg.norm(a[..., 3:6] - b[..., 3:6], axis=2))
+
+    # Per law, per initial condition (arrays of M): divergence from the
+    # reference (max, final, RMS, and the first time it passes tol, nan
+    # if never), the final state error (with an equilibrium), the slack
+    # fraction (of steps x cables with force <= bound), the pushing
+    # fraction (force < 0: the linear law, and the logistic one a little),
+    # the largest force, and the number of steps where V increased by
+    # more than lyapunov_tol.
+    def get_report(self, tol=1E-3, bound=1E-10, lyapunov_tol=1E-9):
+        report = {}
+        times = self.dt * np.arange(self.t + 1)
+        for law in self.laws:
+            results = self.get_results(law)
+            pos_div, vel_div = self.get_divergence(law)
+            exceeded = pos_div > tol
+            first = np.where(np.any(exceeded, axis=1), np.argmax(exceeded, axis=1), -1)
+            entry = {'max_divergence':np.max(pos_div, axis=1),
+                     'final_divergence':pos_div[:, -1],
+                     'rms_divergence':np.sqrt(np.mean(pos_div**2, axis=1)),
+                     'max_vel_divergence':np.max(vel_div, axis=1),
+                     'time_to_tol':np.where(first >= 0, times[first], np.nan),
+                     'slack_fraction':np.mean(results['force'] <= bound, axis=(1, 2)),
+                     'push_fraction':np.mean(results['force'] < 0, axis=(1, 2)),
+                     'max_force':np.max(results['force'], axis=(1, 2)),
+                     'V_increases':np.sum(np.diff(results['V'], axis=1) > lyapunov_tol,
+                                          axis=1)}
+            if self.equilibrium is not None:
+                entry['final_error'] = np.linalg.norm(results['state'][:, -1, 0:3]
+                                                      - self.equilibrium, axis=1)
+            report[law] = entry
+        return report
+
+    # The report as a table: one row per initial condition (names, if
+    # given) and metric, one column per law.
+    def print_report(self, ic_names=None, tol=1E-3, bound=1E-10):
+        report = self.get_report(tol, bound)
+        if ic_names is None:
+            ic_names = [str(i) for i in range(self.num_ics)]
+        metrics = ['max_divergence', 'final_divergence', 'time_to_tol', 'final_error',
+                   'slack_fraction', 'push_fraction', 'V_increases']
+        width = max(12, max(len(law) for law in self.laws) + 2)
+        first = '{:<' + str(max(6, max(len(name) for name in ic_names) + 2)) + '}'
+        print('Force laws vs. ' + self.laws[0] + ', ' + str(self.num_ics)
+              + ' initial conditions, ' + str(self.t) + ' steps of ' + str(self.dt) + ' s'
+              + ' (time_to_tol: divergence > ' + str(tol) + ' m)')
+        print(first.format('IC') + '{:<18}'.format('metric') + ''.join(
+            ('{:>' + str(width) + '}').format(law) for law in self.laws))
+        for i, name in enumerate(ic_names):
+            for metric in metrics:
+                if metric not in report[self.laws[0]]:
+                    continue
+                print(first.format(name) + '{:<18}'.format(metric) + ''.join(
+                    ('{:>' + str(width) + '.4g}').format(report[law][metric][i])
+                    for law in self.laws))
@@ -0,0 +1,97 @@
+"""
+The cable force laws of the project as vectorized functions of the spring
+and damping terms Fs = k (\ell - v) and Fd = c \dot \ell, so that any of
+them can be picked per ensemble member:
+    'linear'        LinearCable: Fs + Fd, pushes when negative.
+    'hybrid'        HybridLinearCable: H(Fs + Fd) (Fs + Fd).
+    'hybrid_split'  HybridSplitLinearCable: H(Fs) Fs + H(Fs) H(Fd) Fd.
+    'piecewise'     PiecewiseLinearCable3D (and rig.py): max(Fs + Fd, 0),
+                    the same law as 'hybrid'.
+    'logistic'      logistic_smoothed_spring_damper.m (MATLAB): F L(F),
+                    with F = Fs + Fd and L(F) = 1 / (1 + exp(-beta (F - beta_0))).
+The rectified laws are written as rig.py writes them, so 'piecewise' here
+gives the same bits as the rig. LawRig is a CableRig with one of these
+laws for all of its cables, e.g. the 1D rig's hybrid_split (rigs.py):
+    rig_l = force_laws.LawRig(rig, 'hybrid_split')
+"""
+
+# need to do linear alg
+import numpy as np
+from simulators import rig as cable_rig
+
+LINEAR = 0
+HYBRID = 1
+HYBRID_SPLIT = 2
+PIECEWISE = 3
+LOGISTIC = 4
+LAWS = ['linear', 'hybrid', 'hybrid_split', 'piecewise', 'logistic']
+
+# A law's code, from its name (or the code itself.)
+def get_law(law):
+    if isinstance(law, str):
+        if law not in LAWS:
+            raise Exception('Unknown force law ' + law + ', use one of ' + ', '.join(LAWS) + '.')
+        return LAWS.index(law)
+    if not 0 <= int(law) < len(LAWS):
+        raise Exception('Unknown force law code ' + str(law) + '.')
+    return int(law)
+
+# The logistic function, 1 / (1 + exp(-z)), without overflow for large |z|.
+def logistic(z):
+    e = np.exp(-np.abs(z))
+    return np.where(z >= 0, 1. / (1. + e), e / (1. + e))
+
+# Scalar cable forces from Fs and Fd (..., n), with one law for all of
+# them, or laws (...) per member (codes or names.) beta, beta_0 are the
+# logistic law's slope and offset (the MATLAB model used beta = 5.)
+def get_forces(laws, Fs, Fd, beta=5., beta_0=0.):
+    F = Fs + Fd
+    if np.ndim(laws) == 0:
+        return _get_forces(get_law(laws), F, Fs, Fd, beta, beta_0)
+    codes = np.array([get_law(law) for law in np.ravel(laws)]).reshape(np.shape(laws))
+    out = np.zeros(np.shape(F))
+    for code in np.unique(codes):
+        rows = codes == code
+        out[rows] = _get_forces(code, F[rows], Fs[rows], Fd[rows], beta, beta_0)
+    return out
+
+# A helper: one law.
+def _get_forces(code, F, Fs, Fd, beta, beta_0):
+    if code == LINEAR:
+        return F
+    if code == HYBRID or code == PIECEWISE:
+        return np.where(F >= 0, F, 0.)
+    if code == HYBRID_SPLIT:
+        taut = Fs >= 0
+        return np.where(taut, Fs, 0.) + np.where(taut & (Fd >= 0), Fd, 0.)
+    return F * logistic(beta * (F - beta_0))
+
+# The forces whose sign says taut (> 0) or slack, from Fs and Fd, for
+# one law: Fs + Fd, except for hybrid_split, which goes slack with the
+# spring term alone.
+def get_unclipped_forces(law, Fs, Fd):
+    if get_law(law) == HYBRID_SPLIT:
+        return Fs
+    return Fs + Fd
+
+class LawRig(cable_rig.CableRig):
+    # A CableRig whose scalar cable forces follow law (a name or code)
+    # instead of the piecewise one. Everything else (kinematics, control,
+    # V) is the rig's, and it runs on the numpy backend.
+
+    def __init__(self, rig, law, beta=5., beta_0=0.):
+        super().__init__(rig.tags, rig.anchors, rig.k, rig.c, rig.kappa, rig.bar_ell,
+                         rig.bar_v, rig.m, rig.g)
+        self.law = LAWS[get_law(law)]
+        self.beta = float(beta)
+        self.beta_0 = float(beta_0)
+
+    def get_scalar_forces(self, ell, dot_ell, control):
+        return get_forces(self.law, self.k * (ell - control), self.c * dot_ell,
+                          self.beta, self.beta_0)
+
+    def get_unclipped_forces(self, ell, dot_ell, control):
+        return get_unclipped_forces(self.law, self.k * (ell - control), self.c * dot_ell)
+
+    def get_force_law(self):
+        return {'law':self.law, 'beta':self.beta, 'beta_0':self.beta_0}
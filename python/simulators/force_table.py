@@ -0,0 +1,417 @@
+"""
+Lookup tables for cable force laws.
+
+Smooth force laws, like the logistic smoothing of
+logistic_smoothed_spring_damper.m (force_laws.py) or a nonlinear spring
+curve, cost an exp or worse per cable per step. A ForceTable samples a
+law F(stretch, stretch rate), stretch = \ell - v, on a uniform 2D grid
+over a bounded domain, and evaluates it by bilinear or bicubic
+(Catmull-Rom) interpolation: a few gathers and multiply-adds, whatever
+the law costs (compiled, see kernels.py, if Numba is installed, else
+vectorized numpy.) The spacing is chosen for an error bound: starting
+from a coarse grid, the axis with the bigger interpolation error
+(measured halfway between grid points) is refined until the error is
+under tol or the grid reaches max_points per axis. The table then
+measures its max_error at every cell center and edge midpoint and at
+random points, and raises if that is over tol (strict=False keeps the
+table anyway, with max_error to check.) Points outside the domain fall
+back to the law itself (and are counted in num_outside.)
+    rig_t = force_table.tabulate_rig(rig, 'logistic', (-0.05, 0.3), (-8., 8.), tol=0.1)
+    sim = simulation.Simulation(rig_t, pos0, vel0, dt, T)
+Any Cable3D.scalar_force-style law can be tabulated with CableFunction.
+A TabulatedRig always runs on the numpy backend, and its V is still the
+piecewise rig's. Its tables are looked up together, one gather over all
+the cables (TableStack), which only pays off for laws that cost more
+than the lookup. For the logistic law on the box rig (8 cables, each
+with its own (k, c) and table), measured on one core: the force call is
+1.3-1.6x faster than the exact law with 257 x 257 tables for 1-2000
+members (2.8x at 100k), and on par with the 1025-point tables (2x at
+100k), which miss the cache more. A step also computes the kinematics,
+controls and V, so a 200-step, 2000-member box Simulation takes about
+as long either way (0.56 s, vs. 0.50-0.55 s exact.) Sharp laws need
+fine grids: the logistic kink is ~1/(beta k) wide in stretch, so that
+rig gets max_error ~0.03-0.09 N at the 1025 cap (0.3-0.5 N at 257), and
+with tol=0.1, 5000 steps stay within 4E-5 (bilinear) / 4E-6 (bicubic)
+of the exact law.
+"""
+
+# need to do linear alg
+import numpy as np
+from simulators import rig as cable_rig
+from simulators import force_laws
+from simulators import kernels
+
+class LawFunction:
+    # F(stretch, rate) for one of force_laws.LAWS with spring constant k
+    # and damping c (a class rather than a lambda so it can be pickled.)
+
+    def __init__(self, law, k, c, beta=5., beta_0=0.):
+        self.law = force_laws.LAWS[force_laws.get_law(law)]
+        self.k = float(k)
+        self.c = float(c)
+        self.beta = float(beta)
+        self.beta_0 = float(beta_0)
+
+    def __call__(self, stretch, rate):
+        return force_laws.get_forces(self.law, self.k * np.asarray(stretch),
+                                     self.c * np.asarray(rate), self.beta, self.beta_0)
+
+    # The law's forces before clipping, whose sign says taut or slack.
+    def get_unclipped(self, stretch, rate):
+        return force_laws.get_unclipped_forces(self.law, self.k * np.asarray(stretch),
+                                               self.c * np.asarray(rate))
+
+    def get_config(self):
+        return {'law':self.law, 'k':self.k, 'c':self.c, 'beta':self.beta, 'beta_0':self.beta_0}
+
+class CableFunction:
+    # F(stretch, rate) from a cable object's scalar_force(ell, dot_ell,
+    # control_input) (cable_base3D.Cable3D), one point at a time: with the
+    # control input at zero, ell is the stretch.
+
+    def __init__(self, cable):
+        self.cable = cable
+
+    def __call__(self, stretch, rate):
+        return np.vectorize(lambda s, r: float(self.cable.scalar_force(s, r, 0.)))(stretch, rate)
+
+    def get_config(self):
+        return {'cable':type(self.cable).__name__, 'params':dict(self.cable.params)}
+
+class ForceTable:
+    # func(stretch, rate) tabulated over stretch_range x rate_range
+    # ((low, high) each), to within tol, with method 'bilinear' or
+    # 'bicubic'. initial_points and max_points are grid points per axis.
+    # If the grid can't get under tol within max_points, this raises,
+    # unless strict is False.
+
+    def __init__(self, func, stretch_range, rate_range, tol=1E-3, method='bilinear',
+                 initial_points=9, max_points=1025, seed=0, strict=True):
+        if method not in ('bilinear', 'bicubic'):
+            raise Exception('Unknown interpolation ' + str(method) + ', use bilinear or bicubic.')
+        self.func = func
+        self.stretch_range = (float(stretch_range[0]), float(stretch_range[1]))
+        self.rate_range = (float(rate_range[0]), float(rate_range[1]))
+        self.tol = tol
+        self.method = method
+        self.max_points = max_points
+        self.num_evaluated = 0
+        self.num_outside = 0
+        self._build(initial_points, seed)
+        if strict and self.max_error > tol:
+            raise Exception('The ' + str(self.shape[0]) + ' x ' + str(self.shape[1])
+                            + ' table has max_error ' + '{:.3g}'.format(self.max_error)
+                            + ', over tol ' + str(tol) + '. Raise max_points, loosen tol, '
+                            + 'narrow the ranges, or pass strict=False to keep it.')
+
+    # A helper: refine the grid until the interpolation error is under tol.
+    def _build(self, initial_points, seed):
+        nx = initial_points
+        ny = initial_points
+        while True:
+            self._set_grid(nx, ny)
+            ex, ey, ec = self._get_midpoint_errors()
+            err = max(ex, ey, ec)
+            if err <= self.tol or (nx >= self.max_points and ny >= self.max_points):
+                break
+            # refine the worse axis (both, if the centers are worst), or
+            # the other one once an axis is at max_points.
+            refine_x = ex >= ey or ec > max(ex, ey)
+            refine_y = ey > ex or ec > max(ex, ey)
+            if nx >= self.max_points:
+                refine_x, refine_y = False, True
+            if ny >= self.max_points:
+                refine_x, refine_y = True, False
+            if refine_x:
+                nx = min(2 * nx - 1, self.max_points)
+            if refine_y:
+                ny = min(2 * ny - 1, self.max_points)
+        # the reported error: midpoints, plus random points in the domain.
+        rng = np.random.default_rng(seed)
+        s = rng.uniform(*self.stretch_range, 100000)
+        r = rng.uniform(*self.rate_range, 100000)
+        random_err = np.max(np.abs(self._interpolate(s, r) - self.func(s, r)))
+        self.max_error = float(max(err, random_err))
+
+    # A helper: sample func on an nx x ny grid.
+    def _set_grid(self, nx, ny):
+        self.stretches = np.linspace(*self.stretch_range, nx)
+        self.rates = np.linspace(*self.rate_range, ny)
+        self.h = ((self.stretch_range[1] - self.stretch_range[0]) / (nx - 1),
+                  (self.rate_range[1] - self.rate_range[0]) / (ny - 1))
+        S, R = np.meshgrid(self.stretches, self.rates, indexing='ij')
+        self.values = np.asarray(self.func(S, R), dtype=float)
+        if self.method == 'bicubic':
+            # one extra row / column each side, linearly extrapolated.
+            v = self.values
+            v = np.concatenate((2*v[0:1] - v[1:2], v, 2*v[-1:] - v[-2:-1]), axis=0)
+            v = np.concatenate((2*v[:, 0:1] - v[:, 1:2], v, 2*v[:, -1:] - v[:, -2:-1]), axis=1)
+            self._padded = v
+
+    # A helper: the largest interpolation errors halfway between grid
+    # points along stretch, along rate, and at cell centers.
+    def _get_midpoint_errors(self):
+        mid_s = 0.5 * (self.stretches[:-1] + self.stretches[1:])
+        mid_r = 0.5 * (self.rates[:-1] + self.rates[1:])
+        errors = []
+        for s, r in ((mid_s, self.rates), (self.stretches, mid_r), (mid_s, mid_r)):
+            S, R = np.meshgrid(s, r, indexing='ij')
+            errors.append(float(np.max(np.abs(self._interpolate(S, R) - self.func(S, R)))))
+        return errors
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    # The forces at (stretch, rate) (any matching shapes.)
+    def __call__(self, stretch, rate):
+        stretch = np.asarray(stretch, dtype=float)
+        rate = np.asarray(rate, dtype=float)
+        stretch, rate = np.broadcast_arrays(stretch, rate)
+        inside = ((stretch >= self.stretch_range[0]) & (stretch <= self.stretch_range[1])
+                  & (rate >= self.rate_range[0]) & (rate <= self.rate_range[1]))
+        self.num_evaluated += stretch.size
+        if np.all(inside):
+            return self._interpolate(stretch, rate)
+        out = self._interpolate(np.clip(stretch, *self.stretch_range),
+                                np.clip(rate, *self.rate_range))
+        outside = ~inside
+        self.num_outside += int(np.sum(outside))
+        out[outside] = self.func(stretch[outside], rate[outside])
+        return out
+
+    # A helper: interpolate at points inside the domain, with the
+    # compiled kernels if Numba is installed.
+    def _interpolate(self, stretch, rate):
+        if kernels.HAVE_NUMBA:
+            x = np.ascontiguousarray(stretch, dtype=float).ravel()
+            y = np.ascontiguousarray(rate, dtype=float).ravel()
+            out = np.empty(x.shape[0])
+            if self.method == 'bilinear':
+                kernels.table_bilinear(self.values, self.stretch_range[0], self.rate_range[0],
+                                       self.h[0], self.h[1], x, y, out)
+            else:
+                kernels.table_bicubic(self._padded, self.stretch_range[0], self.rate_range[0],
+                                      self.h[0], self.h[1], x, y, out)
+            return out.reshape(np.shape(stretch))
+        nx, ny = self.values.shape
+        x = (stretch - self.stretch_range[0]) / self.h[0]
+        y = (rate - self.rate_range[0]) / self.h[1]
+        i = np.clip(np.floor(x).astype(np.int64), 0, nx - 2)
+        j = np.clip(np.floor(y).astype(np.int64), 0, ny - 2)
+        tx = x - i
+        ty = y - j
+        if self.method == 'bilinear':
+            v = self.values
+            return ((1 - tx) * ((1 - ty) * v[i, j] + ty * v[i, j+1])
+                    + tx * ((1 - ty) * v[i+1, j] + ty * v[i+1, j+1]))
+        # Catmull-Rom, on the padded table (index i there is i-1 here.)
+        wx = _get_cubic_weights(tx)
+        wy = _get_cubic_weights(ty)
+        p = self._padded
+        out = np.zeros(np.shape(stretch))
+        for a in range(4):
+            row = np.zeros(np.shape(stretch))
+            for b in range(4):
+                row += wy[b] * p[i+a, j+b]
+            out += wx[a] * row
+        return out
+
+    def get_config(self):
+        config = self.func.get_config() if hasattr(self.func, 'get_config') else \
+                 {'func':repr(self.func)}
+        config.update({'stretch_range':self.stretch_range, 'rate_range':self.rate_range,
+                       'shape':self.shape, 'method':self.method, 'tol':self.tol,
+                       'max_error':self.max_error})
+        return config
+
+# A helper: the Catmull-Rom weights of the 4 neighbours at fractions t.
+def _get_cubic_weights(t):
+    t2 = t * t
+    t3 = t2 * t
+    return (0.5 * (-t + 2*t2 - t3), 0.5 * (2 - 5*t2 + 3*t3),
+            0.5 * (t + 4*t2 - 3*t3), 0.5 * (-t2 + t3))
+
+# A helper: the distinct tables of a list of them, and the indices of
+# the ones that are each, as [(table, [i, ...]), ...].
+def _get_groups(tables):
+    groups = []
+    for i, table in enumerate(tables):
+        for t, members in groups:
+            if t is table:
+                members.append(i)
+                break
+        else:
+            groups.append((table, [i]))
+    return groups
+
+class TableStack:
+    # Tables for n cables (tables[i] for cable i, all with the same method)
+    # in one flat array, so the forces of all the cables are one gather
+    # instead of a call per table. Each table keeps its own grid and
+    # ranges; offset, nx, ny, x0, x1, y0, y1, hx, hy are (n,), per cable.
+    # Gives the same results as the tables themselves, and counts the
+    # points into their num_evaluated / num_outside.
+
+    def __init__(self, tables):
+        self.tables = list(tables)
+        self.method = self.tables[0].method
+        if any(table.method != self.method for table in self.tables):
+            raise Exception('Can only stack tables with the same interpolation.')
+        self.groups = _get_groups(self.tables)
+        parts = []
+        offsets = []
+        size = 0
+        for table, _ in self.groups:
+            values = table._padded if self.method == 'bicubic' else table.values
+            parts.append(values.ravel())
+            offsets.append(size)
+            size += values.size
+        self.values = np.concatenate(parts)
+        group_of = np.zeros(len(self.tables), dtype=np.int64)
+        for g, (_, cables) in enumerate(self.groups):
+            group_of[cables] = g
+        tables = [self.groups[g][0] for g in group_of]
+        self.offset = np.array(offsets, dtype=np.int64)[group_of]
+        self.nx = np.array([t.shape[0] for t in tables], dtype=np.int64)
+        self.ny = np.array([t.shape[1] for t in tables], dtype=np.int64)
+        self.x0 = np.array([t.stretch_range[0] for t in tables])
+        self.x1 = np.array([t.stretch_range[1] for t in tables])
+        self.y0 = np.array([t.rate_range[0] for t in tables])
+        self.y1 = np.array([t.rate_range[1] for t in tables])
+        self.hx = np.array([t.h[0] for t in tables])
+        self.hy = np.array([t.h[1] for t in tables])
+        self.inv_hx = 1. / self.hx
+        self.inv_hy = 1. / self.hy
+
+    # The forces at (stretch, rate), both (..., n).
+    def __call__(self, stretch, rate):
+        stretch, rate = np.broadcast_arrays(np.asarray(stretch, dtype=float),
+                                            np.asarray(rate, dtype=float))
+        num_points = stretch.size // len(self.tables)
+        for table, cables in self.groups:
+            table.num_evaluated += num_points * len(cables)
+        out, outside = self._interpolate(stretch, rate)
+        if outside is None:
+            return out
+        # (outside the tables, the laws themselves.)
+        for table, cables in self.groups:
+            out_c = outside[..., cables]
+            if np.any(out_c):
+                table.num_outside += int(np.sum(out_c))
+                F = out[..., cables]
+                F[out_c] = table.func(stretch[..., cables][out_c], rate[..., cables][out_c])
+                out[..., cables] = F
+        return out
+
+    # A helper: interpolate, at the points clamped to the tables, with the
+    # compiled kernels if Numba is installed. Returns (forces, which points
+    # are outside their table), the latter None if none are.
+    def _interpolate(self, stretch, rate):
+        shape = np.shape(stretch)
+        if kernels.HAVE_NUMBA:
+            n = len(self.tables)
+            x = np.ascontiguousarray(stretch).reshape(-1, n)
+            y = np.ascontiguousarray(rate).reshape(-1, n)
+            out = np.empty(x.shape)
+            outside = np.empty(x.shape, dtype=np.bool_)
+            kernel = kernels.table_stack_bilinear if self.method == 'bilinear' else \
+                     kernels.table_stack_bicubic
+            num_outside = kernel(self.values, self.offset, self.nx, self.ny, self.x0, self.x1,
+                                 self.y0, self.y1, self.inv_hx, self.inv_hy, x, y, out, outside)
+            return out.reshape(shape), (outside.reshape(shape) if num_outside > 0 else None)
+        outside = ~((stretch >= self.x0) & (stretch <= self.x1)
+                    & (rate >= self.y0) & (rate <= self.y1))
+        if np.any(outside):
+            stretch = np.minimum(np.maximum(stretch, self.x0), self.x1)
+            rate = np.minimum(np.maximum(rate, self.y0), self.y1)
+        else:
+            outside = None
+        x = (stretch - self.x0) / self.hx
+        y = (rate - self.y0) / self.hy
+        i = np.clip(np.floor(x).astype(np.int64), 0, self.nx - 2)
+        j = np.clip(np.floor(y).astype(np.int64), 0, self.ny - 2)
+        tx = x - i
+        ty = y - j
+        v = self.values
+        if self.method == 'bilinear':
+            q = self.offset + i * self.ny + j
+            ny = self.ny
+            return ((1 - tx) * ((1 - ty) * v[q] + ty * v[q+1])
+                    + tx * ((1 - ty) * v[q+ny] + ty * v[q+ny+1])), outside
+        # Catmull-Rom, on the padded tables.
+        wx = _get_cubic_weights(tx)
+        wy = _get_cubic_weights(ty)
+        stride = self.ny + 2
+        out = np.zeros(shape)
+        for a in range(4):
+            row = np.zeros(shape)
+            q = self.offset + (i + a) * stride + j
+            for b in range(4):
+                row += wy[b] * v[q+b]
+            out += wx[a] * row
+        return out, outside
+
+class TabulatedRig(cable_rig.CableRig):
+    # A CableRig whose scalar cable forces come from tables, tables[i] for
+    # cable i (cables with the same constants can share one.) Everything
+    # else (kinematics, control, V) is the rig's. If the tables all use
+    # the same interpolation, they're looked up together (TableStack.)
+
+    def __init__(self, rig, tables):
+        super().__init__(rig.tags, rig.anchors, rig.k, rig.c, rig.kappa, rig.bar_ell,
+                         rig.bar_v, rig.m, rig.g)
+        if len(tables) != self.num_cables:
+            raise Exception('Need one table per cable, got ' + str(len(tables)) + '.')
+        self.tables = list(tables)
+        # the distinct tables, and the cables that use each.
+        self._groups = _get_groups(self.tables)
+        self._stack = None
+        if all(table.method == self.tables[0].method for table in self.tables):
+            self._stack = TableStack(self.tables)
+
+    def get_scalar_forces(self, ell, dot_ell, control):
+        stretch = ell - control
+        if self._stack is not None:
+            return self._stack(stretch, dot_ell)
+        F = np.zeros(np.shape(stretch))
+        for table, cables in self._groups:
+            F[..., cables] = table(stretch[..., cables], dot_ell[..., cables])
+        return F
+
+    # From each table's function where it has get_unclipped (LawFunction),
+    # else the piecewise rig's k (\ell - v) + c \dot \ell.
+    def get_unclipped_forces(self, ell, dot_ell, control):
+        F = super().get_unclipped_forces(ell, dot_ell, control)
+        stretch = ell - control
+        for table, cables in self._groups:
+            if hasattr(table.func, 'get_unclipped'):
+                F[..., cables] = table.func.get_unclipped(stretch[..., cables],
+                                                          dot_ell[..., cables])
+        return F
+
+    def get_force_law(self):
+        return {'tables':[table.get_config() for table, _ in self._groups],
+                'cables':[cables for _, cables in self._groups]}
+
+    # The largest reported error of the tables.
+    @property
+    def max_error(self):
+        return max(table.max_error for table, _ in self._groups)
+
+# Tabulate one of force_laws.LAWS for each distinct (k, c) of the rig's
+# cables, and return the TabulatedRig. Keyword arguments go to ForceTable.
+def tabulate_rig(rig, law, stretch_range, rate_range, beta=5., beta_0=0., **kwargs):
+    tables = {}
+    per_cable = []
+    for i in range(rig.num_cables):
+        key = (rig.k[i], rig.c[i])
+        if key not in tables:
+            tables[key] = ForceTable(LawFunction(law, rig.k[i], rig.c[i], beta, beta_0),
+                                     stretch_range, rate_range, **kwargs)
+        per_cable.append(tables[key])
+    return TabulatedRig(rig, per_cable)
@@ -0,0 +1,67 @@
+"""
+The fixed geometry of a rig's anchors, for cable lengths of many points.
+
+The anchors never move, so everything about them is computed once: they
+are shifted to their centroid (which keeps the numbers below small), and
+the matrix -2 a^T and the squared norms |a|^2 are kept. Then the squared
+lengths of n cables at M positions r are
+    |r - a|^2 = |r|^2 - 2 r . a + |a|^2
+which is one (M, 3) x (3, n) matrix product plus two broadcast adds,
+instead of an (M, n, 3) array of differences. When a length is small
+next to |r| and |a| that subtraction loses digits (all of them at zero
+length), so entries with |r - a|^2 < rel_tol (|r|^2 + |a|^2) are
+computed again from the differences. With the default rel_tol, lengths
+agree with the direct computation to about 1E-12 relative.
+    geometry = RigGeometry(rig.anchors)
+    ell = geometry.get_lengths(points)       # (M, 3) -> (M, n)
+Used by CableRig.get_lengths(pos, batched=True) (rig.py.) The simulation
+itself keeps the direct computation, which matches the object-based
+scripts bit for bit.
+"""
+
+# need to do linear alg
+import numpy as np
+
+class RigGeometry:
+    # anchors (n, 3). chunk_size is the number of points done at a time
+    # (to bound the temporary memory for large batches.)
+
+    def __init__(self, anchors, rel_tol=1E-4, chunk_size=8192):
+        self.anchors = np.array(anchors, dtype=float).reshape((-1, 3))
+        self.num_cables = self.anchors.shape[0]
+        self.rel_tol = rel_tol
+        self.chunk_size = chunk_size
+        self.center = np.mean(self.anchors, axis=0)
+        centered = self.anchors - self.center
+        # -2 a^T, (3, n), contiguous for the matrix product.
+        self.anchors_T2 = np.ascontiguousarray(-2. * centered.T)
+        self.anchor_sq = np.sum(centered**2, axis=1)
+
+    # Squared lengths (M, n) of positions (M, 3), into out if given.
+    def get_sq_lengths(self, pos, out=None):
+        pos = np.asarray(pos, dtype=float)
+        r = pos - self.center
+        r_sq = np.sum(r**2, axis=1)
+        out = np.matmul(r, self.anchors_T2, out=out)
+        out += r_sq[:, np.newaxis]
+        out += self.anchor_sq
+        # near zero length: redo those from the differences (of the
+        # original coordinates, since centering rounds too.)
+        bad = out < self.rel_tol * (r_sq[:, np.newaxis] + self.anchor_sq)
+        if np.any(bad):
+            rows, cols = np.nonzero(bad)
+            diff = pos[rows] - self.anchors[cols]
+            out[rows, cols] = np.sum(diff**2, axis=1)
+        return out
+
+    # Cable lengths (..., n) of positions (..., 3).
+    def get_lengths(self, pos):
+        pos = np.asarray(pos, dtype=float)
+        flat = pos.reshape((-1, 3))
+        M = flat.shape[0]
+        out = np.empty((M, self.num_cables))
+        for lo in range(0, M, self.chunk_size):
+            hi = min(lo + self.chunk_size, M)
+            self.get_sq_lengths(flat[lo:hi], out=out[lo:hi])
+        np.sqrt(out, out=out)
+        return out.reshape(pos.shape[:-1] + (self.num_cables,))
@@ -0,0 +1,52 @@
+"""
+Time steppers for the closed-loop rig, \dot x = f(x) with f from
+CableRig.state_deriv, all of them in place on a batch of states (N, 6):
+    'euler'          forward Euler, what Simulation does (same bits.)
+    'semi_implicit'  symplectic Euler: velocity first, then the position
+                     with the new velocity. Same cost as forward Euler.
+    'heun'           Heun's method (explicit trapezoid), 2nd order.
+    'rk4'            classic Runge-Kutta, 4th order.
+The cable forces have a kink where a cable goes slack, so the higher
+order methods only get their full order between slack events.
+    step = integrators.get_integrator('rk4')
+    for t in range(num_steps):
+        step(rig, state, dt)
+"""
+
+# One forward Euler step.
+def euler_step(rig, state, dt):
+    deriv, _, _ = rig.state_deriv(state)
+    state += dt * deriv
+
+# One semi-implicit (symplectic) Euler step.
+def semi_implicit_step(rig, state, dt):
+    deriv, _, _ = rig.state_deriv(state)
+    state[..., 3:6] += dt * deriv[..., 3:6]
+    state[..., 0:3] += dt * state[..., 3:6]
+
+# One step of Heun's method.
+def heun_step(rig, state, dt):
+    k1, _, _ = rig.state_deriv(state)
+    k2, _, _ = rig.state_deriv(state + dt * k1)
+    state += (0.5 * dt) * (k1 + k2)
+
+# One classic Runge-Kutta step.
+def rk4_step(rig, state, dt):
+    k1, _, _ = rig.state_deriv(state)
+    k2, _, _ = rig.state_deriv(state + (0.5 * dt) * k1)
+    k3, _, _ = rig.state_deriv(state + (0.5 * dt) * k2)
+    k4, _, _ = rig.state_deriv(state + dt * k3)
+    state += (dt / 6.) * (k1 + 2. * k2 + 2. * k3 + k4)
+
+INTEGRATORS = {'euler':euler_step, 'semi_implicit':semi_implicit_step,
+               'heun':heun_step, 'rk4':rk4_step}
+# evaluations of f per step, and the order for smooth f.
+NUM_EVALUATIONS = {'euler':1, 'semi_implicit':1, 'heun':2, 'rk4':4}
+ORDERS = {'euler':1, 'semi_implicit':1, 'heun':2, 'rk4':4}
+
+# The step function of an integrator, by name.
+def get_integrator(name):
+    if name not in INTEGRATORS:
+        raise Exception('Unknown integrator ' + str(name) + ', use one of '
+                        + ', '.join(INTEGRATORS) + '.')
+    return INTEGRATORS[name]
@@ -0,0 +1,255 @@
+"""
+Compiled step kernels for the cable rig (see rig.py), for when per-step
+Python / numpy call overhead dominates, e.g. a single 8-cable trajectory.
+One call advances every ensemble member through kinematics, affine
+control, rectified cable forces, gravity, and the forward Euler update.
+
+The kernels are compiled with Numba if it's installed. If not,
+HAVE_NUMBA is False and the simulator uses the vectorized numpy path in
+rig.py instead (the functions here still work, just slowly, as plain Python.)
+The arithmetic is written in the same order as the object-based model,
+so results match the reference path to the last bit or within roundoff.
+"""
+
+# need to do linear alg
+import numpy as np
+import math
+
+# Numba is optional.
+try:
+    import numba
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+# Compile a function if we can, otherwise leave it as-is.
+def _jit(func):
+    if HAVE_NUMBA:
+        return numba.njit(cache=True)(func)
+    return func
+
+# One forward Euler step, in place on state (N, 6).
+# Writes the lengths, controls, and scalar forces (all (N, n)) that were
+# used for this step into ell, control, and force.
+@_jit
+def rig_step(state, anchors, k, c, kappa, bar_ell, bar_v, m, g, dt,
+             ell, control, force):
+    N = state.shape[0]
+    n = anchors.shape[0]
+    for j in range(N):
+        px = state[j, 0]
+        py = state[j, 1]
+        pz = state[j, 2]
+        vx = state[j, 3]
+        vy = state[j, 4]
+        vz = state[j, 5]
+        # \sum F, in cable order
+        sx = 0.
+        sy = 0.
+        sz = 0.
+        for i in range(n):
+            # kinematics
+            dx = px - anchors[i, 0]
+            dy = py - anchors[i, 1]
+            dz = pz - anchors[i, 2]
+            ell_i = math.sqrt(dx * dx + dy * dy + dz * dz)
+            ux = dx / ell_i
+            uy = dy / ell_i
+            uz = dz / ell_i
+            dot_ell_i = vx * ux + vy * uy + vz * uz
+            # affine output feedback
+            v_i = kappa[i] * (ell_i - bar_ell[i]) + bar_v[i]
+            # rectified spring-damper
+            F_i = k[i] * (ell_i - v_i) + c[i] * dot_ell_i
+            if not F_i >= 0:
+                F_i = 0.
+            ell[j, i] = ell_i
+            control[j, i] = v_i
+            force[j, i] = F_i
+            # force on the mass is -F_i \hat \ell_i
+            sx += -(ux * F_i)
+            sy += -(uy * F_i)
+            sz += -(uz * F_i)
+        # accel, with gravity in -Z
+        ax = (1 / m) * sx
+        ay = (1 / m) * sy
+        az = (1 / m) * sz
+        az += -g
+        # forward Euler
+        state[j, 0] = px + dt * vx
+        state[j, 1] = py + dt * vy
+        state[j, 2] = pz + dt * vz
+        state[j, 3] = vx + dt * ax
+        state[j, 4] = vy + dt * ay
+        state[j, 5] = vz + dt * az
+
+# The Lyapunov function for each state, written into V (N,).
+# Same as CableRig.get_V.
+@_jit
+def rig_V(state, anchors, k, kappa, bar_ell, bar_v, m, g, V):
+    N = state.shape[0]
+    n = anchors.shape[0]
+    for j in range(N):
+        vx = state[j, 3]
+        vy = state[j, 4]
+        vz = state[j, 5]
+        KE = 0.5 * m * (vx**2 + vy**2 + vz**2)
+        PE = m * g * state[j, 2]
+        Uf = 0.
+        for i in range(n):
+            dx = state[j, 0] - anchors[i, 0]
+            dy = state[j, 1] - anchors[i, 1]
+            dz = state[j, 2] - anchors[i, 2]
+            ell_i = math.sqrt(dx * dx + dy * dy + dz * dz)
+            alpha = 1 - kappa[i]
+            beta = kappa[i] * bar_ell[i] - bar_v[i]
+            Uf += 0.5 * k[i] * alpha * ell_i**2 + k[i] * beta * ell_i
+        V[j] = (KE + PE) + Uf
+
+# Many steps in one call. Records into the (N, T+1, ...) histories,
+# starting at step index t0 (so state_history[:, t0] is the current state.)
+@_jit
+def rig_run(state, num_steps, t0, anchors, k, c, kappa, bar_ell, bar_v, m, g,
+            dt, state_history, control_history, force_history, V_history,
+            ell, control, force, V):
+    for t in range(t0, t0 + num_steps):
+        rig_step(state, anchors, k, c, kappa, bar_ell, bar_v, m, g, dt,
+                 ell, control, force)
+        rig_V(state, anchors, k, kappa, bar_ell, bar_v, m, g, V)
+        state_history[:, t+1, :] = state
+        control_history[:, t, :] = control
+        force_history[:, t, :] = force
+        V_history[:, t+1] = V
+
+# Bilinear lookup in a table values (nx, ny) sampled at x0 + i hx,
+# y0 + j hy, at points (x, y) (1D, inside the table), into out.
+@_jit
+def table_bilinear(values, x0, y0, hx, hy, x, y, out):
+    nx = values.shape[0]
+    ny = values.shape[1]
+    inv_hx = 1. / hx
+    inv_hy = 1. / hy
+    for p in range(x.shape[0]):
+        u = (x[p] - x0) * inv_hx
+        w = (y[p] - y0) * inv_hy
+        i = min(max(int(math.floor(u)), 0), nx - 2)
+        j = min(max(int(math.floor(w)), 0), ny - 2)
+        tx = u - i
+        ty = w - j
+        out[p] = ((1 - tx) * ((1 - ty) * values[i, j] + ty * values[i, j+1])
+                  + tx * ((1 - ty) * values[i+1, j] + ty * values[i+1, j+1]))
+
+# The Catmull-Rom weights of the 4 neighbours at fraction t, into weights.
+@_jit
+def cubic_weights(t, weights):
+    t2 = t * t
+    t3 = t2 * t
+    weights[0] = 0.5 * (-t + 2*t2 - t3)
+    weights[1] = 0.5 * (2 - 5*t2 + 3*t3)
+    weights[2] = 0.5 * (t + 4*t2 - 3*t3)
+    weights[3] = 0.5 * (-t2 + t3)
+
+# Catmull-Rom lookup, as table_bilinear, in a table padded with one extra
+# row and column on each side (so padded[i+1, j+1] is at x0 + i hx, y0 + j hy.)
+@_jit
+def table_bicubic(padded, x0, y0, hx, hy, x, y, out):
+    nx = padded.shape[0] - 2
+    ny = padded.shape[1] - 2
+    wx = np.empty(4)
+    wy = np.empty(4)
+    inv_hx = 1. / hx
+    inv_hy = 1. / hy
+    for p in range(x.shape[0]):
+        u = (x[p] - x0) * inv_hx
+        w = (y[p] - y0) * inv_hy
+        i = min(max(int(math.floor(u)), 0), nx - 2)
+        j = min(max(int(math.floor(w)), 0), ny - 2)
+        cubic_weights(u - i, wx)
+        cubic_weights(w - j, wy)
+        total = 0.
+        for a in range(4):
+            row = 0.
+            for b in range(4):
+                row += wy[b] * padded[i+a, j+b]
+            total += wx[a] * row
+        out[p] = total
+
+# Bilinear lookups in many tables at once: column c of the points (x, y,
+# both (M, n)) is looked up in table c, stored row-major in the flat
+# array values from offset[c], nx[c] x ny[c] points sampled at
+# x0[c] + i hx[c], y0[c] + j hy[c] (inv_hx = 1 / hx, inv_hy = 1 / hy.)
+# Points outside [x0, x1] x [y0, y1] are clamped to it, and flagged in
+# outside (M, n). Into out (M, n). Returns the number outside.
+@_jit
+def table_stack_bilinear(values, offset, nx, ny, x0, x1, y0, y1, inv_hx, inv_hy,
+                         x, y, out, outside):
+    num_outside = 0
+    for c in range(x.shape[1]):
+        lo_x = x0[c]
+        hi_x = x1[c]
+        lo_y = y0[c]
+        hi_y = y1[c]
+        last_i = nx[c] - 2
+        last_j = ny[c] - 2
+        stride = ny[c]
+        for p in range(x.shape[0]):
+            xp = x[p, c]
+            yp = y[p, c]
+            out_p = not (xp >= lo_x and xp <= hi_x and yp >= lo_y and yp <= hi_y)
+            outside[p, c] = out_p
+            if out_p:
+                num_outside += 1
+                xp = min(max(xp, lo_x), hi_x)
+                yp = min(max(yp, lo_y), hi_y)
+            u = (xp - lo_x) * inv_hx[c]
+            w = (yp - lo_y) * inv_hy[c]
+            # (u, w >= 0 once clamped, so int() is floor.)
+            i = min(max(int(u), 0), last_i)
+            j = min(max(int(w), 0), last_j)
+            tx = u - i
+            ty = w - j
+            q = offset[c] + i * stride + j
+            out[p, c] = ((1 - tx) * ((1 - ty) * values[q] + ty * values[q+1])
+                         + tx * ((1 - ty) * values[q+stride] + ty * values[q+stride+1]))
+    return num_outside
+
+# Catmull-Rom lookups in many tables at once, as table_stack_bilinear,
+# in tables padded as for table_bicubic (each (nx[c] + 2) x (ny[c] + 2).)
+@_jit
+def table_stack_bicubic(padded, offset, nx, ny, x0, x1, y0, y1, inv_hx, inv_hy,
+                        x, y, out, outside):
+    num_outside = 0
+    wx = np.empty(4)
+    wy = np.empty(4)
+    for c in range(x.shape[1]):
+        lo_x = x0[c]
+        hi_x = x1[c]
+        lo_y = y0[c]
+        hi_y = y1[c]
+        last_i = nx[c] - 2
+        last_j = ny[c] - 2
+        stride = ny[c] + 2
+        for p in range(x.shape[0]):
+            xp = x[p, c]
+            yp = y[p, c]
+            out_p = not (xp >= lo_x and xp <= hi_x and yp >= lo_y and yp <= hi_y)
+            outside[p, c] = out_p
+            if out_p:
+                num_outside += 1
+                xp = min(max(xp, lo_x), hi_x)
+                yp = min(max(yp, lo_y), hi_y)
+            u = (xp - lo_x) * inv_hx[c]
+            w = (yp - lo_y) * inv_hy[c]
+            i = min(max(int(u), 0), last_i)
+            j = min(max(int(w), 0), last_j)
+            cubic_weights(u - i, wx)
+            cubic_weights(w - j, wy)
+            total = 0.
+            for a in range(4):
+                row = 0.
+                q = offset[c] + (i + a) * stride + j
+                for b in range(4):
+                    row += wy[b] * padded[q+b]
+                total += wx[a] * row
+            out[p, c] = total
+    return num_outside
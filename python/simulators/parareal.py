@@ -0,0 +1,238 @@
+"""
+Parareal: time-parallel simulation of one long trajectory. The horizon is
+cut into num_slices slices. A cheap coarse propagator G guesses the state
+at every slice boundary, one after another. Then each iteration runs the
+accurate fine propagator F (Simulation, so the same forward Euler) over
+all the slices at once on a process pool, from the current guesses, and
+corrects the boundaries in one cheap serial sweep:
+    U_{s+1} <- G(U_s new) + F(U_s old) - G(U_s old)
+After k iterations the first k slices are exact (they are no longer run,
+nor are slices whose start hasn't moved by more than tol), so it takes at
+most num_slices iterations, and once the boundaries stop moving (by less
+than tol) the trajectory is the fine one to within tol. With K iterations on P workers the run takes
+about K / min(P, num_slices) of the serial time, plus the coarse sweeps,
+so it pays when K is small: few iterations for the box rig, since the
+closed loop is damped and the slices near the equilibrium agree at once.
+The coarse propagator is one of the integrators (integrators.py) with a
+big step, about coarse_dt ('euler' runs on Simulation, so compiled like
+the fine one), or 'linearized', the rig linearized at the equilibrium (an
+affine ODE, stepped exactly by its matrix exponential, so one small
+matrix product per slice.) The coarse step has to be stable: forward
+Euler on the box rig is at 0.01 s (the scripts' 100 Hz), not much more.
+Parareal only beats the serial run when the coarse sweeps are much
+cheaper than the fine work, e.g. the compiled box rig at dt = 1E-3 does
+1.2M steps in 0.3 s, so a long run there wants 'linearized', while a rig
+on the numpy backend (force_laws.LawRig, force_table.TabulatedRig) gains
+with either. Example:
+    par = parareal.Parareal(rig, pos0, vel0, dt, num_timesteps, num_slices=64,
+                            coarse='linearized', equilibrium=bar_r, record_every=100)
+    results = par.run(num_workers=None, verbose=True)
+    results['state']    # (num_timesteps / record_every + 1, 6)
+"""
+
+# need to do linear alg
+import numpy as np
+import time
+import concurrent.futures
+from simulators import simulation
+from simulators import integrators
+
+# The fine propagator for one slice: num_steps of Simulation from state
+# (6,). Runs in a worker. Returns the final state, the state and V
+# every record_every steps (from the start), and the seconds taken.
+def run_slice(rig, state, dt, num_steps, backend, record_every):
+    start = time.time()
+    sim = simulation.Simulation(rig, state[0:3], state[3:6], dt, num_steps, backend=backend)
+    results = sim.run()
+    return (results['state'][-1].copy(), results['state'][::record_every].copy(),
+            results['V'][::record_every].copy(), time.time() - start)
+
+# A helper: the matrix exponential of a small matrix, by scaling and
+# squaring a Taylor series.
+def _expm(M):
+    norm = np.max(np.sum(np.abs(M), axis=1))
+    squarings = max(0, int(np.ceil(np.log2(norm))) + 1) if norm > 0 else 0
+    A = M / 2.**squarings
+    out = np.eye(M.shape[0])
+    term = np.eye(M.shape[0])
+    for j in range(1, 20):
+        term = term @ A / j
+        out = out + term
+    for _ in range(squarings):
+        out = out @ out
+    return out
+
+class Parareal:
+    # One trajectory of rig from pos0, vel0 (3-vectors), num_timesteps of
+    # dt, in num_slices slices. coarse is an integrator name, with steps
+    # of about coarse_dt, or 'linearized' (needs equilibrium, (3,).)
+    # Iterates until the slice boundaries move by less than tol (in the
+    # state's units), or max_iterations (at most num_slices, after which
+    # the trajectory is exactly the fine one.) backend is the fine
+    # Simulation's ('jit' falls back to numpy where it can't be used.)
+    # record_every keeps every so many steps of the fine trajectory; it
+    # has to divide num_timesteps.
+
+    def __init__(self, rig, pos0, vel0, dt, num_timesteps, num_slices=32, coarse='euler',
+                 coarse_dt=0.01, equilibrium=None, tol=1E-9, max_iterations=None,
+                 backend='jit', record_every=1):
+        if num_timesteps % record_every != 0:
+            raise Exception('record_every ' + str(record_every)
+                            + ' does not divide num_timesteps ' + str(num_timesteps) + '.')
+        self.rig = rig
+        self.dt = dt
+        self.num_timesteps = num_timesteps
+        self.tol = tol
+        self.backend = backend
+        self.record_every = record_every
+        # slice boundaries (in steps), on the recording grid.
+        num_records = num_timesteps // record_every
+        num_slices = max(1, min(num_slices, num_records))
+        self.bounds = record_every * np.linspace(0, num_records, num_slices + 1).astype(int)
+        self.num_slices = num_slices
+        if max_iterations is None:
+            max_iterations = num_slices
+        self.max_iterations = min(max_iterations, num_slices)
+        self.x0 = np.concatenate((np.asarray(pos0, dtype=float), np.asarray(vel0, dtype=float)))
+        self.coarse = coarse
+        self.coarse_dt = coarse_dt
+        if coarse == 'linearized':
+            if equilibrium is None:
+                raise Exception('The linearized coarse propagator needs the equilibrium.')
+            self._linearize(np.asarray(equilibrium, dtype=float))
+        else:
+            self._coarse_step = integrators.get_integrator(coarse)
+        # per iteration: the largest boundary change, and the fine seconds
+        # of each slice that was run.
+        self.changes = []
+        self.slice_seconds = []
+        self.coarse_seconds = 0.
+
+    # A helper: the affine model \dot x = b + A (x - x_eq) at the
+    # equilibrium (by central differences), as the augmented matrix whose
+    # exponential steps it exactly.
+    def _linearize(self, equilibrium, h=1E-6):
+        x_eq = np.concatenate((equilibrium, np.zeros(3)))
+        M = np.zeros((7, 7))
+        for j in range(6):
+            e = np.zeros(6)
+            e[j] = h
+            plus, _, _ = self.rig.state_deriv(x_eq + e)
+            minus, _, _ = self.rig.state_deriv(x_eq - e)
+            M[0:6, j] = (plus - minus) / (2 * h)
+        M[0:6, 6], _, _ = self.rig.state_deriv(x_eq)
+        self._x_eq = x_eq
+        self._M = M
+        self._expm_cache = {}
+
+    # The coarse propagator G over num_steps fine steps, from state (6,).
+    def propagate_coarse(self, state, num_steps):
+        span = num_steps * self.dt
+        if self.coarse == 'linearized':
+            if num_steps not in self._expm_cache:
+                self._expm_cache[num_steps] = _expm(self._M * span)
+            phi = self._expm_cache[num_steps]
+            return self._x_eq + phi[0:6, 0:6] @ (state - self._x_eq) + phi[0:6, 6]
+        num_coarse = max(1, int(round(span / self.coarse_dt)))
+        if self.coarse == 'euler':
+            sim = simulation.Simulation(self.rig, state[0:3], state[3:6], span / num_coarse,
+                                        num_coarse, backend=self.backend)
+            return sim.run()['state'][-1].copy()
+        out = np.array(state, dtype=float)
+        for _ in range(num_coarse):
+            self._coarse_step(self.rig, out, span / num_coarse)
+        return out
+
+    # A helper: G over slice s.
+    def _coarse(self, s, state):
+        start = time.time()
+        # (an unstable coarse step overflows; that's caught below.)
+        with np.errstate(over='ignore', invalid='ignore'):
+            out = self.propagate_coarse(state, self.bounds[s+1] - self.bounds[s])
+        self.coarse_seconds += time.time() - start
+        if not np.all(np.isfinite(out)):
+            raise Exception('The coarse propagator blew up in slice ' + str(s) + ', use a '
+                            + 'smaller coarse_dt or the linearized one.')
+        return out
+
+    # Run to convergence on num_workers processes (None is one per core,
+    # 1 runs here.) Returns the fine trajectory as a dict of 'state' and
+    # 'V', every record_every steps.
+    def run(self, num_workers=None, verbose=False):
+        start = time.time()
+        S = self.num_slices
+        U = [self.x0] + [None] * S
+        G = [None] * S
+        for s in range(S):
+            G[s] = self._coarse(s, U[s])
+            U[s+1] = G[s]
+        fine = [None] * S
+        fine_start = [None] * S
+        converged = False
+        pool = None
+        if num_workers != 1:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=num_workers)
+        try:
+            for k in range(self.max_iterations):
+                # slices before k start from exact states and are done, and
+                # slices whose start moved by no more than tol are kept.
+                todo = [s for s in range(k, S) if fine_start[s] is None
+                        or np.max(np.abs(U[s] - fine_start[s])) > self.tol]
+                args = [(self.rig, U[s], self.dt, self.bounds[s+1] - self.bounds[s],
+                         self.backend, self.record_every) for s in todo]
+                if pool is None:
+                    outputs = [run_slice(*a) for a in args]
+                else:
+                    outputs = list(pool.map(run_slice, *zip(*args)))
+                for s, output in zip(todo, outputs):
+                    fine[s] = output
+                    fine_start[s] = U[s]
+                self.slice_seconds.append([output[3] for output in outputs] + [0.])
+                # the serial correction sweep.
+                new_U = U[0:k+1]
+                for s in range(k, S):
+                    g = self._coarse(s, new_U[s])
+                    new_U.append(g + fine[s][0] - G[s])
+                    G[s] = g
+                change = max(np.max(np.abs(new_U[s] - U[s])) for s in range(k + 1, S + 1))
+                U = new_U
+                self.changes.append(float(change))
+                if verbose:
+                    print('Iteration ' + str(k + 1) + ': boundaries moved by '
+                          + '{:.3g}'.format(change) + ', ' + str(len(todo)) + ' slices, '
+                          + '{:.1f}'.format(time.time() - start) + ' s')
+                # (after num_slices iterations every slice is exact.)
+                if change <= self.tol or k + 1 == S:
+                    converged = True
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.num_iterations = len(self.changes)
+        self.converged = converged
+        self.seconds = time.time() - start
+        # the fine trajectory of the last iteration (each slice from the
+        # boundary it was run from.)
+        self.results = {'state':np.concatenate([fine[0][1]] + [f[1][1:] for f in fine[1:]]),
+                        'V':np.concatenate([fine[0][2]] + [f[2][1:] for f in fine[1:]])}
+        self.final_state = U[S]
+        return self.results
+
+    # The speedup parareal could get with a worker per slice, from the
+    # measured times: all the fine work done serially (one pass, from the
+    # slices of the first iteration) over the critical path (the slowest
+    # slice of each iteration, plus the coarse sweeps.)
+    def get_ideal_speedup(self):
+        serial = sum(self.slice_seconds[0])
+        path = sum(max(seconds) for seconds in self.slice_seconds) + self.coarse_seconds
+        return serial / path
+
+    # A short summary of the last run.
+    def print_report(self):
+        print('Parareal: ' + str(self.num_timesteps) + ' steps of ' + str(self.dt) + ' s in '
+              + str(self.num_slices) + ' slices, coarse ' + self.coarse + ', '
+              + str(self.num_iterations) + ' iterations ('
+              + ('converged' if self.converged else 'not converged') + ', last change '
+              + '{:.3g}'.format(self.changes[-1]) + '), ' + '{:.1f}'.format(self.seconds)
+              + ' s, ideal speedup ' + '{:.1f}'.format(self.get_ideal_speedup())
+              + 'x with ' + str(self.num_slices) + ' workers')
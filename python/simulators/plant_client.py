@@ -0,0 +1,111 @@
+"""
+Reference client for the plant server (plant_server.py): closes the loop
+over the socket with the per-cable controllers from controllers/linear.py,
+and measures the round-trip latency of every sense-compute-actuate cycle.
+"""
+
+# need to do linear alg
+import numpy as np
+import asyncio
+import time
+from simulators import plant_server
+from controllers import linear
+
+# Controllers for every cable of a rig, from its constants (like the scripts.)
+def make_controllers(rig):
+    controllers = {}
+    for i, tag in enumerate(rig.tags):
+        controllers[tag] = linear.AffineFeedback(kappa = rig.kappa[i],
+                                                 bar_ell = rig.bar_ell[i],
+                                                 bar_v = rig.bar_v[i])
+    return controllers
+
+class LoopResults:
+    # What the client saw: the observed states and lengths, the commands
+    # it sent, and per step the round-trip time (command sent to
+    # observation received), the controller's compute time, and the
+    # server's step time, all in seconds.
+
+    def __init__(self, tags, dt):
+        self.tags = tags
+        self.dt = dt
+        self.states = []
+        self.lengths = []
+        self.commands = []
+        self.round_trip = []
+        self.compute = []
+        self.server_step = []
+
+    # Percentiles of the timings, in seconds.
+    def get_report(self, percentiles=(50, 90, 99, 99.9)):
+        report = {'num_steps':len(self.round_trip)}
+        for name in ['round_trip', 'compute', 'server_step']:
+            values = np.array(getattr(self, name))
+            if len(values) == 0:
+                continue
+            report[name + '_mean'] = float(np.mean(values))
+            report[name + '_max'] = float(np.max(values))
+            for p in percentiles:
+                report[name + '_p' + str(p)] = float(np.percentile(values, p))
+        return report
+
+    def print_report(self):
+        report = self.get_report()
+        print('Software-in-the-loop: ' + str(report['num_steps']) + ' steps')
+        if report['num_steps'] == 0:
+            return
+        for name in ['round_trip', 'compute', 'server_step']:
+            print(name + ' (us): mean ' + '{:.1f}'.format(1e6 * report[name + '_mean'])
+                  + ', p50 ' + '{:.1f}'.format(1e6 * report[name + '_p50'])
+                  + ', p99 ' + '{:.1f}'.format(1e6 * report[name + '_p99'])
+                  + ', max ' + '{:.1f}'.format(1e6 * report[name + '_max']))
+
+# Connect to a plant server and run the loop until the server is done
+# (or for num_steps steps.) controllers is a dict of tag -> object with v(ell).
+async def run_client(controllers, address=('127.0.0.1', 8765), num_steps=None):
+    if isinstance(address, str):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(address[0], address[1])
+    msg_type, payload = await plant_server.read_message(reader)
+    if msg_type != plant_server.HELLO:
+        raise Exception('Expected HELLO from the plant server.')
+    tags, dt, num_timesteps = plant_server.unpack_hello(payload)
+    if num_steps is None:
+        num_steps = num_timesteps
+    n = len(tags)
+    results = LoopResults(tags, dt)
+    control = np.zeros(n)
+    seq = 0
+    # the initial observation
+    msg_type, payload = await plant_server.read_message(reader)
+    try:
+        while msg_type == plant_server.OBSERVATION:
+            _, step, step_time, lengths, state = plant_server.unpack_observation(payload, n)
+            results.states.append(np.array(state))
+            results.lengths.append(np.array(lengths))
+            if step >= num_timesteps or seq >= num_steps:
+                break
+            # compute
+            start = time.perf_counter()
+            for i, tag in enumerate(tags):
+                control[i] = controllers[tag].v(lengths[i])
+            sent = time.perf_counter()
+            results.compute.append(sent - start)
+            results.commands.append(control.copy())
+            # actuate, then wait for the plant to sense
+            seq += 1
+            writer.write(plant_server.pack_message(plant_server.COMMAND,
+                                                   plant_server.pack_command(seq, control)))
+            await writer.drain()
+            msg_type, payload = await plant_server.read_message(reader)
+            if msg_type == plant_server.OBSERVATION:
+                results.round_trip.append(time.perf_counter() - sent)
+                results.server_step.append(_unpack_step_time(payload))
+    finally:
+        writer.close()
+    return results
+
+# A helper: just the server's step time from an OBSERVATION payload.
+def _unpack_step_time(payload):
+    return plant_server._OBS_HEAD.unpack_from(payload)[2]
@@ -0,0 +1,151 @@
+"""
+Asyncio plant server for software-in-the-loop testing: the cable robot
+simulation on one side of a local socket, the controller on the other.
+
+The loop is lock-step sense-compute-actuate. On connect, the server sends
+a HELLO (cable tags, dt) and an OBSERVATION of the initial condition.
+Then, per step, the client sends a COMMAND (the rest length for every
+cable), the server applies it for one timestep, and replies with the next
+OBSERVATION (cable lengths and point mass state.) When the simulation
+reaches num_timesteps the server sends DONE and closes the connection.
+
+Framing is binary, little-endian. Every message is an 8-byte header
+    magic b'CS' (2s), version (B), message type (B), payload length (I)
+followed by the payload:
+    HELLO       num_cables (H), dt (d), num_timesteps (I), then the tags
+                as utf-8 joined by newlines
+    COMMAND     seq (I), then num_cables rest lengths (d each)
+    OBSERVATION seq (I) echoed from the command (0 for the initial one),
+                step (I), server step time in s (d), then num_cables
+                lengths (d each), then the state (6 d)
+    DONE        empty
+The server listens on TCP localhost (address = (host, port)) or on a
+Unix domain socket (address = a filesystem path.)
+"""
+
+# need to do linear alg
+import numpy as np
+import asyncio
+import struct
+import time
+
+MAGIC = b'CS'
+VERSION = 1
+HEADER = struct.Struct('<2sBBI')
+# message types
+HELLO = 1
+COMMAND = 2
+OBSERVATION = 3
+DONE = 4
+
+# Pack a whole message.
+def pack_message(msg_type, payload=b''):
+    return HEADER.pack(MAGIC, VERSION, msg_type, len(payload)) + payload
+
+# Read one message from an asyncio StreamReader: returns (type, payload),
+# or (None, None) if the other side closed the connection.
+async def read_message(reader):
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None, None
+    magic, version, msg_type, length = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise Exception('Bad frame header from the other side.')
+    payload = await reader.readexactly(length) if length > 0 else b''
+    return msg_type, payload
+
+# Payload helpers, shared with the client.
+_HELLO_HEAD = struct.Struct('<HdI')
+
+def pack_hello(tags, dt, num_timesteps):
+    names = '\n'.join(tags).encode('utf-8')
+    return _HELLO_HEAD.pack(len(tags), dt, num_timesteps) + names
+
+def unpack_hello(payload):
+    num_cables, dt, num_timesteps = _HELLO_HEAD.unpack_from(payload)
+    tags = payload[_HELLO_HEAD.size:].decode('utf-8').split('\n')
+    return tags[0:num_cables], dt, num_timesteps
+
+def pack_command(seq, control):
+    return struct.pack('<I', seq) + np.asarray(control, dtype='<f8').tobytes()
+
+def unpack_command(payload, num_cables):
+    seq = struct.unpack_from('<I', payload)[0]
+    control = np.frombuffer(payload, dtype='<f8', count=num_cables, offset=4)
+    return seq, control
+
+_OBS_HEAD = struct.Struct('<IId')
+
+def pack_observation(seq, step, step_time, lengths, state):
+    return (_OBS_HEAD.pack(seq, step, step_time)
+            + np.asarray(lengths, dtype='<f8').tobytes()
+            + np.asarray(state, dtype='<f8').tobytes())
+
+def unpack_observation(payload, num_cables):
+    seq, step, step_time = _OBS_HEAD.unpack_from(payload)
+    values = np.frombuffer(payload, dtype='<f8', offset=_OBS_HEAD.size)
+    return seq, step, step_time, values[0:num_cables], values[num_cables:num_cables+6]
+
+class PlantServer:
+    # Serves a fresh single-member Simulation to each client.
+    # make_sim() must return a new simulation.Simulation.
+
+    def __init__(self, make_sim, address=('127.0.0.1', 8765)):
+        self.make_sim = make_sim
+        self.address = address
+        self.server = None
+
+    # The observation of the current state of sim.
+    def _observe(self, sim, seq, step_time):
+        state = sim.state[0]
+        lengths = sim.rig.get_lengths(state[0:3])
+        return pack_message(OBSERVATION, pack_observation(seq, sim.t, step_time,
+                                                          lengths, state))
+
+    # One client connection: lock-step until the run is over or the
+    # client goes away.
+    async def handle_client(self, reader, writer):
+        sim = self.make_sim()
+        n = sim.rig.num_cables
+        writer.write(pack_message(HELLO, pack_hello(sim.rig.tags, sim.dt,
+                                                     sim.num_timesteps)))
+        writer.write(self._observe(sim, 0, 0.))
+        await writer.drain()
+        try:
+            while sim.t < sim.num_timesteps:
+                msg_type, payload = await read_message(reader)
+                if msg_type is None:
+                    break
+                if msg_type != COMMAND:
+                    raise Exception('Expected a COMMAND, got type ' + str(msg_type))
+                seq, control = unpack_command(payload, n)
+                start = time.perf_counter()
+                sim.step(control=control)
+                step_time = time.perf_counter() - start
+                writer.write(self._observe(sim, seq, step_time))
+                await writer.drain()
+            if sim.t >= sim.num_timesteps:
+                writer.write(pack_message(DONE))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self):
+        if isinstance(self.address, str):
+            self.server = await asyncio.start_unix_server(self.handle_client,
+                                                          path=self.address)
+        else:
+            host, port = self.address
+            self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
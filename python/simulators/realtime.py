@@ -0,0 +1,133 @@
+"""
+Real-time paced simulation: step a Simulation (simulation.py) at a
+wall-clock rate, as a plant emulator would run next to a controller, and
+measure whether the model fits in the control-loop budget.
+
+For each step we record the compute time (how long the step itself took)
+and the wake-up lateness (how far after its scheduled start the step
+actually began, i.e. the jitter.) A deadline miss is a step that finishes
+after the start of the next period. Example, the box at 100 Hz for 10 s:
+    sim = simulation.Simulation(rigs.box_rig(), pos0, vel0, 0.01, 1000)
+    stats = realtime.run_realtime(sim, period=0.01)
+    stats.print_report()
+"""
+
+# need to do linear alg
+import numpy as np
+import time
+
+class LatencyStats:
+    # Per-step timing, in seconds, preallocated for num_steps.
+
+    def __init__(self, num_steps, period):
+        self.period = period
+        self.compute_times = np.zeros(num_steps)
+        self.lateness = np.zeros(num_steps)
+        self.missed = np.zeros(num_steps, dtype=bool)
+        self.num_recorded = 0
+
+    def record(self, compute_time, lateness, missed):
+        i = self.num_recorded
+        self.compute_times[i] = compute_time
+        self.lateness[i] = lateness
+        self.missed[i] = missed
+        self.num_recorded += 1
+
+    # Summary statistics: mean and percentiles of compute time and
+    # lateness, and the number / fraction of deadline misses.
+    def get_report(self, percentiles=(50, 90, 99, 99.9)):
+        n = self.num_recorded
+        report = {'num_steps':n, 'period':self.period,
+                  'deadline_misses':int(np.sum(self.missed[0:n])),
+                  'miss_fraction':float(np.mean(self.missed[0:n])) if n > 0 else 0.}
+        for name, values in [('compute', self.compute_times[0:n]),
+                             ('lateness', self.lateness[0:n])]:
+            if n == 0:
+                continue
+            report[name + '_mean'] = float(np.mean(values))
+            report[name + '_max'] = float(np.max(values))
+            for p in percentiles:
+                report[name + '_p' + str(p)] = float(np.percentile(values, p))
+        # utilization: fraction of the period spent computing, on average
+        if n > 0:
+            report['utilization'] = report['compute_mean'] / self.period
+        return report
+
+    # Histogram of the compute times (or lateness), with bins in seconds.
+    # Default bins go from 0 to the period in 20ths, plus one overflow bin.
+    def get_histogram(self, which='compute', bins=None):
+        values = self.compute_times if which == 'compute' else self.lateness
+        values = values[0:self.num_recorded]
+        if bins is None:
+            bins = np.append(np.linspace(0, self.period, 21), np.inf)
+        counts, edges = np.histogram(values, bins=bins)
+        return counts, edges
+
+    def print_report(self):
+        report = self.get_report()
+        print('Real-time run: ' + str(report['num_steps']) + ' steps at '
+              + '{:.1f}'.format(1 / self.period) + ' Hz')
+        print('Deadline misses: ' + str(report['deadline_misses']) + ' ('
+              + '{:.3f}'.format(100 * report['miss_fraction']) + ' %)')
+        if report['num_steps'] == 0:
+            return
+        for name in ['compute', 'lateness']:
+            print(name + ' (us): mean ' + '{:.1f}'.format(1e6 * report[name + '_mean'])
+                  + ', p50 ' + '{:.1f}'.format(1e6 * report[name + '_p50'])
+                  + ', p99 ' + '{:.1f}'.format(1e6 * report[name + '_p99'])
+                  + ', p99.9 ' + '{:.1f}'.format(1e6 * report[name + '_p99.9'])
+                  + ', max ' + '{:.1f}'.format(1e6 * report[name + '_max']))
+        print('Utilization: ' + '{:.2f}'.format(100 * report['utilization']) + ' %')
+        counts, edges = self.get_histogram()
+        print('Compute time histogram (us), nonempty bins:')
+        for i in range(len(counts)):
+            if counts[i] == 0:
+                continue
+            high = '  inf' if np.isinf(edges[i+1]) else '{:5.0f}'.format(1e6 * edges[i+1])
+            print('  ' + '{:5.0f}'.format(1e6 * edges[i]) + ' - ' + high + ': '
+                  + str(counts[i]))
+
+# Sleep until 'deadline' (a time.perf_counter() value). Sleeps most of the
+# way, then spins for the last 'spin' seconds, since sleep alone is too
+# coarse for kHz rates.
+def sleep_until(deadline, spin=0.0005):
+    remaining = deadline - time.perf_counter()
+    if remaining > spin:
+        time.sleep(remaining - spin)
+    while time.perf_counter() < deadline:
+        pass
+
+# Step sim in real time, one step per 'period' seconds of wall clock
+# (default: the simulation's dt, i.e. real-time factor 1.) Runs num_steps
+# steps (default: to the end.) 'callback(sim)', if given, is called after
+# each step and counts as compute time (e.g., publishing the state.)
+# If a step runs more than a whole period late, the schedule restarts
+# from now instead of trying to catch up with a burst of steps.
+def run_realtime(sim, period=None, num_steps=None, callback=None, spin=0.0005):
+    if period is None:
+        period = sim.dt
+    if num_steps is None:
+        num_steps = sim.num_timesteps - sim.t
+    num_steps = min(num_steps, sim.num_timesteps - sim.t)
+    stats = LatencyStats(num_steps, period)
+    scheduled = time.perf_counter()
+    for _ in range(num_steps):
+        if sim.stopping is not None and len(sim.active) == 0:
+            # every member stopped early.
+            break
+        start = time.perf_counter()
+        lateness = start - scheduled
+        sim.step()
+        if callback is not None:
+            callback(sim)
+        end = time.perf_counter()
+        # the deadline for this step is the start of the next period.
+        deadline = scheduled + period
+        stats.record(end - start, lateness, end > deadline)
+        if end > deadline + period:
+            # too far behind, resynchronize.
+            scheduled = end
+        else:
+            scheduled = deadline
+            sleep_until(scheduled, spin)
+    return stats
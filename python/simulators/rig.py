@@ -0,0 +1,191 @@
+"""
+Vectorized model of a cable-driven robot: one point mass, n cables with
+stationary anchors, piecewise linear (rectified) cables, and an affine
+output feedback controller on each cable. This is the system that the
+simulation scripts build out of PointMass3D, PiecewiseLinearCable3D and
+AffineFeedback objects, but with all the per-cable constants stored as
+arrays so that many states (an ensemble) can be handled at once.
+
+Conventions:
+    A state is [x, y, z, \dot x, \dot y, \dot z]. Functions here take a
+    single state (6,) or a stack of them (N, 6), and return per-cable
+    quantities with the cables along the last axis, (n,) or (N, n).
+    Cables are in the order of rig.tags.
+"""
+
+# need to do linear alg
+import numpy as np
+# for building the equivalent object-based model
+from cable_models import cable_piecewise3D
+from body_models import point_mass3D
+from controllers import linear
+from simulators import geometry
+
+class CableRig:
+    # Holds the cable, controller, and body constants.
+    # anchors is (n, 3), and k, c, kappa, bar_ell, bar_v are (n,).
+    # m and g are as in PointMass3D.
+
+    def __init__(self, tags, anchors, k, c, kappa, bar_ell, bar_v, m, g):
+        self.tags = list(tags)
+        self.num_cables = len(self.tags)
+        n = self.num_cables
+        # force floating point, and copy, so the rig owns its arrays.
+        self.anchors = np.array(anchors, dtype=float).reshape((n, 3))
+        self.k = np.array(k, dtype=float).reshape(n)
+        self.c = np.array(c, dtype=float).reshape(n)
+        self.kappa = np.array(kappa, dtype=float).reshape(n)
+        self.bar_ell = np.array(bar_ell, dtype=float).reshape(n)
+        self.bar_v = np.array(bar_v, dtype=float).reshape(n)
+        self.m = float(m)
+        self.g = float(g)
+        # the anchors' precomputed geometry, for batched lengths (geometry.py.)
+        self.geometry = geometry.RigGeometry(self.anchors)
+
+    # Build a rig from the nested dicts used in the simulation scripts,
+    # e.g. cable_params = {'A':{'k':300, 'c':20}, ...}
+    # If controller_consts is None, the cables are open-loop with
+    # bar_v = 0 (fully retracted.)
+    @classmethod
+    def from_dicts(cls, cable_tags, cable_anchors, cable_params,
+                   controller_consts, m, g):
+        anchors = [cable_anchors[tag] for tag in cable_tags]
+        k = [cable_params[tag]['k'] for tag in cable_tags]
+        c = [cable_params[tag]['c'] for tag in cable_tags]
+        if controller_consts is None:
+            controller_consts = {tag: {'kappa':0., 'bar_ell':0., 'bar_v':0.}
+                                 for tag in cable_tags}
+        kappa = [controller_consts[tag]['kappa'] for tag in cable_tags]
+        bar_ell = [controller_consts[tag]['bar_ell'] for tag in cable_tags]
+        bar_v = [controller_consts[tag]['bar_v'] for tag in cable_tags]
+        return cls(cable_tags, anchors, k, c, kappa, bar_ell, bar_v, m, g)
+
+    # The cable force law, if it isn't this class's piecewise linear one
+    # (e.g. force_table.TabulatedRig), as plain JSON types; None here.
+    # Only rigs with None run on the compiled kernels (kernels.py.)
+    def get_force_law(self):
+        return None
+
+    # The inverse of from_dicts, for saving / printing.
+    def to_dicts(self):
+        cable_anchors = {}
+        cable_params = {}
+        controller_consts = {}
+        for i, tag in enumerate(self.tags):
+            cable_anchors[tag] = self.anchors[i].copy()
+            cable_params[tag] = {'k':self.k[i], 'c':self.c[i]}
+            controller_consts[tag] = {'kappa':self.kappa[i],
+                                      'bar_ell':self.bar_ell[i],
+                                      'bar_v':self.bar_v[i]}
+        return cable_anchors, cable_params, controller_consts
+
+    # The same system, as objects from the other packages. This is the
+    # reference implementation that the vectorized functions must match.
+    def build_objects(self, pos, vel):
+        pm = point_mass3D.PointMass3D(self.m, self.g, np.array(pos, dtype=float),
+                                      np.array(vel, dtype=float))
+        cables = {}
+        controllers = {}
+        for i, tag in enumerate(self.tags):
+            cables[tag] = cable_piecewise3D.PiecewiseLinearCable3D(
+                                params = {'k':self.k[i], 'c':self.c[i]},
+                                anchor_pos = self.anchors[i])
+            controllers[tag] = linear.AffineFeedback(kappa = self.kappa[i],
+                                                     bar_ell = self.bar_ell[i],
+                                                     bar_v = self.bar_v[i])
+        return pm, cables, controllers
+
+    # Kinematics. Returns the cable lengths \ell (..., n), the rates of
+    # length change \dot \ell (..., n), and the unit vectors from each
+    # anchor to the point mass, \hat \ell (..., n, 3).
+    # Operations are written out per-component so they happen in the
+    # same order as Cable3D's (and so the results are identical.)
+    def get_kinematics(self, state):
+        pos = state[..., np.newaxis, 0:3]
+        vel = state[..., np.newaxis, 3:6]
+        # \ell_vec = r - b_i
+        unit = pos - self.anchors
+        ell = np.sqrt(unit[..., 0] * unit[..., 0] + unit[..., 1] * unit[..., 1]
+                      + unit[..., 2] * unit[..., 2])
+        # \hat \ell = \ell_vec / \ell
+        unit /= ell[..., np.newaxis]
+        # \dot \ell = \bv \cdot \hat \ell
+        prod = vel * unit
+        dot_ell = prod[..., 0] + prod[..., 1] + prod[..., 2]
+        return ell, dot_ell, unit
+
+    # A helper. Just the lengths, (..., n), from positions (..., 3).
+    # With batched, through the anchor geometry's matrix product: much
+    # faster for many points and cables, but only accurate to ~1E-12
+    # relative, not bit for bit the same as the objects.
+    def get_lengths(self, pos, batched=False):
+        if batched:
+            return self.geometry.get_lengths(pos)
+        diff = np.asarray(pos)[..., np.newaxis, :] - self.anchors
+        return np.sqrt(diff[..., 0] * diff[..., 0] + diff[..., 1] * diff[..., 1]
+                       + diff[..., 2] * diff[..., 2])
+
+    # The affine output feedback law for all cables,
+    # v = \kappa (\ell - \bar \ell) + \bar v.
+    def get_controls(self, ell):
+        return self.kappa * (ell - self.bar_ell) + self.bar_v
+
+    # The force the cables would carry if they could push,
+    # k (\ell - v) + c \dot \ell. Negative means slack. Rigs with other
+    # force laws override this, so its sign always says slack or taut
+    # (e.g. the slack log, trajectories/slack_log.py.)
+    def get_unclipped_forces(self, ell, dot_ell, control):
+        return self.k * (ell - control) + self.c * dot_ell
+
+    # Scalar cable forces with the piecewise model, max(k (\ell - v) + c \dot \ell, 0).
+    # Same as PiecewiseLinearCable3D.scalar_force.
+    def get_scalar_forces(self, ell, dot_ell, control):
+        F = self.get_unclipped_forces(ell, dot_ell, control)
+        return np.where(F >= 0, F, 0.)
+
+    # The acceleration of the point mass from the scalar cable forces.
+    # As in the scripts, the force on the mass is -F_i \hat \ell_i, the
+    # cable forces are summed in order, then divided by m, then gravity.
+    def get_accel(self, unit, F):
+        sum_forces = np.zeros(unit.shape[:-2] + (3,))
+        for i in range(self.num_cables):
+            sum_forces += -(unit[..., i, :] * F[..., i, np.newaxis])
+        accel = (1 / (self.m)) * sum_forces
+        accel[..., 2] += -self.g
+        return accel
+
+    # \dot x = f(x, v) for the state(s). If control is None, the loop is
+    # closed with the affine feedback law; otherwise it's the rest lengths
+    # to apply, (..., n).
+    # Returns the state derivative, and the control and scalar forces that
+    # were used (these are what the scripts record.) 'unclipped', if given,
+    # is an (..., n) array to fill with get_unclipped_forces (for the
+    # slack log, without computing the kinematics twice.)
+    def state_deriv(self, state, control=None, out=None, unclipped=None):
+        ell, dot_ell, unit = self.get_kinematics(state)
+        if control is None:
+            control = self.get_controls(ell)
+        F = self.get_scalar_forces(ell, dot_ell, control)
+        if unclipped is not None:
+            unclipped[...] = self.get_unclipped_forces(ell, dot_ell, control)
+        if out is None:
+            out = np.zeros(np.shape(state))
+        out[..., 0:3] = state[..., 3:6]
+        out[..., 3:6] = self.get_accel(unit, F)
+        return out, control, F
+
+    # Value of the Lyapunov function for the closed-loop system,
+    # V = KE + PE + \sum U_f, with U_f from PiecewiseLinearCable3D.get_Uf_affine.
+    # batched is for the lengths, see get_lengths.
+    def get_V(self, state, batched=False):
+        vel = state[..., 3:6]
+        KE = 0.5 * self.m * (vel[..., 0]**2 + vel[..., 1]**2 + vel[..., 2]**2)
+        PE = self.m * self.g * state[..., 2]
+        ell = self.get_lengths(state[..., 0:3], batched)
+        alpha = 1 - self.kappa
+        beta = self.kappa * self.bar_ell - self.bar_v
+        Uf_all = 0.5 * self.k * alpha * ell**2 + self.k * beta * ell
+        Uf = np.zeros(np.shape(KE))
+        for i in range(self.num_cables):
+            Uf += Uf_all[..., i]
+        return (KE + PE) + Uf
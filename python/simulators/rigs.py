@@ -0,0 +1,64 @@
+"""
+The rigs from the simulation scripts, as CableRig objects, along with the
+initial conditions and equilibria that go with them. Use these when you
+need the same system outside of the scripts (plotting, caching, batches.)
+They're loaded from the scenario files in scenarios/, which have the same
+numbers as simulation_particle_box_3D.py and simulation_particle_3D.py.
+The 1D rig of simulation_particle_1D.py is built here, on the x axis of
+the 3D rig, since its hybrid_split cables don't fit a scenario file.
+"""
+
+# need to do linear alg
+import numpy as np
+import os
+from simulators import scenarios
+from simulators import force_laws
+from simulators import rig as cable_rig
+
+# A helper: one of the scenario files that ship with the code.
+def _load(name):
+    return scenarios.load_scenario(os.path.join(scenarios.get_scenario_dir(),
+                                                name + '.json'))
+
+# The box: cube with side length 1, cables A...H at its corners.
+def box_rig():
+    return _load('box').rig
+
+# The tetrahedral rig: top, bottom, left, right cables.
+def tetrahedron_rig():
+    return _load('tetrahedron').rig
+
+_box = _load('box')
+_tetrahedron = _load('tetrahedron')
+
+# The 1D rig: two HybridSplitLinearCable cables anchored at x = 8 and
+# x = 2, no gravity. The script's control, v = (1 - kappa / k) \ell +
+# (kappa l_eq - pretension) / k, is the affine law with kappa' = 1 - kappa / k,
+# \bar \ell = l_eq, \bar v = l_eq - pretension / k.
+def one_d_rig():
+    tags = ['1', '2']
+    k = {'1':300., '2':100.}
+    kappa = 15.
+    l_eq = {'1':1.5, '2':4.5}
+    pretension = 300.
+    anchors = {'1':[8., 0., 0.], '2':[2., 0., 0.]}
+    params = {tag: {'k':k[tag], 'c':10.} for tag in tags}
+    consts = {tag: {'kappa':1 - kappa / k[tag], 'bar_ell':l_eq[tag],
+                    'bar_v':l_eq[tag] - pretension / k[tag]} for tag in tags}
+    rig = cable_rig.CableRig.from_dicts(tags, anchors, params, consts, 1.45, 0.)
+    return force_laws.LawRig(rig, 'hybrid_split')
+
+# Initial conditions name -> (pos, vel), for tests A-D with the box,
+# and the one used in simulation_particle_3D.py for the tetrahedron.
+box_initial_conditions = _box.get_initial_conditions()
+tetrahedron_initial_conditions = _tetrahedron.get_initial_conditions()
+# and the six of the 1D results (results/1D_*.npy.)
+one_d_initial_conditions = {
+    '1D_p' + str(x).replace('.', 'pt') + '_v' + str(v).replace('-', 'minus'):
+    (np.array([x, 0., 0.]), np.array([float(v), 0., 0.]))
+    for x, v in ((5.2, 0), (5.5, 10), (5.7, -5), (6.2, 0), (6.9, 0), (6.9, -15))}
+
+# Equilibrium positions, from MATLAB's calculations.
+box_bar_r = _box.equilibrium
+tetrahedron_bar_r = _tetrahedron.equilibrium
+one_d_bar_r = np.array([6.5, 0., 0.])
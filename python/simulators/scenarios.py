@@ -0,0 +1,153 @@
+"""
+Declarative scenario files: a rig, its controllers, the simulation
+settings, and a list of initial conditions, in one JSON / TOML / YAML file
+instead of module-level constants in a script. See scenarios/box.json.
+
+Schema (JSON shown, TOML and YAML have the same structure):
+{
+  "name": "box",
+  "rig": {
+    "cable_tags": ["A", "B", ...],
+    "cable_anchors": {"A": [0, 0, 0], ...},
+    "cable_params": {"A": {"k": 300, "c": 20}, ...},
+    "controller_consts": {"A": {"kappa": 0.95, "bar_ell": 0.74, "bar_v": 0.69}, ...},
+    "m": 4.0,
+    "g": 9.8
+  },
+  "simulation": {"dt": 0.01, "num_timesteps": 200,
+                 "backend": "numpy", "sense_delay": 0, "actuation_delay": 0,
+                 "stopping": {"tol": 1e-3, "dwell": 0.5, "workspace": "anchors"}},
+  "equilibrium": [0.15, 0.2, 0.7],
+  "initial_conditions": [{"name": "A", "pos": [0.5, 0.3, 0.8], "vel": [-1, 0.3, -6]}, ...]
+}
+"controller_consts" can be left out for open-loop, fully retracted cables,
+and "equilibrium" is optional. Everything in "simulation" except dt and
+num_timesteps is optional, and is passed to simulation.Simulation. A
+"stopping" section without "bar_r" converges to the equilibrium.
+"""
+
+# need to do linear alg
+import numpy as np
+import json
+import os
+from simulators import rig
+from simulators import workspace
+
+# YAML is optional, TOML needs Python 3.11+.
+try:
+    import yaml
+except ImportError:
+    yaml = None
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+# Read a scenario file into a dict, by extension.
+def read_scenario_file(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.json':
+        with open(filename, 'r') as f:
+            return json.load(f)
+    if ext == '.toml':
+        if tomllib is None:
+            raise Exception('Reading TOML needs Python 3.11 or later: ' + filename)
+        with open(filename, 'rb') as f:
+            return tomllib.load(f)
+    if ext in ('.yaml', '.yml'):
+        if yaml is None:
+            raise Exception('Reading YAML needs PyYAML installed: ' + filename)
+        with open(filename, 'r') as f:
+            return yaml.safe_load(f)
+    raise Exception('Unknown scenario file type: ' + filename)
+
+class Scenario:
+    # A parsed, checked scenario. 'source' is used in error messages.
+
+    def __init__(self, spec, source='<scenario>'):
+        self.spec = spec
+        self.source = source
+        for key in ['name', 'rig', 'simulation', 'initial_conditions']:
+            if key not in spec:
+                raise Exception(source + ": missing '" + key + "'")
+        self.name = str(spec['name'])
+        # The rig. Every tag needs an anchor and parameters (and controller
+        # constants, if there are any.)
+        rig_spec = spec['rig']
+        for key in ['cable_tags', 'cable_anchors', 'cable_params', 'm', 'g']:
+            if key not in rig_spec:
+                raise Exception(source + ": rig is missing '" + key + "'")
+        tags = rig_spec['cable_tags']
+        controller_consts = rig_spec.get('controller_consts', None)
+        for tag in tags:
+            if tag not in rig_spec['cable_anchors'] or tag not in rig_spec['cable_params']:
+                raise Exception(source + ': cable ' + str(tag)
+                                + ' needs an anchor and parameters.')
+            if controller_consts is not None and tag not in controller_consts:
+                raise Exception(source + ': cable ' + str(tag)
+                                + ' needs controller constants.')
+        anchors = {tag: np.array(rig_spec['cable_anchors'][tag], dtype=float)
+                   for tag in tags}
+        self.rig = rig.CableRig.from_dicts(tags, anchors, rig_spec['cable_params'],
+                                           controller_consts, rig_spec['m'],
+                                           rig_spec['g'])
+        # Simulation settings.
+        sim_spec = dict(spec['simulation'])
+        for key in ['dt', 'num_timesteps']:
+            if key not in sim_spec:
+                raise Exception(source + ": simulation is missing '" + key + "'")
+        self.dt = float(sim_spec.pop('dt'))
+        self.num_timesteps = int(sim_spec.pop('num_timesteps'))
+        # the rest goes to Simulation as keyword arguments.
+        self.sim_kwargs = sim_spec
+        # Optional equilibrium position.
+        self.equilibrium = None
+        if spec.get('equilibrium', None) is not None:
+            self.equilibrium = np.array(spec['equilibrium'], dtype=float)
+        stopping = self.sim_kwargs.get('stopping', None)
+        if stopping is not None and 'tol' in stopping and stopping.get('bar_r') is None:
+            if self.equilibrium is None:
+                raise Exception(source + ': stopping on convergence needs bar_r or an equilibrium.')
+            self.sim_kwargs['stopping'] = dict(stopping, bar_r=self.equilibrium.tolist())
+        # The initial conditions, in order. Names must be unique
+        # (they're used as file names.)
+        self.initial_conditions = []
+        names = set()
+        for i, ic in enumerate(spec['initial_conditions']):
+            name = str(ic.get('name', 'ic' + str(i)))
+            if name in names:
+                raise Exception(source + ': duplicate initial condition ' + name)
+            names.add(name)
+            self.initial_conditions.append((name, np.array(ic['pos'], dtype=float),
+                                            np.array(ic['vel'], dtype=float)))
+
+    # The initial conditions as a dict of name -> (pos, vel).
+    def get_initial_conditions(self):
+        return {name: (pos, vel) for name, pos, vel in self.initial_conditions}
+
+    # The names of the initial conditions that don't start inside the
+    # anchors' convex hull (shrunk by margin, see workspace.py.)
+    def get_invalid_initial_conditions(self, margin=0.):
+        ws = workspace.Workspace.from_rig(self.rig, margin)
+        names = [ic[0] for ic in self.initial_conditions]
+        pos0 = np.array([ic[1] for ic in self.initial_conditions])
+        inside = ws.contains(pos0)
+        return [name for name, ok in zip(names, inside) if not ok]
+
+    # Stack some (default all) of the initial conditions for an ensemble run.
+    def get_ensemble(self, names=None):
+        if names is None:
+            names = [ic[0] for ic in self.initial_conditions]
+        ics = self.get_initial_conditions()
+        pos0 = np.array([ics[name][0] for name in names])
+        vel0 = np.array([ics[name][1] for name in names])
+        return names, pos0, vel0
+
+# Load and check a scenario file.
+def load_scenario(filename):
+    return Scenario(read_scenario_file(filename), source=filename)
+
+# The directory with the scenarios that ship with the code.
+def get_scenario_dir():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'scenarios')
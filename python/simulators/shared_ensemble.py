@@ -0,0 +1,135 @@
+"""
+Parallel ensemble runs with the results in shared memory.
+
+With a process pool, returning each member's histories to the parent
+means pickling (T+1, 6) + 2 (T, n) + (T+1) floats per member, copying them
+through a pipe, and unpickling them again; for big ensembles that's where
+the time goes. Here the parent allocates the whole ensemble's histories
+once, in shared memory blocks, and each worker runs a Simulation
+(simulation.py) on its chunk of members that records straight into its
+slice of those blocks. Only the chunk bounds go in, and only a few
+numbers per member (where/why it stopped, seconds taken) come back.
+    with shared_ensemble.run_ensemble(rig, pos0, vel0, dt, T, num_workers=8) as ens:
+        V = ens.results['V']        # (N, T+1), in shared memory
+        ...
+Copy what you need out (or use ens.copy()) before the block is closed.
+"""
+
+# need to do linear alg
+import numpy as np
+import time
+import concurrent.futures
+from multiprocessing import shared_memory
+from simulators import simulation
+
+# A helper: attach to an existing block, without tracking it (the parent
+# owns it.) Before Python 3.13 there's no track=False, but pool workers
+# share the parent's resource tracker, so registering it again is harmless.
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+class SharedEnsemble:
+    # The histories of N members (the same layout as Simulation's: state
+    # (N, T+1, 6), control and force (N, T, n), V (N, T+1)), each in its
+    # own shared memory block, plus stop_step and stop_reason per member
+    # (see stopping.py; -1 and 0 if the run went to the end.) Members
+    # that stopped early hold their last values through num_timesteps.
+    # 'results' is a dict of ndarrays over the blocks. close() releases
+    # them (the owner also unlinks them.)
+
+    def __init__(self, num_members, num_timesteps, num_cables):
+        N = num_members
+        T = num_timesteps
+        n = num_cables
+        self.shapes = {'state':(N, T+1, 6), 'control':(N, T, n), 'force':(N, T, n),
+                       'V':(N, T+1)}
+        self.blocks = {}
+        self.results = {}
+        for key, shape in self.shapes.items():
+            nbytes = max(int(np.prod(shape)) * 8, 1)
+            self.blocks[key] = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.results[key] = np.ndarray(shape, dtype=np.float64,
+                                           buffer=self.blocks[key].buf)
+            self.results[key][...] = 0.
+        self.stop_step = -np.ones(N, dtype=np.int64)
+        self.stop_reason = np.zeros(N, dtype=np.int8)
+        self.worker_seconds = 0.
+
+    # What a worker needs to find the blocks: names and shapes.
+    def get_spec(self):
+        return {key: (self.blocks[key].name, self.shapes[key]) for key in self.shapes}
+
+    # Copies of the results, as ordinary arrays.
+    def copy(self):
+        return {key: np.array(self.results[key]) for key in self.results}
+
+    def close(self):
+        self.results = {}
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Run members [lo, hi) of an ensemble into the shared blocks. Runs in a
+# worker. Returns (lo, hi, stop_step, stop_reason, seconds taken.)
+def run_chunk(spec, lo, hi, rig, pos0, vel0, dt, num_timesteps, sim_kwargs):
+    start = time.time()
+    blocks = {key: _attach(name) for key, (name, shape) in spec.items()}
+    try:
+        histories = {key: np.ndarray(shape, dtype=np.float64,
+                                     buffer=blocks[key].buf)[lo:hi]
+                     for key, (name, shape) in spec.items()}
+        sim = simulation.Simulation(rig, pos0, vel0, dt, num_timesteps,
+                                    histories=histories, **sim_kwargs)
+        sim.run()
+        # (fills in the members that stopped early, in place, to the end:
+        # the chunk's cursor stops where its last member did.)
+        if sim.stopping is not None:
+            sim._hold_stopped(num_timesteps)
+        stop_step = sim.stop_step.copy()
+        stop_reason = sim.stop_reason.copy()
+        del sim
+        del histories
+    finally:
+        for block in blocks.values():
+            block.close()
+    return (lo, hi, stop_step, stop_reason, time.time() - start)
+
+# Simulate an ensemble of N members (pos0 (N, 3), vel0 (N, 3) or one
+# 3-vector) in chunks of chunk_size members on num_workers processes
+# (None for one per core, 1 to run here.) sim_kwargs go to Simulation.
+# Returns a SharedEnsemble; close it when done with the results.
+def run_ensemble(rig, pos0, vel0, dt, num_timesteps, num_workers=None, chunk_size=64,
+                 **sim_kwargs):
+    pos0 = np.atleast_2d(np.asarray(pos0, dtype=float))
+    N = pos0.shape[0]
+    vel0 = np.broadcast_to(np.asarray(vel0, dtype=float), (N, 3))
+    ensemble = SharedEnsemble(N, num_timesteps, rig.num_cables)
+    spec = ensemble.get_spec()
+    args = [(spec, lo, min(lo + chunk_size, N), rig, pos0[lo:lo+chunk_size],
+             vel0[lo:lo+chunk_size], dt, num_timesteps, sim_kwargs)
+            for lo in range(0, N, chunk_size)]
+    try:
+        if num_workers == 1:
+            done = [run_chunk(*a) for a in args]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as pool:
+                futures = [pool.submit(run_chunk, *a) for a in args]
+                done = [future.result() for future in futures]
+    except BaseException:
+        ensemble.close()
+        raise
+    for lo, hi, stop_step, stop_reason, seconds in done:
+        ensemble.stop_step[lo:hi] = stop_step
+        ensemble.stop_reason[lo:hi] = stop_reason
+        ensemble.worker_seconds += seconds
+    return ensemble
@@ -0,0 +1,353 @@
+"""
+Simulation of a CableRig (rig.py) from one or many initial conditions,
+recording the same things as the simulation scripts: the point mass state,
+the scalar cable forces, the control inputs, and the Lyapunov function.
+
+Backends:
+    'numpy' - vectorized over the ensemble, with rig.py.
+    'jit'   - the compiled kernels in kernels.py. Falls back to 'numpy'
+              if Numba isn't installed.
+Sensing and actuation delays (controllers/delay.py) are supported by the
+numpy backend. Early stopping (stopping.py) is supported by both backends,
+but not together with delays. Either way, each member's slack/taut
+transitions are logged as it runs (trajectories/slack_log.py.)
+"""
+
+# need to do linear alg
+import numpy as np
+from simulators import kernels
+from simulators import stopping as stopping_criteria
+from controllers import delay
+from trajectories import slack_log
+
+class Simulation:
+    # Simulates the rig from pos0, vel0. These are either single 3-vectors,
+    # or (N, 3) stacks for an ensemble of N runs (vel0 can be one 3-vector
+    # for all of them.) The histories are:
+    #   state_history   (N, T+1, 6), with the initial state first
+    #   control_history (N, T, n), the rest lengths applied at each step
+    #   force_history   (N, T, n), the scalar cable forces at each step
+    #   V_history       (N, T+1), the Lyapunov function
+    # where T = num_timesteps, and the leading N is dropped for single runs.
+    # sense_delay and actuation_delay are in timesteps, can be fractional,
+    # and can be per cable (n,) or per member and cable (N, n).
+    # 'stopping' (a stopping.StoppingCriteria, or a dict of its settings)
+    # ends each member's run early once it converges or fails; then
+    # stop_step has the number of steps each member took (-1 while it's
+    # still running) and stop_reason why it stopped (see stopping.REASONS.)
+    # 'histories', if given, is a dict of preallocated arrays to record
+    # into instead (keys state, control, force, V, with the shapes above
+    # including N), e.g. a slice of a shared memory block.
+    # slack_bound is the force at or below which a cable counts as slack,
+    # for the slack log.
+
+    def __init__(self, rig, pos0, vel0, dt, num_timesteps, backend='numpy',
+                 sense_delay=0., actuation_delay=0., stopping=None, histories=None,
+                 slack_bound=1E-10):
+        self.rig = rig
+        self.dt = dt
+        self.num_timesteps = num_timesteps
+        self.sense_delay = sense_delay
+        self.actuation_delay = actuation_delay
+        pos0 = np.asarray(pos0, dtype=float)
+        # single run or ensemble
+        self.single = (pos0.ndim == 1)
+        pos0 = np.atleast_2d(pos0)
+        self.num_members = pos0.shape[0]
+        N = self.num_members
+        n = rig.num_cables
+        # The current state of every member, (N, 6).
+        self.state = np.zeros((N, 6))
+        self.state[:, 0:3] = pos0
+        self.state[:, 3:6] = vel0
+        # Number of steps taken so far (the cursor into the histories.)
+        self.t = 0
+        # Preallocate the histories (or use the ones we were given.)
+        if histories is None:
+            self.state_history = np.zeros((N, num_timesteps+1, 6))
+            self.control_history = np.zeros((N, num_timesteps, n))
+            self.force_history = np.zeros((N, num_timesteps, n))
+            self.V_history = np.zeros((N, num_timesteps+1))
+        else:
+            for key, shape in [('state', (N, num_timesteps+1, 6)),
+                               ('control', (N, num_timesteps, n)),
+                               ('force', (N, num_timesteps, n)), ('V', (N, num_timesteps+1))]:
+                if histories[key].shape != shape:
+                    raise Exception('The ' + key + ' history should be ' + str(shape)
+                                    + ', not ' + str(histories[key].shape))
+            self.state_history = histories['state']
+            self.control_history = histories['control']
+            self.force_history = histories['force']
+            self.V_history = histories['V']
+        self.state_history[:, 0] = self.state
+        self.V_history[:, 0] = rig.get_V(self.state)
+        # The slack log, recorded from the unclipped forces of each step.
+        self.slack_bound = slack_bound
+        self.slack_recorder = slack_log.SlackRecorder(rig.tags, N, dt, slack_bound)
+        self._unclipped = np.zeros((N, n))
+        # Delay lines, if any. Primed with the initial lengths/controls,
+        # i.e., assume the system sat at its initial condition before t=0.
+        self.delayed = np.any(np.asarray(sense_delay) > 0) or \
+                       np.any(np.asarray(actuation_delay) > 0)
+        if self.delayed:
+            ell0 = rig.get_lengths(self.state[:, 0:3])
+            self.sense_line = delay.DelayLine(sense_delay, shape=(N, n),
+                                              initial_value=ell0)
+            self.actuation_line = delay.DelayLine(actuation_delay, shape=(N, n),
+                                                  initial_value=rig.get_controls(ell0))
+            self._ell_sensed = np.zeros((N, n))
+            self._control = np.zeros((N, n))
+        # The compiled kernels need a few buffers.
+        # (and the kernels only have the piecewise force law.)
+        if backend == 'jit' and (not kernels.HAVE_NUMBA or rig.get_force_law() is not None):
+            backend = 'numpy'
+        if backend == 'jit' and self.delayed:
+            raise Exception('The jit backend does not support delays, use numpy.')
+        self.backend = backend
+        self._deriv = np.zeros((N, 6))
+        if backend == 'jit':
+            self._ell = np.zeros((N, n))
+            self._step_control = np.zeros((N, n))
+            self._step_force = np.zeros((N, n))
+            self._V = np.zeros(N)
+        # Early stopping: the members still running, by index.
+        self.stopping = stopping_criteria.get_criteria(stopping, rig, dt)
+        if self.stopping is not None and self.delayed:
+            raise Exception('Early stopping does not support delays (yet.)')
+        self.active = np.arange(N)
+        self.stop_step = -np.ones(N, dtype=np.int64)
+        self.stop_reason = np.zeros(N, dtype=np.int8)
+        self._dwell = np.zeros(N, dtype=np.int64)
+
+    # One forward Euler step of every member, recording at the cursor.
+    # 'control', if given, is the rest lengths to apply, (n,) or (N, n),
+    # instead of the rig's own feedback law (e.g., from an external
+    # controller.) That always uses the numpy path, and skips the delays.
+    def step(self, control=None):
+        if self.t >= self.num_timesteps:
+            raise Exception('Simulation is already at num_timesteps, exiting.')
+        if self.stopping is not None:
+            if control is not None:
+                raise Exception('External control with early stopping is not supported.')
+            self._step_active()
+            return
+        if self.backend == 'jit' and control is None:
+            self._run_jit(1)
+            return
+        rig = self.rig
+        t = self.t
+        if control is not None:
+            control = np.broadcast_to(np.asarray(control, dtype=float),
+                                      (self.num_members, rig.num_cables))
+            _, control, F = rig.state_deriv(self.state, control=control,
+                                            out=self._deriv, unclipped=self._unclipped)
+        elif self.delayed:
+            # the controller sees delayed lengths, the cables get delayed commands.
+            self.sense_line.push(rig.get_lengths(self.state[:, 0:3]))
+            self.sense_line.read(out=self._ell_sensed)
+            self.actuation_line.push(rig.get_controls(self._ell_sensed))
+            control = self.actuation_line.read(out=self._control)
+            _, control, F = rig.state_deriv(self.state, control=control,
+                                            out=self._deriv, unclipped=self._unclipped)
+        else:
+            _, control, F = rig.state_deriv(self.state, out=self._deriv,
+                                            unclipped=self._unclipped)
+        self.slack_recorder.update(t, self._unclipped)
+        self.state += self.dt * self._deriv
+        self.t += 1
+        self.state_history[:, t+1] = self.state
+        self.control_history[:, t] = control
+        self.force_history[:, t] = F
+        self.V_history[:, t+1] = rig.get_V(self.state)
+
+    # A helper: one step of just the members still running, when
+    # stopping early. They're gathered into a compact (M, 6) block, stepped,
+    # checked, and scattered back; the ones that stopped leave the set.
+    def _step_active(self):
+        if len(self.active) == 0:
+            raise Exception('Every member has stopped, exiting.')
+        rig = self.rig
+        t = self.t
+        idx = self.active
+        M = len(idx)
+        state = self.state[idx]
+        U = self._unclipped[0:M]
+        if self.backend == 'jit':
+            # (the kernel doesn't give \dot \ell, so the slack log's
+            # kinematics are from the state before the step.)
+            ell, dot_ell, _ = rig.get_kinematics(state)
+            control = self._step_control[0:M]
+            F = self._step_force[0:M]
+            kernels.rig_step(state, rig.anchors, rig.k, rig.c, rig.kappa, rig.bar_ell,
+                             rig.bar_v, rig.m, rig.g, self.dt, self._ell[0:M],
+                             control, F)
+            V = self._V[0:M]
+            kernels.rig_V(state, rig.anchors, rig.k, rig.kappa, rig.bar_ell,
+                          rig.bar_v, rig.m, rig.g, V)
+            U[:] = rig.get_unclipped_forces(ell, dot_ell, control)
+        else:
+            deriv = self._deriv[0:M]
+            _, control, F = rig.state_deriv(state, out=deriv, unclipped=U)
+            state += self.dt * deriv
+            V = rig.get_V(state)
+        self.slack_recorder.update(t, U, members=idx)
+        self.t += 1
+        self.state[idx] = state
+        self.state_history[idx, t+1] = state
+        self.control_history[idx, t] = control
+        self.force_history[idx, t] = F
+        self.V_history[idx, t+1] = V
+        # then check, and drop the ones that are done.
+        dwell = self._dwell[idx]
+        reason = self.stopping.check(state, self.V_history[idx, t], V, dwell)
+        self._dwell[idx] = dwell
+        done = reason != stopping_criteria.RUNNING
+        if np.any(done):
+            self.stop_step[idx[done]] = t + 1
+            self.stop_reason[idx[done]] = reason[done]
+            self.active = idx[~done]
+
+    # A helper: fill the histories of members that stopped early with
+    # their last values, up to the cursor (or step t), so every row is
+    # defined.
+    def _hold_stopped(self, t=None):
+        if t is None:
+            t = self.t
+        for i in np.nonzero(self.stop_step >= 0)[0]:
+            s = self.stop_step[i]
+            self.state_history[i, s+1:t+1] = self.state_history[i, s]
+            self.V_history[i, s+1:t+1] = self.V_history[i, s]
+            if s > 0:
+                self.control_history[i, s:t] = self.control_history[i, s-1]
+                self.force_history[i, s:t] = self.force_history[i, s-1]
+
+    # A helper: num_steps of the compiled kernel in one call. The kernel
+    # records the histories, so the slack log is caught up from those
+    # afterwards, block_size steps at a time.
+    def _run_jit(self, num_steps, block_size=4096):
+        rig = self.rig
+        t0 = self.t
+        kernels.rig_run(self.state, num_steps, self.t, rig.anchors, rig.k, rig.c,
+                        rig.kappa, rig.bar_ell, rig.bar_v, rig.m, rig.g, self.dt,
+                        self.state_history, self.control_history,
+                        self.force_history, self.V_history,
+                        self._ell, self._step_control, self._step_force, self._V)
+        self.t += num_steps
+        for lo in range(t0, t0 + num_steps, block_size):
+            hi = min(lo + block_size, t0 + num_steps)
+            ell, dot_ell, _ = rig.get_kinematics(self.state_history[:, lo:hi])
+            self.slack_recorder.update_block(lo, rig.get_unclipped_forces(
+                                             ell, dot_ell, self.control_history[:, lo:hi]))
+
+    # Run until num_timesteps (or for num_steps more steps.)
+    def run(self, num_steps=None):
+        if num_steps is None:
+            num_steps = self.num_timesteps - self.t
+        num_steps = min(num_steps, self.num_timesteps - self.t)
+        if self.stopping is not None:
+            for _ in range(num_steps):
+                if len(self.active) == 0:
+                    break
+                self._step_active()
+        elif self.backend == 'jit':
+            self._run_jit(num_steps)
+        else:
+            for _ in range(num_steps):
+                self.step()
+        return self.get_results()
+
+    # The histories as a dict, with the member axis dropped for single runs.
+    # With early stopping, they end at the cursor (the last step any
+    # member took), and members that stopped before that hold their
+    # last values.
+    def get_results(self):
+        results = {'state':self.state_history, 'control':self.control_history,
+                   'force':self.force_history, 'V':self.V_history}
+        if self.stopping is not None:
+            self._hold_stopped()
+            t = self.t
+            results = {'state':self.state_history[:, 0:t+1],
+                       'control':self.control_history[:, 0:t],
+                       'force':self.force_history[:, 0:t], 'V':self.V_history[:, 0:t+1]}
+        if self.single:
+            for key in results:
+                results[key] = results[key][0]
+        return results
+
+    # Member i's histories, up to where it stopped (or the cursor.)
+    def get_member_results(self, i):
+        t = self._get_member_t(i)
+        return {'state':self.state_history[i, 0:t+1], 'control':self.control_history[i, 0:t],
+                'force':self.force_history[i, 0:t], 'V':self.V_history[i, 0:t+1]}
+
+    # A helper: number of steps member i has taken.
+    def _get_member_t(self, i):
+        return self.stop_step[i] if self.stop_step[i] >= 0 else self.t
+
+    # Why each member stopped, as names from stopping.REASONS.
+    def get_stop_reasons(self):
+        return [stopping_criteria.REASONS[r] for r in self.stop_reason]
+
+    # The slack/taut event log (trajectories/slack_log.py) of the steps
+    # taken so far, one per member (just the one for single runs.)
+    def get_slack_log(self):
+        logs = [self.slack_recorder.get_log(i, self._get_member_t(i) * self.dt)
+                for i in range(self.num_members)]
+        if self.single:
+            return logs[0]
+        return logs
+
+    # The slack logs as arrays for a run file (see slack_log.py), of every
+    # member, or just member i. Goes with get_results / get_member_results,
+    # and the bound as metadata 'slack_bound'.
+    def get_slack_arrays(self, i=None):
+        members = range(self.num_members) if i is None else [i]
+        t_end = np.array([self._get_member_t(j) * self.dt for j in members])
+        return self.slack_recorder.get_arrays(t_end, members)
+
+# The Lyapunov function from the objects, as in the box script's get_V.
+def _get_V_objects(pm, cable_tags, cables, controllers):
+    E = pm.get_KE() + pm.get_PE()
+    Uf = 0.0
+    for tag in cable_tags:
+        Uf += cables[tag].get_Uf_affine(pm.get_pos(), controllers[tag])
+    return E + Uf
+
+# The reference: the loop from the simulation scripts, with the objects
+# from rig.build_objects. Slow, one member. Returns the same dict as
+# Simulation.get_results.
+def run_reference(rig, pos0, vel0, dt, num_timesteps):
+    pm, cables, controllers = rig.build_objects(pos0, vel0)
+    n = rig.num_cables
+    state_history = np.zeros((num_timesteps+1, 6))
+    control_history = np.zeros((num_timesteps, n))
+    force_history = np.zeros((num_timesteps, n))
+    V_history = np.zeros(num_timesteps+1)
+    state_history[0] = pm.get_state()
+    V_history[0] = _get_V_objects(pm, rig.tags, cables, controllers)
+    for t in range(num_timesteps):
+        pm_pos = pm.get_pos()
+        pm_vel = pm.get_vel()
+        pm_state = pm.get_state()
+        forces_list = []
+        for i, tag in enumerate(rig.tags):
+            ell_i = cables[tag].get_length(pm_pos)
+            control_i = controllers[tag].v(ell_i)
+            forces_list.append(-cables[tag].force_3d(pm_pos, pm_vel, control_i))
+            dot_ell_i = cables[tag].get_dot_length(pm_pos, pm_vel)
+            control_history[t, i] = control_i
+            force_history[t, i] = cables[tag].scalar_force(ell_i, dot_ell_i, control_i)
+        pm_state_tp1 = pm_state + dt * pm.state_deriv(forces_list)
+        pm.set_state(pm_state_tp1)
+        state_history[t+1] = pm_state_tp1
+        V_history[t+1] = _get_V_objects(pm, rig.tags, cables, controllers)
+    return {'state':state_history, 'control':control_history,
+            'force':force_history, 'V':V_history}
+
+# Check a backend against the reference path. Returns the largest absolute
+# difference in each history (all zeros means bit-identical.)
+def compare_to_reference(rig, pos0, vel0, dt, num_timesteps, backend='jit'):
+    ref = run_reference(rig, pos0, vel0, dt, num_timesteps)
+    sim = Simulation(rig, pos0, vel0, dt, num_timesteps, backend=backend)
+    results = sim.run()
+    return {key: np.max(np.abs(results[key] - ref[key])) for key in ref}
@@ -0,0 +1,127 @@
+"""
+Online stopping criteria for Simulation (simulation.py), so a run ends as
+soon as its outcome is known instead of always going num_timesteps:
+    converged          the state error |(r - \\bar r, \\dot r)| has stayed under
+                       tol for at least 'dwell' seconds
+    left_workspace     the point mass left the workspace ('anchors' for the
+                       bounding box of the anchors, 'hull' for their convex
+                       hull, see workspace.py)
+    lyapunov_increase  V went up by more than lyapunov_tol in one step
+    nonfinite          the state has a NaN or inf in it
+Each is checked after every step, per ensemble member. In an ensemble,
+members that have stopped are dropped from the working set, so the cost
+of the rest of the run shrinks with the number still running.
+
+Criteria can be given as a StoppingCriteria or as a plain dict (the same
+keys as the constructor's arguments, e.g. from a scenario file):
+    sim = simulation.Simulation(rig, pos0, vel0, dt, T,
+                                stopping={'bar_r':bar_r, 'tol':1E-4, 'dwell':0.5})
+"""
+
+# need to do linear alg
+import numpy as np
+from simulators import workspace as rig_workspace
+
+# Reasons a member stopped. RUNNING means it hasn't.
+RUNNING = 0
+CONVERGED = 1
+LEFT_WORKSPACE = 2
+LYAPUNOV_INCREASE = 3
+NONFINITE = 4
+REASONS = ['running', 'converged', 'left_workspace', 'lyapunov_increase', 'nonfinite']
+
+class StoppingCriteria:
+    # bar_r and tol turn on the convergence check (dwell in seconds.)
+    # workspace is None (no check), 'anchors' (the anchors' bounding box),
+    # 'hull' (their convex hull), a pair (lower, upper) of corners, or any
+    # object (like a workspace.Workspace) with a
+    # contains(pos) method that takes (N, 3) positions and returns (N,) bools.
+    # lyapunov_increase turns on the Lyapunov check, nonfinite is on by default.
+
+    def __init__(self, bar_r=None, tol=None, dwell=0., workspace=None,
+                 lyapunov_increase=False, lyapunov_tol=0., nonfinite=True):
+        self.bar_r = None if bar_r is None else np.asarray(bar_r, dtype=float)
+        self.tol = tol
+        self.dwell = dwell
+        self.workspace = workspace
+        self.lyapunov_increase = lyapunov_increase
+        self.lyapunov_tol = lyapunov_tol
+        self.nonfinite = nonfinite
+        if (self.bar_r is None) != (self.tol is None):
+            raise Exception('The convergence check needs both bar_r and tol.')
+        # filled in by setup()
+        self._lower = None
+        self._upper = None
+        self._hull = None
+        self._dwell_steps = 0
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(**spec)
+
+    # As a plain dict (for checkpoints and run file metadata.) Only
+    # possible for the workspaces that can be written as JSON.
+    def to_dict(self):
+        workspace = self.workspace
+        if workspace is not None and not isinstance(workspace, str):
+            if hasattr(workspace, 'contains'):
+                raise Exception('Cannot write a custom workspace object as a dict.')
+            workspace = [np.asarray(workspace[0]).tolist(), np.asarray(workspace[1]).tolist()]
+        return {'bar_r':None if self.bar_r is None else self.bar_r.tolist(),
+                'tol':self.tol, 'dwell':self.dwell, 'workspace':workspace,
+                'lyapunov_increase':self.lyapunov_increase,
+                'lyapunov_tol':self.lyapunov_tol, 'nonfinite':self.nonfinite}
+
+    # Resolve the settings that depend on the rig and timestep.
+    def setup(self, rig, dt):
+        if isinstance(self.workspace, str):
+            if self.workspace == 'anchors':
+                self._lower = np.min(rig.anchors, axis=0)
+                self._upper = np.max(rig.anchors, axis=0)
+            elif self.workspace == 'hull':
+                self._hull = rig_workspace.Workspace.from_rig(rig)
+            else:
+                raise Exception('Unknown workspace: ' + self.workspace)
+        elif self.workspace is not None and not hasattr(self.workspace, 'contains'):
+            self._lower = np.asarray(self.workspace[0], dtype=float)
+            self._upper = np.asarray(self.workspace[1], dtype=float)
+        # the dwell time in steps (at least one step under tol.)
+        self._dwell_steps = max(int(np.ceil(self.dwell / dt - 1E-9)), 1)
+
+    # Check states (M, 6) after a step, with the Lyapunov function before
+    # (V_prev) and after (V) it. 'dwell' (M,) counts the steps each member
+    # has been under tol, and is updated in place.
+    # Returns (M,) reason codes, RUNNING for those that carry on. If more
+    # than one criterion is met, the last in REASONS wins.
+    def check(self, state, V_prev, V, dwell):
+        reason = np.zeros(state.shape[0], dtype=np.int8)
+        if self.bar_r is not None:
+            err = state[:, 0:3] - self.bar_r
+            err_sq = np.sum(err * err, axis=1) + np.sum(state[:, 3:6] * state[:, 3:6], axis=1)
+            under = err_sq < self.tol * self.tol
+            dwell[:] = np.where(under, dwell + 1, 0)
+            reason[dwell >= self._dwell_steps] = CONVERGED
+        if self.workspace is not None:
+            pos = state[:, 0:3]
+            if self._lower is not None:
+                inside = np.all((pos >= self._lower) & (pos <= self._upper), axis=1)
+            elif self._hull is not None:
+                inside = self._hull.contains(pos)
+            else:
+                inside = self.workspace.contains(pos)
+            reason[~inside] = LEFT_WORKSPACE
+        if self.lyapunov_increase:
+            reason[V > V_prev + self.lyapunov_tol] = LYAPUNOV_INCREASE
+        if self.nonfinite:
+            reason[~np.all(np.isfinite(state), axis=1)] = NONFINITE
+        return reason
+
+# A StoppingCriteria from whatever was given to Simulation (None, a dict,
+# or a StoppingCriteria), set up for the rig.
+def get_criteria(stopping, rig, dt):
+    if stopping is None:
+        return None
+    if isinstance(stopping, dict):
+        stopping = StoppingCriteria.from_dict(stopping)
+    stopping.setup(rig, dt)
+    return stopping
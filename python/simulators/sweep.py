@@ -0,0 +1,121 @@
+"""
+Sweeps over many initial conditions that keep only statistics.
+
+Each worker simulates its share of the initial conditions, chunk_size
+members at a time, folds every chunk into its own EnsembleStats
+(trajectories/ensemble_stats.py) and drops the chunk's histories; the
+parent merges the workers' stats as they finish. So memory is a few
+chunks' histories plus fixed-size stats per worker, whatever the number
+of initial conditions. The merges are in share order (shares that finish
+early wait for the ones before them), so the results don't depend on
+which worker finished first:
+    stats = sweep.run_sweep(rig, pos0, vel0, dt, T, equilibrium=bar_r,
+                            num_samples=20, stopping={'tol':1E-3})
+    stats.get_quantiles('norm_err', [0.5, 0.95])   # (2, len(stats.get_sketch_times()))
+    stats.get_slack_fraction()                     # (T, n)
+"""
+
+# need to do linear alg
+import numpy as np
+import os
+import time
+import concurrent.futures
+from simulators import simulation
+from simulators import stopping
+from trajectories import ensemble_stats
+
+# The ensemble stats settings, out of run_sweep's keyword arguments.
+STATS_KWARGS = ['equilibrium', 'bound', 'lyapunov_tol', 'relative_accuracy', 'min_value',
+                'max_value', 'histogram_edges', 'num_samples', 'sketch_every']
+
+# Simulate and reduce members [lo, hi), chunk_size at a time. Runs in a
+# worker. Returns (EnsembleStats, seconds taken.)
+def run_share(rig, pos0, vel0, dt, num_timesteps, lo, chunk_size, stats_kwargs, seed,
+              sim_kwargs):
+    start = time.time()
+    stats = ensemble_stats.EnsembleStats(num_timesteps, rig.tags, dt, seed=seed,
+                                         **stats_kwargs)
+    for i in range(0, pos0.shape[0], chunk_size):
+        sim = simulation.Simulation(rig, pos0[i:i+chunk_size], vel0[i:i+chunk_size], dt,
+                                    num_timesteps, **sim_kwargs)
+        results = sim.run()
+        reasons = sim.stop_reason if sim.stopping is not None else None
+        stats.update(results, members=lo + i + np.arange(sim.num_members),
+                     stop_reason=reasons)
+        del sim, results
+    return stats, time.time() - start
+
+# Run an ensemble (pos0 (N, 3), vel0 (N, 3) or one 3-vector) for its
+# statistics. The N members are split into num_shares shares (default: 4
+# per worker) for num_workers processes (None is one per core, 1 runs
+# here); at most two shares per worker are in flight. Keyword arguments
+# in STATS_KWARGS go to EnsembleStats, the rest to Simulation. seed makes
+# the trajectory sample reproducible, for any num_workers (but not
+# num_shares.) Returns the merged EnsembleStats.
+def run_sweep(rig, pos0, vel0, dt, num_timesteps, num_workers=None, chunk_size=64,
+              num_shares=None, seed=None, verbose=False, **kwargs):
+    start = time.time()
+    stats_kwargs = {key: kwargs.pop(key) for key in STATS_KWARGS if key in kwargs}
+    pos0 = np.atleast_2d(np.asarray(pos0, dtype=float))
+    N = pos0.shape[0]
+    vel0 = np.broadcast_to(np.asarray(vel0, dtype=float), (N, 3))
+    workers = os.cpu_count() if num_workers is None else num_workers
+    if num_shares is None:
+        num_shares = 4 * workers
+    bounds = np.linspace(0, N, max(1, min(num_shares, N)) + 1).astype(int)
+    seeds = np.random.SeedSequence(seed).spawn(len(bounds))
+    args = [(rig, pos0[lo:hi], vel0[lo:hi], dt, num_timesteps, lo, chunk_size,
+             stats_kwargs, seeds[j], kwargs)
+            for j, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))]
+    total = ensemble_stats.EnsembleStats(num_timesteps, rig.tags, dt, seed=seeds[-1],
+                                         **stats_kwargs)
+    seconds = 0.
+    if num_workers == 1:
+        for a in args:
+            stats, secs = run_share(*a)
+            total.merge(stats)
+            seconds += secs
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as pool:
+            pending = {}
+            finished = {}
+            num_submitted = 0
+            num_merged = 0
+            while num_merged < len(args):
+                # (shares waiting to be merged count as in flight.)
+                while num_submitted < len(args) and \
+                      len(pending) + len(finished) < 2 * workers:
+                    future = pool.submit(run_share, *args[num_submitted])
+                    pending[future] = num_submitted
+                    num_submitted += 1
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    finished[pending.pop(future)] = future.result()
+                # (the sample's merge depends on the order, so merge the
+                # shares in order, as far as they're done.)
+                while num_merged in finished:
+                    stats, secs = finished.pop(num_merged)
+                    total.merge(stats)
+                    seconds += secs
+                    num_merged += 1
+    if verbose:
+        print(str(N) + ' members in ' + '{:.1f}'.format(time.time() - start) + ' s ('
+              + '{:.1f}'.format(seconds) + ' s in workers)')
+    return total
+
+# Print a short summary of some sweep stats.
+def print_report(stats, quantiles=(0.5, 0.95)):
+    print('Members: ' + str(stats.count))
+    for name in stats.quantities:
+        q = stats.get_quantiles(name, list(quantiles))
+        print(name + ': mean ' + '{:.4g}'.format(stats.get_mean(name)[-1]) + ' at the end, '
+              + ', '.join('{:g}'.format(100*p) + '% ' + '{:.4g}'.format(q[j, -1])
+                          for j, p in enumerate(quantiles)))
+    print('V increased at least once in ' + str(stats.num_increasing) + ' members')
+    fraction = np.mean(stats.get_slack_fraction(), axis=0)
+    print('Slack fraction (time-averaged): ' + ', '.join(
+        tag + ' ' + '{:.3f}'.format(f) for tag, f in zip(stats.tags, fraction)))
+    if len(stats.stop_counts) > 0:
+        print('Stop reasons: ' + ', '.join(stopping.REASONS[code] + ' ' + str(num)
+                                           for code, num in sorted(stats.stop_counts.items())))
@@ -0,0 +1,225 @@
+"""
+Work-precision benchmarks for the integrators (integrators.py) and time
+steps: how much accuracy a configuration buys for its run time. Each
+configuration (integrator, dt) runs the initial conditions as one batch
+from 0 to t_end, and is compared with a reference run (rk4 at a tenth of
+the smallest dt by default, itself checked against rk4 at twice its step):
+    final_error         |r(t_end) - r_ref(t_end)|, worst member (m)
+    max_error           the same, worst over the sample times (every sample_dt)
+    slack_timing_error  worst |t - t_ref| over the slack / taut events, matched
+                        in order per member and cable (s). An event is a sign
+                        change of the rig's unclipped force (k (\ell - v) +
+                        c \dot \ell, or k (\ell - v) alone for hybrid_split
+                        cables), timed by linear interpolation within the step.
+    slack_count_error   events missing or extra vs. the reference, summed
+    V_drift             worst |V - V_ref| at the sample times
+    V_increase          the sum of V's increases between steps, worst member
+                        (the closed loop's V never increases, so this is
+                        energy the integrator made up)
+    wall_time           best of repeats, an uninstrumented run (s)
+For example:
+    bench = work_precision.WorkPrecision(rig, pos0, vel0, 2.0, name='box')
+    rows = bench.run()
+    work_precision.print_table(rows)
+    work_precision.get_cheapest(rows, {'max_error':1E-3})
+See benchmark_integrators.py for the box, tetrahedron and 1D rigs,
+with tables and plots.
+"""
+
+# need to do linear alg
+import numpy as np
+import csv
+import time
+from simulators import integrators
+
+METRICS = ['final_error', 'max_error', 'slack_timing_error', 'slack_count_error',
+           'V_drift', 'V_increase']
+COLUMNS = ['rig', 'integrator', 'dt', 'num_steps', 'evaluations', 'wall_time'] + METRICS
+
+# A helper: the number of steps of size dt in span. dt has to divide it.
+def _get_num_steps(span, dt):
+    num_steps = int(round(span / dt))
+    if num_steps < 1 or abs(num_steps * dt - span) > 1E-9 * span:
+        raise Exception('Step ' + str(dt) + ' does not divide ' + str(span) + '.')
+    return num_steps
+
+# A helper: the initial states (N, 6).
+def _get_states(pos0, vel0):
+    pos0 = np.atleast_2d(np.asarray(pos0, dtype=float))
+    state = np.zeros((pos0.shape[0], 6))
+    state[:, 0:3] = pos0
+    state[:, 3:6] = np.broadcast_to(np.asarray(vel0, dtype=float), pos0.shape)
+    return state
+
+# A helper: the unclipped cable forces (N, n), whose sign says taut or slack.
+def _get_unclipped(rig, state):
+    ell, dot_ell, _ = rig.get_kinematics(state)
+    return rig.get_unclipped_forces(ell, dot_ell, rig.get_controls(ell))
+
+# Integrate from 0 to t_end in steps of dt, recording what the metrics
+# need: the states and V every sample_dt (from t = 0), the slack events
+# (per member and cable, a list of (time, went_taut)), and the sum of the
+# increases of V (above lyapunov_tol) per member.
+def integrate(rig, pos0, vel0, integrator, dt, t_end, sample_dt, lyapunov_tol=1E-9):
+    step = integrators.get_integrator(integrator)
+    num_steps = _get_num_steps(t_end, dt)
+    every = _get_num_steps(sample_dt, dt)
+    if num_steps % every != 0:
+        raise Exception('sample_dt ' + str(sample_dt) + ' does not divide t_end '
+                        + str(t_end) + '.')
+    state = _get_states(pos0, vel0)
+    N = state.shape[0]
+    num_samples = num_steps // every + 1
+    states = np.zeros((N, num_samples, 6))
+    Vs = np.zeros((N, num_samples))
+    events = [[[] for _ in range(rig.num_cables)] for _ in range(N)]
+    V_increase = np.zeros(N)
+    U = _get_unclipped(rig, state)
+    V = rig.get_V(state)
+    states[:, 0] = state
+    Vs[:, 0] = V
+    for t in range(num_steps):
+        step(rig, state, dt)
+        U_new = _get_unclipped(rig, state)
+        V_new = rig.get_V(state)
+        crossed = (U > 0) != (U_new > 0)
+        if np.any(crossed):
+            for i, j in zip(*np.nonzero(crossed)):
+                frac = U[i, j] / (U[i, j] - U_new[i, j])
+                events[i][j].append(((t + frac) * dt, bool(U_new[i, j] > 0)))
+        dV = V_new - V
+        V_increase += np.where(dV > lyapunov_tol, dV, 0.)
+        U = U_new
+        V = V_new
+        if (t + 1) % every == 0:
+            states[:, (t + 1) // every] = state
+            Vs[:, (t + 1) // every] = V
+    return {'times':sample_dt * np.arange(num_samples), 'state':states, 'V':Vs,
+            'events':events, 'V_increase':V_increase}
+
+# The wall time of integrating from 0 to t_end, without any recording,
+# best of repeats.
+def time_integration(rig, pos0, vel0, integrator, dt, t_end, repeats=3):
+    step = integrators.get_integrator(integrator)
+    num_steps = _get_num_steps(t_end, dt)
+    best = np.inf
+    for _ in range(repeats):
+        state = _get_states(pos0, vel0)
+        start = time.perf_counter()
+        for _ in range(num_steps):
+            step(rig, state, dt)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# The metrics of a run (from integrate) against the reference run, which
+# has to have the same sample times.
+def compare(run, reference):
+    if run['state'].shape != reference['state'].shape:
+        raise Exception('Runs have different sample times, cannot compare.')
+    err = np.linalg.norm(run['state'][..., 0:3] - reference['state'][..., 0:3], axis=2)
+    timing = 0.
+    count = 0
+    for run_member, ref_member in zip(run['events'], reference['events']):
+        for a, b in zip(run_member, ref_member):
+            # in order, up to the first event that went the other way.
+            matched = 0
+            for (t_a, taut_a), (t_b, taut_b) in zip(a, b):
+                if taut_a != taut_b:
+                    break
+                timing = max(timing, abs(t_a - t_b))
+                matched += 1
+            count += (len(a) - matched) + (len(b) - matched)
+    return {'final_error':float(np.max(err[:, -1])), 'max_error':float(np.max(err)),
+            'slack_timing_error':timing, 'slack_count_error':count,
+            'V_drift':float(np.max(np.abs(run['V'] - reference['V']))),
+            'V_increase':float(np.max(run['V_increase']))}
+
+class WorkPrecision:
+    # Every integrator in methods at every dt in dts, for the initial conditions
+    # pos0 (N, 3), vel0 (N, 3) (or one 3-vector) on rig, from 0 to t_end.
+    # sample_dt (default the largest dt) has to be a multiple of every dt.
+    # name labels the rows.
+
+    def __init__(self, rig, pos0, vel0, t_end, dts=(0.01, 0.005, 0.002, 0.001),
+                 methods=tuple(integrators.INTEGRATORS), reference='rk4',
+                 reference_dt=None, sample_dt=None, repeats=3, name='rig'):
+        self.rig = rig
+        self.pos0 = pos0
+        self.vel0 = vel0
+        self.t_end = t_end
+        self.dts = sorted(dts, reverse=True)
+        self.methods = list(methods)
+        self.reference = reference
+        self.reference_dt = min(dts) / 10. if reference_dt is None else reference_dt
+        self.sample_dt = max(dts) if sample_dt is None else sample_dt
+        self.repeats = repeats
+        self.name = name
+        self._reference_run = None
+        self.reference_error = None
+
+    # The reference run (computed once), and its own error: the metrics of
+    # the same integrator at twice the step against it.
+    def get_reference(self):
+        if self._reference_run is None:
+            self._reference_run = self._integrate(self.reference, self.reference_dt)
+            coarse = self._integrate(self.reference, 2 * self.reference_dt)
+            self.reference_error = compare(coarse, self._reference_run)
+        return self._reference_run
+
+    # A helper.
+    def _integrate(self, integrator, dt):
+        return integrate(self.rig, self.pos0, self.vel0, integrator, dt, self.t_end,
+                         self.sample_dt)
+
+    # One row per (integrator, dt), as dicts with COLUMNS.
+    def run(self, verbose=False):
+        reference = self.get_reference()
+        rows = []
+        for integrator in self.methods:
+            for dt in self.dts:
+                row = {'rig':self.name, 'integrator':integrator, 'dt':dt,
+                       'num_steps':_get_num_steps(self.t_end, dt)}
+                row['evaluations'] = row['num_steps'] * integrators.NUM_EVALUATIONS[integrator]
+                row['wall_time'] = time_integration(self.rig, self.pos0, self.vel0,
+                                                    integrator, dt, self.t_end, self.repeats)
+                row.update(compare(self._integrate(integrator, dt), reference))
+                if verbose:
+                    print(self.name + ': ' + integrator + ', dt = ' + str(dt) + ', '
+                          + '{:.3g}'.format(row['wall_time']) + ' s')
+                rows.append(row)
+        return rows
+
+# The cheapest row (least wall time) per rig that meets every target
+# (metric -> largest allowed value), or None for a rig where none does.
+def get_cheapest(rows, targets):
+    for metric in targets:
+        if metric not in METRICS:
+            raise Exception('Unknown metric ' + str(metric) + ', use one of '
+                            + ', '.join(METRICS) + '.')
+    cheapest = {}
+    for row in rows:
+        cheapest.setdefault(row['rig'], None)
+        if all(row[metric] <= limit for metric, limit in targets.items()):
+            best = cheapest[row['rig']]
+            if best is None or row['wall_time'] < best['wall_time']:
+                cheapest[row['rig']] = row
+    return cheapest
+
+# The rows as a table, one line per configuration.
+def print_table(rows):
+    widths = [max([len(column), 10] + [len(str(row[column])) for row in rows
+                                       if isinstance(row[column], str)]) + 2
+              for column in COLUMNS]
+    print(''.join(('{:>' + str(w) + '}').format(column) for column, w in zip(COLUMNS, widths)))
+    for row in rows:
+        print(''.join(('{:>' + str(w) + '}' if isinstance(row[column], (str, int)) else
+                       '{:>' + str(w) + '.4g}').format(row[column])
+                      for column, w in zip(COLUMNS, widths)))
+
+# Write the rows to a .csv file.
+def save_table(rows, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({column: row[column] for column in COLUMNS})
@@ -0,0 +1,145 @@
+"""
+The workspace of a rig as a convex polytope in halfspace form,
+    { r : A r <= b },
+so checking whether positions are inside is one matrix product, for any
+number of positions at once. The point mass has to start inside the
+convex hull of the anchors (simulation_particle_3D.py says so, and nothing
+checked it), and Monte Carlo studies want initial conditions drawn from
+exactly that region:
+    ws = workspace.Workspace.from_rig(rigs.box_rig(), margin=0.05)
+    ok = ws.contains(candidates)        # (N, 3) -> (N,) bools
+    pos0 = ws.sample(10000, rng)        # uniform over the workspace
+The feasible workspace is the anchor hull shrunk by 'margin' on every face,
+which keeps starting points away from the anchors and the faces, where the
+cables are nearly slack or nearly parallel.
+
+A Workspace can also be given to stopping.StoppingCriteria as the
+workspace, to stop runs that leave it.
+"""
+
+# need to do linear alg
+import numpy as np
+import itertools
+
+class Workspace:
+    # A (m, 3) outward face normals (unit length), b (m,) offsets.
+
+    def __init__(self, A, b):
+        self.A = np.asarray(A, dtype=float)
+        self.b = np.asarray(b, dtype=float)
+        # A^T once, for the products in contains().
+        self._A_T = np.ascontiguousarray(self.A.T)
+        self._bounds = None
+
+    # The convex hull of points (n, 3), shrunk by margin. The points must
+    # not all lie in one plane.
+    @classmethod
+    def from_anchors(cls, anchors, margin=0., tol=1E-9):
+        A, b = get_hull_halfspaces(anchors, tol)
+        return cls(A, b - margin)
+
+    @classmethod
+    def from_rig(cls, rig, margin=0.):
+        return cls.from_anchors(rig.anchors, margin)
+
+    @property
+    def num_faces(self):
+        return len(self.b)
+
+    # Whether each position (..., 3) is inside, as (...) bools. Large
+    # inputs are done in chunks, to keep the (chunk, m) product small.
+    def contains(self, pos, chunk_size=1000000):
+        pos = np.asarray(pos, dtype=float)
+        flat = pos.reshape(-1, 3)
+        inside = np.empty(len(flat), dtype=bool)
+        for lo in range(0, len(flat), chunk_size):
+            hi = min(lo + chunk_size, len(flat))
+            inside[lo:hi] = np.all(flat[lo:hi] @ self._A_T <= self.b, axis=1)
+        return inside.reshape(pos.shape[:-1])
+
+    # How far inside each position is: the smallest distance to a face,
+    # negative outside.
+    def get_depth(self, pos):
+        pos = np.asarray(pos, dtype=float)
+        return np.min(self.b - pos @ self._A_T, axis=-1)
+
+    # The bounding box of the workspace, (lower, upper). Found from the
+    # vertices (intersections of three faces that are inside.)
+    def get_bounds(self):
+        if self._bounds is None:
+            vertices = self.get_vertices()
+            if len(vertices) == 0:
+                raise Exception('The workspace is empty (margin too large?)')
+            self._bounds = (np.min(vertices, axis=0), np.max(vertices, axis=0))
+        return self._bounds
+
+    # The vertices of the polytope, (k, 3).
+    def get_vertices(self, tol=1E-9):
+        vertices = []
+        for i, j, l in itertools.combinations(range(self.num_faces), 3):
+            M = self.A[[i, j, l]]
+            if abs(np.linalg.det(M)) < tol:
+                continue
+            x = np.linalg.solve(M, self.b[[i, j, l]])
+            if np.all(self.A @ x <= self.b + tol):
+                vertices.append(x)
+        if len(vertices) == 0:
+            return np.zeros((0, 3))
+        return np.unique(np.round(np.array(vertices), 12), axis=0)
+
+    # Draw num positions uniformly from the workspace, (num, 3), by
+    # rejection from the bounding box (in batches, vectorized.)
+    def sample(self, num, rng=None, batch_size=None):
+        if rng is None:
+            rng = np.random.default_rng()
+        lower, upper = self.get_bounds()
+        if batch_size is None:
+            batch_size = max(2 * num, 1024)
+        samples = np.zeros((num, 3))
+        count = 0
+        while count < num:
+            candidates = rng.uniform(lower, upper, size=(batch_size, 3))
+            accepted = candidates[self.contains(candidates)]
+            take = min(len(accepted), num - count)
+            samples[count:count+take] = accepted[0:take]
+            count += take
+        return samples
+
+    # The fraction of the bounding box that's inside, estimated from
+    # num samples (the acceptance rate of sample().)
+    def get_fill_fraction(self, num=100000, rng=None):
+        if rng is None:
+            rng = np.random.default_rng()
+        lower, upper = self.get_bounds()
+        return float(np.mean(self.contains(rng.uniform(lower, upper, size=(num, 3)))))
+
+# The halfspaces (A, b) of the convex hull of points (n, 3). Every plane
+# through three of the points that has all the others on one side is a
+# face. That's O(n^4), which is nothing for the handful of anchors of a
+# cable rig. Coplanar faces (e.g. the four corners of a box side) give
+# the same plane more than once; those are merged.
+def get_hull_halfspaces(points, tol=1E-9):
+    points = np.asarray(points, dtype=float)
+    center = np.mean(points, axis=0)
+    normals = []
+    offsets = []
+    for i, j, l in itertools.combinations(range(len(points)), 3):
+        normal = np.cross(points[j] - points[i], points[l] - points[i])
+        norm = np.linalg.norm(normal)
+        if norm < tol:
+            # the three are collinear.
+            continue
+        normal /= norm
+        offset = normal @ points[i]
+        # point it outward (away from the centroid.)
+        if normal @ center > offset:
+            normal = -normal
+            offset = -offset
+        if np.all(points @ normal <= offset + tol):
+            if not any(np.allclose(normal, n2, atol=1E-9) and abs(offset - o2) < tol
+                       for n2, o2 in zip(normals, offsets)):
+                normals.append(normal)
+                offsets.append(offset)
+    if len(normals) < 4:
+        raise Exception('The anchors are coplanar, they have no 3D convex hull.')
+    return np.array(normals), np.array(offsets)
@@ -0,0 +1,104 @@
+"""
+Tests of checkpoints (simulators/checkpoint.py): a run saved part way
+and loaded again continues bit-identically, histories, delay lines,
+stopping and slack log included, and a fork carries on on its own
+without redoing the shared prefix.
+Run with python -m pytest from this directory.
+"""
+
+# need to do linear alg
+import numpy as np
+import pytest
+from simulators import rigs
+from simulators import rig
+from simulators import simulation
+from simulators import checkpoint
+from simulators import force_laws
+
+dt = 0.01
+T = 300
+
+# The box's tests A-D, as one ensemble.
+def get_box_ensemble():
+    names = sorted(rigs.box_initial_conditions)
+    pos0 = np.array([rigs.box_initial_conditions[name][0] for name in names])
+    vel0 = np.array([rigs.box_initial_conditions[name][1] for name in names])
+    return rigs.box_rig(), pos0, vel0
+
+# Everything a continued run should have the same as an uninterrupted one.
+def assert_same_run(sim, expected):
+    assert sim.t == expected.t
+    results = sim.get_results()
+    for key, val in expected.get_results().items():
+        assert np.array_equal(results[key], val)
+    slack = sim.get_slack_arrays()
+    for key, val in expected.get_slack_arrays().items():
+        assert np.array_equal(slack[key], val)
+    assert np.array_equal(sim.stop_step, expected.stop_step)
+    assert np.array_equal(sim.stop_reason, expected.stop_reason)
+
+# Save at t=120, load, run to the end: the same bits as never stopping,
+# with each backend, with delays, and with early stopping (member B has
+# stopped by then, the others stop later.)
+@pytest.mark.parametrize('sim_kwargs', [{'backend':'numpy'}, {'backend':'jit'},
+                                        {'sense_delay':1.5, 'actuation_delay':2.},
+                                        {'stopping':{'bar_r':rigs.box_bar_r.tolist(),
+                                                     'tol':0.01}}])
+def test_round_trip(sim_kwargs, tmp_path):
+    box, pos0, vel0 = get_box_ensemble()
+    expected = simulation.Simulation(box, pos0, vel0, dt, T, **sim_kwargs)
+    expected.run()
+    sim = simulation.Simulation(box, pos0, vel0, dt, T, **sim_kwargs)
+    sim.run(120)
+    filename = str(tmp_path / 'box.ckpt.npz')
+    checkpoint.save_checkpoint(sim, filename)
+    del sim
+    sim = checkpoint.load_checkpoint(filename)
+    assert sim.t == 120
+    assert sim.backend == expected.backend
+    if sim.stopping is not None:
+        assert 0 < len(sim.active) < sim.num_members
+    sim.run()
+    assert_same_run(sim, expected)
+
+# A fork with the same rig continues like the original; one with other
+# controller constants shares the prefix and then goes its own way,
+# leaving the original alone.
+def test_fork():
+    box, pos0, vel0 = get_box_ensemble()
+    expected = simulation.Simulation(box, pos0, vel0, dt, T)
+    expected.run()
+    sim = simulation.Simulation(box, pos0, vel0, dt, T)
+    sim.run(120)
+    same = checkpoint.fork(sim)
+    assert same.rig is box
+    anchors, params, consts = box.to_dicts()
+    consts = {tag: dict(c, kappa=0.5 * c['kappa']) for tag, c in consts.items()}
+    other_rig = rig.CableRig.from_dicts(box.tags, anchors, params, consts, box.m, box.g)
+    other = checkpoint.fork(sim, new_rig=other_rig, num_timesteps=T+50)
+    same.run()
+    other.run()
+    sim.run()
+    assert_same_run(same, expected)
+    assert_same_run(sim, expected)
+    assert other.t == T + 50
+    results = other.get_results()
+    assert np.array_equal(results['state'][:, 0:121], expected.get_results()['state'][:, 0:121])
+    assert not np.array_equal(results['state'][:, 0:T+1], expected.get_results()['state'])
+
+# A rig with another force law can't be rebuilt from its checkpoint, so
+# loading it needs the rig; with it, the run continues as before.
+def test_law_rig_needs_new_rig(tmp_path):
+    box, pos0, vel0 = get_box_ensemble()
+    law_rig = force_laws.LawRig(box, 'logistic')
+    expected = simulation.Simulation(law_rig, pos0, vel0, dt, T)
+    expected.run()
+    sim = simulation.Simulation(law_rig, pos0, vel0, dt, T)
+    sim.run(120)
+    filename = str(tmp_path / 'box_logistic.ckpt.npz')
+    checkpoint.save_checkpoint(sim, filename)
+    with pytest.raises(Exception):
+        checkpoint.load_checkpoint(filename)
+    sim = checkpoint.load_checkpoint(filename, new_rig=law_rig)
+    sim.run()
+    assert_same_run(sim, expected)
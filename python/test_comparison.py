@@ -0,0 +1,55 @@
+"""
+Tests of the multi-model comparison (simulators/comparison.py): each law's
+rows of the lockstep batch are the same bits as a Simulation of the rig
+under that law, and the report measures the laws against the first one.
+Run with python -m pytest from this directory.
+"""
+
+# need to do linear alg
+import numpy as np
+from simulators import rigs
+from simulators import simulation
+from simulators import comparison
+from simulators import force_laws
+
+dt = 0.01
+T = 300
+laws = ['piecewise', 'linear', 'hybrid_split', 'logistic']
+
+# The box's tests A-D.
+def get_box_ics():
+    names = sorted(rigs.box_initial_conditions)
+    pos0 = np.array([rigs.box_initial_conditions[name][0] for name in names])
+    vel0 = np.array([rigs.box_initial_conditions[name][1] for name in names])
+    return pos0, vel0
+
+# 'piecewise' is Simulation on the rig itself, bit for bit, and each other
+# law is Simulation on a LawRig of it.
+def test_laws_equal_simulation():
+    box = rigs.box_rig()
+    pos0, vel0 = get_box_ics()
+    comp = comparison.ModelComparison(box, pos0, vel0, dt, T, laws=laws)
+    comp.run()
+    for law in laws:
+        law_rig = box if law == 'piecewise' else force_laws.LawRig(box, law)
+        expected = simulation.Simulation(law_rig, pos0, vel0, dt, T).run()
+        results = comp.get_results(law)
+        for key in expected:
+            assert np.array_equal(results[key], expected[key])
+
+# The reference law doesn't diverge from itself, the others do, and the
+# linear law pushes where the piecewise ones never do.
+def test_report():
+    pos0, vel0 = get_box_ics()
+    comp = comparison.ModelComparison(rigs.box_rig(), pos0, vel0, dt, T, laws=laws,
+                                      equilibrium=rigs.box_bar_r)
+    comp.run()
+    report = comp.get_report()
+    assert np.all(report['piecewise']['max_divergence'] == 0.)
+    assert np.all(np.isnan(report['piecewise']['time_to_tol']))
+    for law in laws[1:]:
+        assert np.all(report[law]['max_divergence'] > 0.)
+    assert np.all(report['piecewise']['push_fraction'] == 0.)
+    assert np.all(report['hybrid_split']['push_fraction'] == 0.)
+    assert np.any(report['linear']['push_fraction'] > 0.)
+    assert report['piecewise']['final_error'].shape == (4,)
@@ -0,0 +1,92 @@
+"""
+Tests of the streaming ensemble statistics (trajectories/ensemble_stats.py)
+and the sweep runner that merges them (simulators/sweep.py): merged stats
+are the stats of all the members, the quantiles are within the sketch's
+accuracy, and a seeded sweep is the same whatever the number of workers.
+Run with python -m pytest from this directory.
+"""
+
+# need to do linear alg
+import numpy as np
+from simulators import rigs
+from simulators import simulation
+from simulators import sweep
+from trajectories import ensemble_stats
+
+dt = 0.01
+T = 150
+
+# Box members spread around test A's initial condition.
+def get_box_ensemble(N=24):
+    rng = np.random.default_rng(0)
+    pos0, vel0 = rigs.box_initial_conditions['A']
+    return rigs.box_rig(), pos0 + 0.1 * rng.uniform(-1., 1., (N, 3)), vel0
+
+# The quantiles of a sketch are within its relative accuracy of the
+# order statistics, and merging two sketches is sketching everything.
+def test_quantile_sketch():
+    rng = np.random.default_rng(1)
+    values = rng.lognormal(0., 2., (2000, 3))
+    values[:, 2] *= -1.
+    whole = ensemble_stats.QuantileSketch(3, relative_accuracy=0.02)
+    whole.add(values)
+    left = ensemble_stats.QuantileSketch(3, relative_accuracy=0.02)
+    right = ensemble_stats.QuantileSketch(3, relative_accuracy=0.02)
+    left.add(values[0:700])
+    right.add(values[700:])
+    left.merge(right)
+    q = [0.01, 0.25, 0.5, 0.9, 0.99]
+    assert np.array_equal(left.get_quantiles(q), whole.get_quantiles(q))
+    exact = np.quantile(values, q, axis=0, method='lower')
+    assert np.all(np.abs(whole.get_quantiles(q) - exact) <= 0.02 * np.abs(exact) * (1. + 1E-9))
+
+# Stats of two halves merged are the stats of the whole ensemble.
+def test_merge_equals_whole():
+    rig, pos0, vel0 = get_box_ensemble()
+    results = simulation.Simulation(rig, pos0, vel0, dt, T).run()
+    kwargs = {'equilibrium':rigs.box_bar_r, 'num_samples':30, 'sketch_every':10}
+    whole = ensemble_stats.EnsembleStats(T, rig.tags, dt, **kwargs)
+    whole.update(results)
+    left = ensemble_stats.EnsembleStats(T, rig.tags, dt, **kwargs)
+    right = ensemble_stats.EnsembleStats(T, rig.tags, dt, **kwargs)
+    left.update({key: val[0:10] for key, val in results.items()})
+    right.update({key: val[10:] for key, val in results.items()}, members=10 + np.arange(14))
+    left.merge(right)
+    assert left.count == whole.count == 24
+    bar_x = np.concatenate((rigs.box_bar_r, np.zeros(3)))
+    values = {'V':results['V'], 'norm_err':np.linalg.norm(results['state'] - bar_x, axis=2)}
+    for name in ['V', 'norm_err']:
+        assert np.allclose(left.get_mean(name), np.mean(values[name], axis=0),
+                           rtol=1E-12, atol=0.)
+        assert np.allclose(left.get_std(name), whole.get_std(name), rtol=1E-9, atol=1E-15)
+        assert np.array_equal(left.get_quantiles(name, [0.1, 0.5, 0.9]),
+                              whole.get_quantiles(name, [0.1, 0.5, 0.9]))
+    assert np.array_equal(left.slack_counts, whole.slack_counts)
+    assert np.array_equal(left.increase_counts, whole.increase_counts)
+    # (the sample has room for everyone, so it's every member.)
+    members, sample = left.sample.get_arrays()
+    assert np.array_equal(members, np.arange(24))
+    assert np.array_equal(sample['state'], results['state'])
+
+# A seeded sweep gives the same stats, sample included, in this process
+# and on any number of workers.
+def test_sweep_is_reproducible():
+    rig, pos0, vel0 = get_box_ensemble()
+    kwargs = {'equilibrium':rigs.box_bar_r, 'num_samples':5, 'chunk_size':2,
+              'num_shares':8, 'seed':123}
+    runs = [sweep.run_sweep(rig, pos0, vel0, dt, T, num_workers=w, **kwargs)
+            for w in [1, 2, 3, 3]]
+    members0, sample0 = runs[0].sample.get_arrays()
+    assert len(members0) == 5
+    for stats in runs[1:]:
+        members, sample = stats.sample.get_arrays()
+        assert np.array_equal(members, members0)
+        assert np.array_equal(sample['V'], sample0['V'])
+        for name in ['V', 'norm_err']:
+            assert np.array_equal(stats.get_mean(name), runs[0].get_mean(name))
+            assert np.array_equal(stats.get_quantiles(name, [0.5]),
+                                  runs[0].get_quantiles(name, [0.5]))
+        assert np.array_equal(stats.slack_counts, runs[0].slack_counts)
+    # and the sample is of the members' own trajectories.
+    results = simulation.Simulation(rig, pos0, vel0, dt, T).run()
+    assert np.array_equal(sample0['V'], results['V'][members0])
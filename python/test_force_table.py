@@ -0,0 +1,93 @@
+"""
+Tests of the tabulated force laws (simulators/force_table.py): tables are
+within their tolerance of the law, the stacked lookup of a rig's tables
+is the same as looking each one up, and a tabulated rig follows the
+exact law's trajectory.
+Run with python -m pytest from this directory.
+"""
+
+# need to do linear alg
+import numpy as np
+import pytest
+from simulators import rigs
+from simulators import simulation
+from simulators import force_laws
+from simulators import force_table
+from simulators import kernels
+
+stretch_range = (-0.05, 0.3)
+rate_range = (-8., 8.)
+
+# A table is within tol of its law, at its own check points (max_error)
+# and at points it hasn't seen.
+def test_max_error_within_tol():
+    rng = np.random.default_rng(5)
+    s = rng.uniform(*stretch_range, 200000)
+    r = rng.uniform(*rate_range, 200000)
+    for method in ['bilinear', 'bicubic']:
+        for k, c, tol in [(100., 10., 0.05), (300., 5., 0.01)]:
+            func = force_table.LawFunction('logistic', k, c)
+            table = force_table.ForceTable(func, stretch_range, rate_range, tol=tol,
+                                           method=method)
+            assert table.max_error <= tol
+            assert np.max(np.abs(table(s, r) - func(s, r))) <= tol
+
+# A table that can't get under tol within max_points raises, unless it's
+# not strict.
+def test_strict():
+    func = force_table.LawFunction('logistic', 1500., 20.)
+    with pytest.raises(Exception):
+        force_table.ForceTable(func, stretch_range, rate_range, tol=1E-3, max_points=65)
+    table = force_table.ForceTable(func, stretch_range, rate_range, tol=1E-3, max_points=65,
+                                   strict=False)
+    assert table.max_error > 1E-3
+
+# Outside the domain, a table gives the law itself, and counts the points.
+def test_outside_falls_back_to_the_law():
+    func = force_table.LawFunction('logistic', 100., 10.)
+    table = force_table.ForceTable(func, stretch_range, rate_range, tol=0.05)
+    s = np.array([0.1, 0.5, -0.2, 0.1])
+    r = np.array([0., 0., 1., 20.])
+    F = table(s, r)
+    assert np.array_equal(F[1:], func(s[1:], r[1:]))
+    assert table.num_outside == 3
+    assert table.num_evaluated == 4
+
+# The box rig's tables, stacked, give the same bits as each table on its
+# own cables, inside and outside the tables, with the kernels and with
+# numpy.
+@pytest.mark.parametrize('method', ['bilinear', 'bicubic'])
+def test_stack_equals_tables(method, monkeypatch):
+    rig = rigs.box_rig()
+    rig_t = force_table.tabulate_rig(rig, 'logistic', stretch_range, rate_range, tol=1.,
+                                     method=method, max_points=257, strict=False)
+    assert rig_t._stack is not None
+    assert len(rig_t._groups) > 1
+    rng = np.random.default_rng(2)
+    stretch = rng.uniform(-0.1, 0.35, (500, rig.num_cables))
+    rate = rng.uniform(-9., 9., (500, rig.num_cables))
+    for have_numba in sorted({False, kernels.HAVE_NUMBA}):
+        monkeypatch.setattr(kernels, 'HAVE_NUMBA', have_numba)
+        before = [(table.num_evaluated, table.num_outside) for table, _ in rig_t._groups]
+        expected = np.zeros(stretch.shape)
+        for table, cables in rig_t._groups:
+            expected[:, cables] = table(stretch[:, cables], rate[:, cables])
+        middle = [(table.num_evaluated, table.num_outside) for table, _ in rig_t._groups]
+        F = rig_t.get_scalar_forces(stretch, rate, np.zeros(stretch.shape))
+        assert np.array_equal(F, expected)
+        # (and it counts the same points, in the same tables.)
+        for (table, _), b, m in zip(rig_t._groups, before, middle):
+            assert table.num_evaluated - m[0] == m[0] - b[0]
+            assert table.num_outside - m[1] == m[1] - b[1]
+        assert sum(m[1] - b[1] for b, m in zip(before, middle)) > 0
+
+# A box run on the tabulated logistic law stays close to the exact one.
+def test_tabulated_rig_follows_the_law():
+    rig = rigs.box_rig()
+    pos0, vel0 = rigs.box_initial_conditions['A']
+    rig_t = force_table.tabulate_rig(rig, 'logistic', stretch_range, rate_range, tol=0.1)
+    rig_l = force_laws.LawRig(rig, 'logistic')
+    exact = simulation.Simulation(rig_l, pos0, vel0, 0.01, 500).run()
+    tabulated = simulation.Simulation(rig_t, pos0, vel0, 0.01, 500).run()
+    assert np.max(np.abs(tabulated['state'] - exact['state'])) < 1E-4
+    assert np.max(np.abs(tabulated['force'] - exact['force'])) < 0.1
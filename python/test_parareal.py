@@ -0,0 +1,55 @@
+"""
+Tests of parareal (simulators/parareal.py): once converged, the trajectory
+is the serial Simulation's to within tol, with each kind of coarse
+propagator and on a pool, and after num_slices iterations it is the
+serial one up to roundoff.
+Run with python -m pytest from this directory.
+"""
+
+# need to do linear alg
+import numpy as np
+import pytest
+from simulators import rigs
+from simulators import simulation
+from simulators import parareal
+
+dt = 0.001
+T = 4000
+record_every = 10
+
+# Converged parareal is the serial run within tol, state and V.
+@pytest.mark.parametrize('coarse, num_workers', [('euler', 1), ('linearized', 1),
+                                                 ('rk4', 1), ('euler', 2)])
+def test_equals_serial_within_tol(coarse, num_workers):
+    rig = rigs.box_rig()
+    pos0, vel0 = rigs.box_initial_conditions['A']
+    serial = simulation.Simulation(rig, pos0, vel0, dt, T).run()
+    tol = 1E-9
+    par = parareal.Parareal(rig, pos0, vel0, dt, T, num_slices=8, coarse=coarse,
+                            equilibrium=rigs.box_bar_r, tol=tol, record_every=record_every)
+    results = par.run(num_workers=num_workers)
+    assert par.converged
+    assert par.num_iterations < par.num_slices
+    assert results['state'].shape == serial['state'][::record_every].shape
+    assert np.max(np.abs(results['state'] - serial['state'][::record_every])) <= tol
+    assert np.max(np.abs(par.final_state - serial['state'][-1])) <= tol
+    assert np.max(np.abs(results['V'] - serial['V'][::record_every])) <= 1E-9
+
+# With tol 0 it takes every iteration, and then every slice started from
+# the fine state (up to the roundoff of the correction.)
+def test_all_iterations_are_serial():
+    rig = rigs.box_rig()
+    pos0, vel0 = rigs.box_initial_conditions['C']
+    serial = simulation.Simulation(rig, pos0, vel0, dt, 2000).run()
+    par = parareal.Parareal(rig, pos0, vel0, dt, 2000, num_slices=6, tol=0.,
+                            record_every=record_every)
+    results = par.run(num_workers=1)
+    assert par.converged
+    assert par.num_iterations == 6
+    assert np.max(np.abs(results['state'] - serial['state'][::record_every])) <= 1E-14
+
+# record_every has to divide num_timesteps.
+def test_record_every_divides():
+    pos0, vel0 = rigs.box_initial_conditions['A']
+    with pytest.raises(Exception):
+        parareal.Parareal(rigs.box_rig(), pos0, vel0, dt, 1001, record_every=10)
@@ -0,0 +1,65 @@
+"""
+Tests of the shared-memory ensemble runner (simulators/shared_ensemble.py):
+the chunks it runs, in this process or in workers, add up to one
+Simulation of the whole ensemble, with or without early stopping.
+Run with python -m pytest from this directory.
+"""
+
+# need to do linear alg
+import numpy as np
+from simulators import rigs
+from simulators import simulation
+from simulators import shared_ensemble
+
+dt = 0.01
+T = 200
+
+# Box members spread around test A's initial condition.
+def get_box_ensemble(N=10):
+    pos0, vel0 = rigs.box_initial_conditions['A']
+    offsets = np.linspace(-0.05, 0.05, N)[:, np.newaxis] * np.array([1., -1., 0.5])
+    return rigs.box_rig(), pos0 + offsets, vel0
+
+# Without stopping, the chunks are bit-identical to one Simulation.
+def test_chunks_equal_one_simulation():
+    rig, pos0, vel0 = get_box_ensemble()
+    full = simulation.Simulation(rig, pos0, vel0, dt, T).run()
+    for num_workers in [1, 2]:
+        with shared_ensemble.run_ensemble(rig, pos0, vel0, dt, T, num_workers=num_workers,
+                                          chunk_size=3) as ens:
+            for key in full:
+                assert np.array_equal(ens.results[key], full[key])
+            assert np.all(ens.stop_step == -1)
+
+# With stopping, a member that stopped holds its last state, V and force
+# to the end of the histories, even when its whole chunk stopped before
+# num_timesteps (those rows used to stay zero.)
+def test_stopped_members_hold_to_the_end():
+    rig, pos0, vel0 = get_box_ensemble()
+    vel0 = np.broadcast_to(vel0, pos0.shape).copy()
+    # (the first chunk starts at the equilibrium, so it stops right away;
+    # the rest never get within tol in T steps.)
+    pos0[0:3] = rigs.box_bar_r + 1E-5 * np.arange(3)[:, np.newaxis]
+    vel0[0:3] = 0.
+    tol = 5E-4
+    full = simulation.Simulation(rig, pos0, vel0, dt, T).run()
+    err = np.sqrt(np.sum((full['state'][:, 1:, 0:3] - rigs.box_bar_r)**2, axis=2)
+                  + np.sum(full['state'][:, 1:, 3:6]**2, axis=2))
+    assert np.all(np.min(err[3:], axis=1) > tol)
+    stopping = {'bar_r':rigs.box_bar_r.tolist(), 'tol':tol}
+    for num_workers in [1, 2]:
+        with shared_ensemble.run_ensemble(rig, pos0, vel0, dt, T, num_workers=num_workers,
+                                          chunk_size=3, stopping=stopping) as ens:
+            results = ens.copy()
+            stop_step = ens.stop_step.copy()
+        assert np.all((stop_step[0:3] > 0) & (stop_step[0:3] < T))
+        assert np.all(stop_step[3:] == -1)
+        for i in range(len(pos0)):
+            s = T if stop_step[i] < 0 else stop_step[i]
+            assert np.array_equal(results['state'][i, 0:s+1], full['state'][i, 0:s+1])
+            assert np.array_equal(results['V'][i, 0:s+1], full['V'][i, 0:s+1])
+            assert np.all(results['state'][i, s:] == results['state'][i, s])
+            assert np.all(results['V'][i, s:] == results['V'][i, s])
+            assert np.all(results['force'][i, s-1:] == results['force'][i, s-1])
+            assert np.all(results['control'][i, s-1:] == results['control'][i, s-1])
+        assert not np.any(results['V'][:, -1] == 0.)
@@ -0,0 +1,53 @@
+"""
+Tests of the vectorized Simulation (simulators/simulation.py): both
+backends follow the original object-based loop (cable/controller/point
+mass objects, as in simulation_particle_box_3D.py) to roundoff, and an
+ensemble is the same as simulating its members one at a time.
+Run with python -m pytest from this directory.
+"""
+
+# need to do linear alg
+import numpy as np
+import pytest
+from simulators import rigs
+from simulators import simulation
+
+dt = 0.01
+T = 300
+
+# Both backends, on the box's tests A-D and the tetrahedron, are the
+# object loop up to roundoff (the sums are ordered differently.)
+@pytest.mark.parametrize('backend', ['numpy', 'jit'])
+def test_backends_equal_object_loop(backend):
+    cases = [(rigs.box_rig(), pos0, vel0)
+             for pos0, vel0 in rigs.box_initial_conditions.values()]
+    cases += [(rigs.tetrahedron_rig(), pos0, vel0)
+              for pos0, vel0 in rigs.tetrahedron_initial_conditions.values()]
+    for rig, pos0, vel0 in cases:
+        ref = simulation.run_reference(rig, pos0, vel0, dt, T)
+        results = simulation.Simulation(rig, pos0, vel0, dt, T, backend=backend).run()
+        for key in ref:
+            assert results[key].shape == ref[key].shape
+            scale = max(np.max(np.abs(ref[key])), 1.)
+            assert np.max(np.abs(results[key] - ref[key])) <= 1E-13 * scale
+
+# The numpy and jit backends give the same bits, and an ensemble gives the
+# same bits as each of its members on its own, run in one go or in pieces.
+def test_ensemble_equals_members():
+    rig = rigs.box_rig()
+    names = sorted(rigs.box_initial_conditions)
+    pos0 = np.array([rigs.box_initial_conditions[name][0] for name in names])
+    vel0 = np.array([rigs.box_initial_conditions[name][1] for name in names])
+    ensemble = simulation.Simulation(rig, pos0, vel0, dt, T).run()
+    jit = simulation.Simulation(rig, pos0, vel0, dt, T, backend='jit').run()
+    sim = simulation.Simulation(rig, pos0, vel0, dt, T)
+    sim.run(100)
+    pieces = sim.run()
+    for key in ensemble:
+        assert ensemble[key].shape[0] == len(names)
+        assert np.array_equal(jit[key], ensemble[key])
+        assert np.array_equal(pieces[key], ensemble[key])
+    for i in range(len(names)):
+        member = simulation.Simulation(rig, pos0[i], vel0[i], dt, T).run()
+        for key in member:
+            assert np.array_equal(member[key], ensemble[key][i])
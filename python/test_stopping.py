@@ -0,0 +1,82 @@
+"""
+Tests of early stopping in Simulation (simulators/stopping.py): members
+stop where they should, the ones that stop hold their last values, and
+a checkpointed run ends once every member has stopped.
+Run with python -m pytest from this directory.
+"""
+
+# need to do linear alg
+import numpy as np
+from simulators import rigs
+from simulators import simulation
+from simulators import checkpoint
+
+dt = 0.01
+
+# A small box ensemble around test A's initial condition.
+def get_box_ensemble(N=6):
+    pos0, vel0 = rigs.box_initial_conditions['A']
+    offsets = np.linspace(-0.05, 0.05, N)[:, np.newaxis] * np.array([1., -1., 0.5])
+    return rigs.box_rig(), pos0 + offsets, vel0
+
+# Up to where each member stopped, the histories are the ones of a run
+# without stopping, and after it they hold the last values.
+def test_stopped_members_hold_their_last_values():
+    for backend in ['numpy', 'jit']:
+        rig, pos0, vel0 = get_box_ensemble()
+        T = 300
+        full = simulation.Simulation(rig, pos0, vel0, dt, T, backend=backend).run()
+        # (a tolerance some members meet and some don't.)
+        err = np.sqrt(np.sum((full['state'][:, :, 0:3] - rigs.box_bar_r)**2, axis=2)
+                      + np.sum(full['state'][:, :, 3:6]**2, axis=2))
+        closest = np.sort(np.min(err[:, 1:], axis=1))
+        tol = 0.5 * (closest[2] + closest[3])
+        sim = simulation.Simulation(rig, pos0, vel0, dt, T, backend=backend,
+                                    stopping={'bar_r':rigs.box_bar_r, 'tol':tol})
+        results = sim.run()
+        stopped = np.nonzero(sim.stop_step >= 0)[0]
+        assert 0 < len(stopped) < sim.num_members
+        assert results['state'].shape[1] == sim.t + 1
+        for i in range(sim.num_members):
+            s = sim._get_member_t(i)
+            assert np.array_equal(results['state'][i, 0:s+1], full['state'][i, 0:s+1])
+            assert np.array_equal(results['V'][i, 0:s+1], full['V'][i, 0:s+1])
+            assert np.array_equal(results['force'][i, 0:s], full['force'][i, 0:s])
+            assert np.all(results['state'][i, s:] == results['state'][i, s])
+            assert np.all(results['V'][i, s:] == results['V'][i, s])
+            assert np.all(results['force'][i, s-1:] == results['force'][i, s-1])
+        assert set(sim.get_stop_reasons()) <= {'converged', 'running'}
+
+# Leaving the workspace stops a member on the step it leaves.
+def test_left_workspace():
+    rig, pos0, vel0 = get_box_ensemble()
+    lower = np.min(pos0, axis=0) - 1E-6
+    upper = np.max(pos0, axis=0) + 1E-6
+    sim = simulation.Simulation(rig, pos0, vel0, dt, 100,
+                                stopping={'workspace':[lower.tolist(), upper.tolist()]})
+    sim.run()
+    assert len(sim.active) == 0
+    assert set(sim.get_stop_reasons()) == {'left_workspace'}
+    for i in range(sim.num_members):
+        s = sim.stop_step[i]
+        inside = np.all((sim.state_history[i, 0:s, 0:3] >= lower)
+                        & (sim.state_history[i, 0:s, 0:3] <= upper), axis=1)
+        assert np.all(inside)
+        assert not np.all((sim.state_history[i, s, 0:3] >= lower)
+                          & (sim.state_history[i, s, 0:3] <= upper))
+
+# Once every member has stopped, run_with_checkpoints returns (rather
+# than rewriting the checkpoint forever), and the checkpoint has them all
+# stopped.
+def test_checkpoints_end_when_every_member_stopped(tmp_path):
+    rig, pos0, vel0 = get_box_ensemble()
+    sim = simulation.Simulation(rig, pos0, vel0, dt, 1000,
+                                stopping={'bar_r':rigs.box_bar_r, 'tol':1E3})
+    filename = str(tmp_path / 'all_stopped.ckpt.npz')
+    results = checkpoint.run_with_checkpoints(sim, filename, every=10)
+    assert len(sim.active) == 0
+    assert sim.t < sim.num_timesteps
+    assert results['state'].shape[1] == sim.t + 1
+    restored = checkpoint.load_checkpoint(filename)
+    assert len(restored.active) == 0
+    assert np.array_equal(restored.stop_step, sim.stop_step)
@@ -0,0 +1,2 @@
+# include everything from this directly.
+__all__ = ['run_file', 'cache', 'slack_log', 'catalogue', 'ensemble_stats']
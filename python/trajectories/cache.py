@@ -0,0 +1,159 @@
+"""
+Content-addressed cache of simulation results.
+
+A run is identified by a hash of its full configuration (rig constants,
+initial conditions, dt, num_timesteps, delays...) together with a hash of
+the simulation code itself, so changing a cable model or the integrator
+invalidates old entries automatically. Results are stored as run files
+(run_file.py) named by that hash. The cache is bounded in size: when it
+grows past max_bytes, the least recently used runs are deleted.
+
+    cache = ResultCache('./results/cache')
+    run = cache.simulate(rigs.box_rig(), pos0, vel0, dt, num_timesteps)
+    run['V'] ...  (memory-mapped; simulated only the first time)
+"""
+
+# need to do linear alg
+import numpy as np
+import hashlib
+import json
+import os
+import tempfile
+from trajectories import run_file
+from simulators import simulation
+
+# The source that determines the results: the model packages, and the
+# modules of simulators that a Simulation runs through (not the whole
+# package, so editing e.g. the benchmarks or parareal keeps the cache.)
+_CODE_PACKAGES = ['body_models', 'cable_models', 'controllers']
+_CODE_MODULES = {'simulators': ['simulation.py', 'rig.py', 'geometry.py', 'kernels.py',
+                                'stopping.py', 'workspace.py', 'force_laws.py',
+                                'force_table.py'],
+                 'trajectories': ['slack_log.py']}
+
+# Hash of the simulation source code. Computed once per process.
+_code_version = None
+
+def get_code_version():
+    global _code_version
+    if _code_version is None:
+        h = hashlib.sha256()
+        base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        files = [(package, name) for package in _CODE_PACKAGES
+                 for name in sorted(os.listdir(os.path.join(base, package)))
+                 if name.endswith('.py')]
+        files += [(package, name) for package in sorted(_CODE_MODULES)
+                  for name in sorted(_CODE_MODULES[package])]
+        for package, name in files:
+            h.update(name.encode('utf-8'))
+            with open(os.path.join(base, package, name), 'rb') as f:
+                h.update(f.read())
+        _code_version = h.hexdigest()[0:16]
+    return _code_version
+
+# The full configuration of a run, as plain JSON types.
+def make_config(rig, pos0, vel0, dt, num_timesteps, **sim_kwargs):
+    cable_anchors, cable_params, controller_consts = rig.to_dicts()
+    config = {'cable_tags':rig.tags, 'cable_anchors':cable_anchors,
+              'cable_params':cable_params, 'controller_consts':controller_consts,
+              'm':rig.m, 'g':rig.g, 'pos0':np.asarray(pos0, dtype=float),
+              'vel0':np.asarray(vel0, dtype=float), 'dt':dt,
+              'num_timesteps':num_timesteps}
+    # (only for other force laws, so the keys of piecewise runs don't change.)
+    if rig.get_force_law() is not None:
+        config['force_law'] = rig.get_force_law()
+    # the backend doesn't change the results, everything else might.
+    sim_kwargs = dict(sim_kwargs)
+    sim_kwargs.pop('backend', None)
+    if hasattr(sim_kwargs.get('stopping', None), 'to_dict'):
+        sim_kwargs['stopping'] = sim_kwargs['stopping'].to_dict()
+    config.update(sim_kwargs)
+    return run_file.to_json_types(config)
+
+# Hash of a configuration plus the code version. Floats are written by
+# json with full (round-trip) precision, and keys are sorted, so equal
+# configurations always give the same key.
+def get_key(config):
+    text = json.dumps(config, sort_keys=True) + get_code_version()
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ResultCache:
+    # A directory of run files named <key>.npz, at most max_bytes in total.
+
+    def __init__(self, directory, max_bytes=2 * 1024**3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def get_filename(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    # Returns the RunFile for this key, or None if it isn't cached.
+    # A hit counts as a use, for the eviction order.
+    def load(self, key):
+        filename = self.get_filename(key)
+        if not os.path.exists(filename):
+            return None
+        # mark as recently used
+        os.utime(filename, None)
+        return run_file.load_run(filename)
+
+    # Store arrays + metadata under key and return the RunFile.
+    # Written to a temporary file first, so a crash never leaves a
+    # half-written entry behind.
+    def store(self, key, arrays, metadata):
+        fd, tmp_filename = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        os.close(fd)
+        try:
+            run_file.save_run(tmp_filename, arrays, metadata)
+            os.replace(tmp_filename, self.get_filename(key))
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+        self.evict(keep=key)
+        return run_file.load_run(self.get_filename(key))
+
+    # Delete least recently used entries until the cache fits in max_bytes.
+    # 'keep' is never deleted (the entry that was just written.)
+    def evict(self, keep=None):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            filename = os.path.join(self.directory, name)
+            info = os.stat(filename)
+            entries.append((info.st_mtime, info.st_size, name[:-4], filename))
+            total += info.st_size
+        # oldest first
+        entries.sort()
+        for mtime, size, key, filename in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            os.remove(filename)
+            total -= size
+
+    # Total size of the cache on disk, in bytes.
+    def get_size(self):
+        return sum(os.path.getsize(os.path.join(self.directory, name))
+                   for name in os.listdir(self.directory) if name.endswith('.npz'))
+
+    # Simulate, unless this exact configuration (and code) is cached.
+    # Arguments are the same as simulation.Simulation. Returns a RunFile.
+    def simulate(self, rig, pos0, vel0, dt, num_timesteps, **sim_kwargs):
+        config = make_config(rig, pos0, vel0, dt, num_timesteps, **sim_kwargs)
+        key = get_key(config)
+        run = self.load(key)
+        if run is not None:
+            return run
+        sim = simulation.Simulation(rig, pos0, vel0, dt, num_timesteps, **sim_kwargs)
+        sim.run()
+        metadata = dict(config)
+        metadata['code_version'] = get_code_version()
+        metadata['key'] = key
+        metadata['slack_bound'] = sim.slack_bound
+        arrays = dict(sim.get_results())
+        arrays.update(sim.get_slack_arrays())
+        return self.store(key, arrays, metadata)
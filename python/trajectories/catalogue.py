@@ -0,0 +1,152 @@
+"""
+A catalogue of the results in a directory: every run file
+(run_file.py, .npz) and every bare .npy array, indexed by name with its
+metadata, without loading any array data. Arrays are memory-mapped when
+they're asked for, and get_slice only reads the samples that are plotted:
+    catalogue = Catalogue('./results', dt=0.01, exclude=['cache'])
+    catalogue.names                          # e.g. 'runs/box/D', 'lyap_history_3D_D'
+    t, V = catalogue.get_slice('runs/box/D', 'V', t0=0., t1=1.)
+    t, x = catalogue.get_slice('1D_p5pt2_v0', columns=0, max_points=2000)
+    catalogue.find(scenario='box')           # names with that metadata
+Names are paths relative to the directory, without the extension, so
+scripts don't build file names or fix up paths. Run files know their own
+dt; bare .npy arrays (the older results) use the catalogue's dt.
+"""
+
+# need to do linear alg
+import numpy as np
+import os
+from trajectories import run_file
+
+class CatalogueEntry:
+    # One file in the catalogue. For run files, 'run' is the open RunFile
+    # (metadata read, arrays not); for .npy files the one array is 'data'.
+
+    def __init__(self, name, filename, dt):
+        self.name = name
+        self.filename = filename
+        self.run = None
+        if filename.endswith('.npz'):
+            self.run = run_file.load_run(filename)
+            self.metadata = self.run.metadata
+            self.array_names = self.run.keys()
+        else:
+            self.metadata = {'dt':dt}
+            self.array_names = ['data']
+        self._npy = None
+
+    @property
+    def dt(self):
+        return self.metadata.get('dt', None)
+
+    # An array, memory-mapped.
+    def __getitem__(self, array):
+        if self.run is not None:
+            return self.run[array]
+        if array != 'data':
+            raise KeyError(array)
+        if self._npy is None:
+            self._npy = np.load(self.filename, mmap_mode='r')
+        return self._npy
+
+    # A helper: the array to use when none was named. 'data' for .npy
+    # files, otherwise the state.
+    def get_default_array(self):
+        return 'data' if self.run is None else 'state'
+
+class Catalogue:
+    # directory is scanned recursively. exclude is a list of
+    # subdirectory names to skip (e.g. the result cache.) dt is for files
+    # that don't record their own.
+
+    def __init__(self, directory, dt=None, exclude=None):
+        self.directory = directory
+        self.dt = dt
+        self.exclude = set(exclude) if exclude is not None else set()
+        self.entries = {}
+        self.refresh()
+
+    # (Re)scan the directory. Only metadata is read.
+    def refresh(self):
+        self.entries = {}
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = sorted(d for d in dirs if d not in self.exclude
+                             and not d.startswith('.'))
+            for name in sorted(files):
+                base, ext = os.path.splitext(name)
+                if ext not in ('.npz', '.npy'):
+                    continue
+                filename = os.path.join(root, name)
+                key = os.path.relpath(os.path.join(root, base), self.directory)
+                key = key.replace(os.sep, '/')
+                try:
+                    self.entries[key] = CatalogueEntry(key, filename, self.dt)
+                except Exception:
+                    # not a run file (e.g. an old np.savez), skip it.
+                    continue
+
+    @property
+    def names(self):
+        return sorted(self.entries.keys())
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __getitem__(self, name):
+        if name not in self.entries:
+            raise KeyError(name + ' is not in the catalogue of ' + self.directory)
+        return self.entries[name]
+
+    # The names whose metadata has all the given values, e.g.
+    # find(scenario='box', initial_condition='D').
+    def find(self, **criteria):
+        return [name for name in self.names
+                if all(self.entries[name].metadata.get(key, None) == value
+                       for key, value in criteria.items())]
+
+    # The times of every sample of an array, t = t_start + i dt.
+    def get_times(self, name, array=None, t_start=0.):
+        entry = self[name]
+        if array is None:
+            array = entry.get_default_array()
+        return t_start + entry.dt * np.arange(entry[array].shape[0])
+
+    # (times, values) of an array, for samples with t0 <= t < t1 (default:
+    # all of them), every stride-th one or decimated to at most max_points.
+    # columns picks columns of a 2D array (an int, slice or list.) Only the
+    # selected samples are read from disk.
+    def get_slice(self, name, array=None, t0=None, t1=None, stride=None,
+                  max_points=None, columns=None, t_start=0.):
+        entry = self[name]
+        if array is None:
+            array = entry.get_default_array()
+        data = entry[array]
+        dt = entry.dt
+        if dt is None:
+            raise Exception(name + ' has no dt, give the catalogue one.')
+        first, last = get_index_range(data.shape[0], dt, t0, t1, t_start)
+        if stride is None:
+            stride = 1
+            if max_points is not None and last - first > max_points:
+                stride = int(np.ceil((last - first) / max_points))
+        index = slice(first, last, stride)
+        if columns is None:
+            values = np.array(data[index])
+        else:
+            values = np.array(data[index, columns])
+        times = t_start + dt * np.arange(first, last, stride)
+        return times, values
+
+# The index range [first, last) of the samples of an array of length
+# 'length' sampled every dt from t_start, with t0 <= t < t1.
+def get_index_range(length, dt, t0=None, t1=None, t_start=0.):
+    first = 0
+    last = length
+    # (a small tolerance, so t0 = k dt lands on sample k.)
+    if t0 is not None:
+        first = int(np.ceil((t0 - t_start) / dt - 1E-9))
+    if t1 is not None:
+        last = int(np.ceil((t1 - t_start) / dt - 1E-9))
+    first = min(max(first, 0), length)
+    last = min(max(last, first), length)
+    return first, last
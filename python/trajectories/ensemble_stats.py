@@ -0,0 +1,462 @@
+"""
+Streaming statistics of an ensemble of runs, per timestep.
+
+For sweeps over thousands of initial conditions we want distributions
+over time (the mean and percentiles of the state error norm, like the box
+script's norm_err_3D_*.npy, and of V), how often V increases, and the
+fraction of runs in which each cable is slack, not every trajectory.
+EnsembleStats takes the histories of a chunk of members at a time (e.g.
+Simulation.get_results() of a chunk), folds them into
+    RunningMoments   count, mean, variance, min, max (Welford / Chan)
+    QuantileSketch   fixed-size log-spaced buckets, for quantiles with a
+                     bounded relative error
+    Histogram        counts in fixed bins, if bin edges are given
+    slack counts, Lyapunov increase counts, stop reason counts,
+keeps an optional reservoir sample of raw trajectories (TrajectorySample),
+and then the chunk can be dropped. Every part is a fixed size (depends on
+T and the settings, not on the number of members). The quantile sketches
+are the big part, ~700 counts per point, so they only cover every
+sketch_every-th timestep: by default at most MAX_SKETCH_POINTS of them,
+~2.8 MB per quantity whatever T (each worker of a sweep sends its stats
+back to the parent, so this matters there too.) Two EnsembleStats
+can be merged, so workers can each reduce their share of a sweep and the
+parent only merges (see simulators/sweep.py.)
+
+Members that stopped early (simulators/stopping.py) count with their last
+values held, as Simulation.get_results() does.
+"""
+
+# need to do linear alg
+import numpy as np
+from trajectories import run_file
+
+# The most timesteps EnsembleStats sketches quantiles at, by default.
+MAX_SKETCH_POINTS = 1001
+
+class RunningMoments:
+    # Count, mean, sum of squared deviations (M2), min and max of values of
+    # the given shape (e.g. (T+1,), one per timestep.) Chunks are combined
+    # with Chan et al.'s pairwise update, which is Welford's for a chunk of one.
+
+    def __init__(self, shape):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.M2 = np.zeros(shape)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+
+    # values is (M,) + shape, for M new members.
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        M = values.shape[0]
+        if M == 0:
+            return
+        mean = np.mean(values, axis=0)
+        M2 = np.sum((values - mean)**2, axis=0)
+        self._combine(M, mean, M2)
+        np.minimum(self.min, np.min(values, axis=0), out=self.min)
+        np.maximum(self.max, np.max(values, axis=0), out=self.max)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        self._combine(other.count, other.mean, other.M2)
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+
+    # A helper: fold in count, mean, M2 of another set.
+    def _combine(self, count, mean, M2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * (count / total)
+        self.M2 += M2 + delta**2 * (self.count * count / total)
+        self.count = total
+
+    def get_var(self, ddof=1):
+        if self.count <= ddof:
+            return np.full(self.mean.shape, np.nan)
+        return self.M2 / (self.count - ddof)
+
+    def get_std(self, ddof=1):
+        return np.sqrt(self.get_var(ddof))
+
+class QuantileSketch:
+    # Quantiles of num_points values per member (e.g. one per timestep),
+    # in a fixed number of log-spaced buckets per point: bucket k holds
+    # magnitudes in (min_value gamma^(k-1), min_value gamma^k], with
+    # gamma = (1 + a) / (1 - a), so any quantile in [min_value, max_value]
+    # comes back within a relative error a = relative_accuracy. Magnitudes
+    # under min_value count as zero, over max_value go in the top bucket.
+    # Negative values get their own buckets, allocated the first time one
+    # is seen. Memory: num_points x log(max_value/min_value) / log(gamma)
+    # 4-byte counts, e.g. 705 per point (2.8 kB) for the defaults.
+
+    def __init__(self, num_points, relative_accuracy=0.02, min_value=1E-6, max_value=1E6):
+        self.num_points = num_points
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1. + relative_accuracy) / (1. - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.num_buckets = int(np.ceil(np.log(max_value / min_value) / self._log_gamma))
+        self.count = 0
+        self.positive = np.zeros((num_points, self.num_buckets), dtype=np.uint32)
+        self.negative = None
+        self.zero = np.zeros(num_points, dtype=np.uint32)
+
+    # values is (M, num_points), for M new members.
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        M = values.shape[0]
+        if M == 0:
+            return
+        mag = np.abs(values)
+        small = mag < self.min_value
+        self.zero += np.sum(small, axis=0).astype(np.uint32)
+        negative = (values < 0) & ~small
+        if np.any(negative):
+            if self.negative is None:
+                self.negative = np.zeros_like(self.positive)
+            self._add_to(self.negative, mag, negative)
+        self._add_to(self.positive, mag, ~small & ~negative)
+        self.count += M
+
+    # A helper: count magnitudes mag[which] into a (num_points, num_buckets)
+    # store, with one bincount over (point, bucket) pairs.
+    def _add_to(self, store, mag, which):
+        points = np.broadcast_to(np.arange(self.num_points), mag.shape)[which]
+        buckets = self.get_buckets(mag[which])
+        flat = np.bincount(points * self.num_buckets + buckets,
+                           minlength=store.size)
+        store += flat.reshape(store.shape).astype(np.uint32)
+
+    # The bucket of each magnitude (all >= min_value.)
+    def get_buckets(self, mag):
+        k = np.ceil(np.log(mag / self.min_value) / self._log_gamma).astype(np.int64) - 1
+        return np.clip(k, 0, self.num_buckets - 1)
+
+    # A value in the middle (relatively) of each bucket.
+    def get_bucket_values(self):
+        k = np.arange(self.num_buckets) + 1
+        return self.min_value * 2. * self.gamma**k / (self.gamma + 1.)
+
+    def merge(self, other):
+        if (other.num_points, other.num_buckets, other.min_value) != \
+           (self.num_points, self.num_buckets, self.min_value):
+            raise Exception('Can only merge quantile sketches with the same settings.')
+        self.count += other.count
+        self.positive += other.positive
+        self.zero += other.zero
+        if other.negative is not None:
+            if self.negative is None:
+                self.negative = np.zeros_like(self.positive)
+            self.negative += other.negative
+
+    # The q-quantiles (q in [0, 1], a float or list), as an array
+    # (len(q), num_points), or (num_points,) for one q.
+    def get_quantiles(self, q):
+        scalar = np.ndim(q) == 0
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        if self.count == 0:
+            out = np.full((len(q), self.num_points), np.nan)
+            return out[0] if scalar else out
+        values = self.get_bucket_values()
+        # everything in increasing order: negatives (biggest magnitude
+        # first), zero, positives.
+        parts = [self.zero[:, None], self.positive]
+        all_values = [np.zeros(1), values]
+        if self.negative is not None:
+            parts.insert(0, self.negative[:, ::-1])
+            all_values.insert(0, -values[::-1])
+        cumulative = np.cumsum(np.concatenate(parts, axis=1), axis=1)
+        all_values = np.concatenate(all_values)
+        out = np.zeros((len(q), self.num_points))
+        for j in range(len(q)):
+            rank = q[j] * (self.count - 1)
+            index = np.sum(cumulative <= rank, axis=1)
+            out[j] = all_values[np.minimum(index, len(all_values) - 1)]
+        return out[0] if scalar else out
+
+class Histogram:
+    # Counts of values per point (e.g. timestep) in the bins given by
+    # edges, plus an underflow (first) and overflow (last) bin:
+    # counts is (num_points, len(edges) + 1).
+
+    def __init__(self, num_points, edges):
+        self.num_points = num_points
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros((num_points, len(self.edges) + 1), dtype=np.int64)
+
+    # values is (M, num_points).
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        bins = np.searchsorted(self.edges, values, side='right')
+        points = np.broadcast_to(np.arange(self.num_points), values.shape)
+        B = self.counts.shape[1]
+        self.counts += np.bincount((points * B + bins).ravel(),
+                                   minlength=self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise Exception('Can only merge histograms with the same edges.')
+        self.counts += other.counts
+
+class TrajectorySample:
+    # A uniform random sample of at most 'size' members' raw histories
+    # (reservoir sampling), whatever the number of members seen.
+    # 'arrays' is a dict of (k, ...) arrays and 'members' the ids of the
+    # k <= size members in it.
+
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.seen = 0
+        self.members = np.zeros(0, dtype=np.int64)
+        self.arrays = {}
+
+    # results is a dict of (M, ...) arrays for M new members, with ids
+    # 'members' (default: the order they were seen in.)
+    def add(self, results, members=None):
+        M = len(next(iter(results.values())))
+        if members is None:
+            members = self.seen + np.arange(M)
+        if self.size == 0:
+            self.seen += M
+            return
+        if len(self.arrays) == 0:
+            self.arrays = {key: np.zeros((self.size,) + np.shape(val)[1:])
+                           for key, val in results.items()}
+            self.members = -np.ones(self.size, dtype=np.int64)
+        for j in range(M):
+            slot = self.seen if self.seen < self.size else self.rng.integers(self.seen + 1)
+            self.seen += 1
+            if slot < self.size:
+                for key in self.arrays:
+                    self.arrays[key][slot] = results[key][j]
+                self.members[slot] = members[j]
+
+    # Number of members in the sample.
+    def __len__(self):
+        return min(self.seen, self.size)
+
+    # The sample's arrays, (k, ...), in member order.
+    def get_arrays(self):
+        k = len(self)
+        order = np.argsort(self.members[0:k])
+        return self.members[0:k][order], {key: val[0:k][order] for key, val in self.arrays.items()}
+
+    # Combine with another sample of other members: the number taken from
+    # each side is hypergeometric, so it's still a uniform sample of all of them.
+    def merge(self, other):
+        if other.seen == 0:
+            return
+        if self.seen == 0:
+            self.seen = other.seen
+            self.members = other.members.copy()
+            self.arrays = {key: val.copy() for key, val in other.arrays.items()}
+            return
+        mine = len(self)
+        if self.size == 0 or mine + len(other) <= self.size:
+            k = len(other)
+            for key in self.arrays:
+                self.arrays[key][mine:mine+k] = other.arrays[key][0:k]
+            self.members[mine:mine+k] = other.members[0:k]
+            self.seen += other.seen
+            return
+        from_self = self.rng.hypergeometric(self.seen, other.seen, self.size)
+        keep = self.rng.choice(mine, from_self, replace=False)
+        take = self.rng.choice(len(other), self.size - from_self, replace=False)
+        self.members = np.concatenate((self.members[keep], other.members[take]))
+        for key in self.arrays:
+            self.arrays[key] = np.concatenate((self.arrays[key][keep], other.arrays[key][take]))
+        self.seen += other.seen
+
+class EnsembleStats:
+    # Per timestep statistics of an ensemble of runs of num_timesteps
+    # steps of dt, with cables 'tags'. Tracked quantities (each with
+    # RunningMoments, a QuantileSketch and, if histogram_edges has edges
+    # for it, a Histogram) are 'V' and, given the equilibrium position,
+    # 'norm_err' (|state - (equilibrium, 0)|, as in the box script.) The
+    # sketches are at every sketch_every-th timestep and the last one
+    # (get_sketch_times); None picks the smallest stride that keeps them
+    # to MAX_SKETCH_POINTS. Also:
+    #   slack_counts     (T, n) members with force <= bound at each step
+    #   increase_counts  (T,) members with V[t+1] > V[t] + lyapunov_tol (the
+    #                    default ignores round-off near the equilibrium)
+    #   max_increase     (T,) the biggest V[t+1] - V[t] seen
+    #   num_increasing   members whose V increased at least once
+    #   stop_counts      {stop reason code: members}, if given
+    # and a sample of num_samples raw trajectories.
+
+    def __init__(self, num_timesteps, tags, dt, equilibrium=None, bound=1E-10,
+                 lyapunov_tol=1E-9, relative_accuracy=0.02, min_value=1E-6, max_value=1E6,
+                 histogram_edges=None, num_samples=0, seed=None, sketch_every=None):
+        T = num_timesteps
+        self.num_timesteps = T
+        self.tags = list(tags)
+        self.dt = dt
+        self.equilibrium = None if equilibrium is None else np.asarray(equilibrium, dtype=float)
+        self.bound = bound
+        self.lyapunov_tol = lyapunov_tol
+        self.sketch_settings = {'relative_accuracy':relative_accuracy,
+                                'min_value':min_value, 'max_value':max_value}
+        self.histogram_edges = {} if histogram_edges is None else dict(histogram_edges)
+        self.quantities = ['V'] if equilibrium is None else ['V', 'norm_err']
+        if sketch_every is None:
+            sketch_every = max(1, int(np.ceil(T / (MAX_SKETCH_POINTS - 1))))
+        self.sketch_every = sketch_every
+        self.sketch_steps = np.arange(0, T+1, sketch_every)
+        if self.sketch_steps[-1] != T:
+            self.sketch_steps = np.append(self.sketch_steps, T)
+        self.moments = {}
+        self.sketches = {}
+        self.histograms = {}
+        for name in self.quantities:
+            self.moments[name] = RunningMoments(T+1)
+            self.sketches[name] = QuantileSketch(len(self.sketch_steps), **self.sketch_settings)
+            if name in self.histogram_edges:
+                self.histograms[name] = Histogram(T+1, self.histogram_edges[name])
+        self.count = 0
+        self.slack_counts = np.zeros((T, len(self.tags)), dtype=np.int64)
+        self.increase_counts = np.zeros(T, dtype=np.int64)
+        self.max_increase = np.full(T, -np.inf)
+        self.num_increasing = 0
+        self.stop_counts = {}
+        self.sample = TrajectorySample(num_samples, seed)
+
+    # Fold in a chunk of M members: results is a dict of member-major
+    # histories, state (M, T+1, 6), force (M, T, n), V (M, T+1) and
+    # optionally control, as from Simulation.get_results(). Histories that
+    # end early are held at their last values. members are the members'
+    # ids (for the sample), stop_reason their stopping.py reason codes.
+    def update(self, results, members=None, stop_reason=None):
+        T = self.num_timesteps
+        state = _hold_to(results['state'], T+1)
+        V = _hold_to(results['V'], T+1)
+        force = _hold_to(results['force'], T)
+        M = state.shape[0]
+        values = {'V':V}
+        if self.equilibrium is not None:
+            bar_x = np.concatenate((self.equilibrium, np.zeros(3)))
+            values['norm_err'] = np.linalg.norm(state - bar_x, 2, axis=2)
+        for name in self.quantities:
+            self.moments[name].add(values[name])
+            self.sketches[name].add(values[name][:, self.sketch_steps])
+            if name in self.histograms:
+                self.histograms[name].add(values[name])
+        self.slack_counts += np.sum(force <= self.bound, axis=0)
+        dV = np.diff(V, axis=1)
+        increasing = dV > self.lyapunov_tol
+        self.increase_counts += np.sum(increasing, axis=0)
+        if M > 0:
+            np.maximum(self.max_increase, np.max(dV, axis=0), out=self.max_increase)
+        self.num_increasing += int(np.sum(np.any(increasing, axis=1)))
+        if stop_reason is not None:
+            codes, counts = np.unique(np.asarray(stop_reason), return_counts=True)
+            for code, num in zip(codes, counts):
+                self.stop_counts[int(code)] = self.stop_counts.get(int(code), 0) + int(num)
+        if members is None:
+            members = self.count + np.arange(M)
+        raw = {'state':state, 'force':force, 'V':V}
+        if 'control' in results:
+            raw['control'] = _hold_to(results['control'], T)
+        self.sample.add(raw, members)
+        self.count += M
+
+    # Combine with the stats of other members (same settings.)
+    def merge(self, other):
+        if other.num_timesteps != self.num_timesteps or other.tags != self.tags or \
+           not np.array_equal(other.sketch_steps, self.sketch_steps):
+            raise Exception('Can only merge ensemble stats of the same runs and settings.')
+        for name in self.quantities:
+            self.moments[name].merge(other.moments[name])
+            self.sketches[name].merge(other.sketches[name])
+            if name in self.histograms:
+                self.histograms[name].merge(other.histograms[name])
+        self.slack_counts += other.slack_counts
+        self.increase_counts += other.increase_counts
+        np.maximum(self.max_increase, other.max_increase, out=self.max_increase)
+        self.num_increasing += other.num_increasing
+        for code, num in other.stop_counts.items():
+            self.stop_counts[code] = self.stop_counts.get(code, 0) + num
+        self.sample.merge(other.sample)
+        self.count += other.count
+
+    # Times of the T+1 states (the per-step counts are for [t, t+dt).)
+    def get_times(self):
+        return self.dt * np.arange(self.num_timesteps + 1)
+
+    def get_mean(self, name):
+        return self.moments[name].mean
+
+    def get_std(self, name):
+        return self.moments[name].get_std()
+
+    # Times of the sketched timesteps, which get_quantiles is at.
+    def get_sketch_times(self):
+        return self.dt * self.sketch_steps
+
+    # The q-quantiles of a quantity, (len(q), number of sketch times).
+    def get_quantiles(self, name, q):
+        return self.sketches[name].get_quantiles(q)
+
+    # Fraction of members with each cable slack, (T, n).
+    def get_slack_fraction(self):
+        return self.slack_counts / max(self.count, 1)
+
+    # Fraction of members whose V increased at each step, (T,).
+    def get_increase_fraction(self):
+        return self.increase_counts / max(self.count, 1)
+
+    # The summary as arrays and metadata for a run file: mean, std, min,
+    # max and the given quantiles of each quantity (at sketch_times), the
+    # fractions above, histograms, and the sample's arrays.
+    def to_arrays(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        arrays = {}
+        for name in self.quantities:
+            m = self.moments[name]
+            arrays[name + '_mean'] = m.mean
+            arrays[name + '_std'] = m.get_std()
+            arrays[name + '_min'] = m.min
+            arrays[name + '_max'] = m.max
+            arrays[name + '_quantiles'] = self.get_quantiles(name, list(quantiles))
+            if name in self.histograms:
+                arrays[name + '_histogram'] = self.histograms[name].counts
+                arrays[name + '_histogram_edges'] = self.histograms[name].edges
+        arrays['sketch_times'] = self.get_sketch_times()
+        arrays['slack_fraction'] = self.get_slack_fraction()
+        arrays['increase_fraction'] = self.get_increase_fraction()
+        arrays['max_increase'] = self.max_increase
+        members, sample = self.sample.get_arrays()
+        if len(members) > 0:
+            arrays['sample_members'] = members
+            for key, val in sample.items():
+                arrays['sample_' + key] = val
+        metadata = {'ensemble_stats':True, 'cable_tags':self.tags, 'dt':self.dt,
+                    'num_timesteps':self.num_timesteps, 'num_members':self.count,
+                    'quantities':self.quantities, 'quantiles':list(quantiles),
+                    'equilibrium':self.equilibrium, 'eps':self.bound,
+                    'lyapunov_tol':self.lyapunov_tol, 'num_increasing':self.num_increasing,
+                    'stop_counts':self.stop_counts, 'sketch':self.sketch_settings,
+                    'sketch_every':self.sketch_every}
+        return arrays, metadata
+
+# Save the summary of some ensemble stats to a run file (open it again
+# with run_file.load_run, or through a catalogue.)
+def save_ensemble_stats(filename, stats, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    arrays, metadata = stats.to_arrays(quantiles)
+    run_file.save_run(filename, arrays, metadata)
+
+# A helper: histories (M, t, ...) extended to length along axis 1 by
+# repeating the last entry.
+def _hold_to(history, length):
+    history = np.asarray(history)
+    if history.ndim < 2:
+        raise Exception('Ensemble stats need member-major histories (M, T, ...).')
+    have = history.shape[1]
+    if have == length:
+        return history
+    if have == 0:
+        raise Exception('Can\'t hold an empty history.')
+    pad = np.repeat(history[:, have-1:have], length - have, axis=1)
+    return np.concatenate((history, pad), axis=1)
@@ -0,0 +1,165 @@
+"""
+A single-file format for simulation runs.
+
+A run file is an uncompressed .npz (a zip of .npy arrays, so np.load can
+read it too), plus a 'metadata.json' entry. The arrays are usually
+    state   (T+1, 6)  point mass state history
+    force   (T, n)    scalar cable forces, cables in the order of cable_tags
+    control (T, n)    control inputs (rest lengths)
+    V       (T+1,)    Lyapunov function
+and, from a Simulation, the slack logs (trajectories/slack_log.py),
+and the metadata has the format version, cable_tags, cable_anchors,
+cable_params, controller_consts, m, g, force_law (None for the
+piecewise rig, see rig.CableRig.get_force_law), dt, num_timesteps, eps,
+and anything else the caller wants to keep (all plain JSON.)
+
+Since the arrays are stored without compression, RunFile memory-maps
+them straight out of the zip: opening a run only reads the metadata,
+and slicing an array only reads those bytes. Nothing is unpickled.
+"""
+
+# need to do linear alg
+import numpy as np
+import json
+import zipfile
+import struct
+
+# Bump this when the layout changes. Readers accept this version or older.
+FORMAT_NAME = 'cable-slackness-run'
+FORMAT_VERSION = 1
+METADATA_NAME = 'metadata.json'
+
+# A helper: convert numpy arrays and scalars (possibly nested in dicts
+# and lists) into plain Python, so the metadata can be written as JSON.
+def to_json_types(obj):
+    if isinstance(obj, dict):
+        return {str(key): to_json_types(val) for key, val in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_json_types(val) for val in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+# Write a run file. 'arrays' is a dict of name -> ndarray, 'metadata' a
+# dict of anything JSON-able (numpy types are converted.)
+def save_run(filename, arrays, metadata):
+    metadata = to_json_types(metadata)
+    metadata['format'] = FORMAT_NAME
+    metadata['version'] = FORMAT_VERSION
+    metadata['arrays'] = sorted(arrays.keys())
+    # ZIP_STORED, so the arrays can be memory-mapped later.
+    with zipfile.ZipFile(filename, mode='w', compression=zipfile.ZIP_STORED,
+                         allowZip64=True) as zf:
+        zf.writestr(METADATA_NAME, json.dumps(metadata, indent=1))
+        for name in sorted(arrays.keys()):
+            array = np.ascontiguousarray(arrays[name])
+            if array.dtype.hasobject:
+                raise Exception('Run files only hold numeric arrays, not ' + name)
+            with zf.open(name + '.npy', mode='w', force_zip64=True) as f:
+                np.lib.format.write_array(f, array, allow_pickle=False)
+
+# Save a simulators.simulation.Simulation (single run or ensemble.)
+# Extra keyword arguments go into the metadata.
+def save_simulation(filename, sim, eps=1E-10, **extra):
+    cable_anchors, cable_params, controller_consts = sim.rig.to_dicts()
+    metadata = {'cable_tags':sim.rig.tags, 'cable_anchors':cable_anchors,
+                'cable_params':cable_params, 'controller_consts':controller_consts,
+                'm':sim.rig.m, 'g':sim.rig.g, 'force_law':sim.rig.get_force_law(),
+                'dt':sim.dt, 'num_timesteps':sim.num_timesteps, 'eps':eps}
+    metadata['slack_bound'] = sim.slack_bound
+    metadata.update(extra)
+    arrays = dict(sim.get_results())
+    arrays.update(sim.get_slack_arrays())
+    save_run(filename, arrays, metadata)
+
+class RunFile:
+    # A run file opened for reading. Arrays are memory-mapped on access:
+    #   run = RunFile('example.npz')
+    #   run.metadata['dt'], run['state'][0:100, 0:3]
+    # mmap=False reads them into memory instead.
+
+    def __init__(self, filename, mmap=True):
+        self.filename = filename
+        self.mmap = mmap
+        # Where each array's data starts in the file, with its dtype, shape
+        # and order, so it can be memory-mapped.
+        self._layout = {}
+        self._cache = {}
+        with zipfile.ZipFile(filename, mode='r') as zf:
+            self.metadata = json.loads(zf.read(METADATA_NAME).decode('utf-8'))
+            if self.metadata.get('format') != FORMAT_NAME:
+                raise Exception(filename + ' is not a run file.')
+            if self.metadata.get('version', 0) > FORMAT_VERSION:
+                raise Exception(filename + ' is version ' + str(self.metadata['version'])
+                                + ', newer than this reader (' + str(FORMAT_VERSION) + ').')
+            with open(filename, 'rb') as f:
+                for info in zf.infolist():
+                    if not info.filename.endswith('.npy'):
+                        continue
+                    name = info.filename[:-4]
+                    if info.compress_type != zipfile.ZIP_STORED:
+                        # can't memory-map a compressed member.
+                        self._layout[name] = None
+                        continue
+                    self._layout[name] = self._read_layout(f, info)
+        self.names = sorted(self._layout.keys())
+
+    # A helper: find the .npy header of a stored member, and return
+    # (data offset, dtype, shape, fortran_order).
+    def _read_layout(self, f, info):
+        # The local file header is 30 bytes, then the name and extra field.
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_len, extra_len = struct.unpack('<HH', local_header[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if dtype.hasobject:
+            raise Exception(info.filename + ' holds Python objects, refusing to load it.')
+        return (f.tell(), dtype, shape, fortran_order)
+
+    def keys(self):
+        return self.names
+
+    def __contains__(self, name):
+        return name in self._layout
+
+    # Get an array by name. Memory-mapped (read only) unless mmap=False
+    # or the member is compressed.
+    def __getitem__(self, name):
+        if name in self._cache:
+            return self._cache[name]
+        if name not in self._layout:
+            raise KeyError(name)
+        layout = self._layout[name]
+        if self.mmap and layout is not None:
+            offset, dtype, shape, fortran_order = layout
+            if int(np.prod(shape)) == 0:
+                array = np.zeros(shape, dtype=dtype)
+            else:
+                array = np.memmap(self.filename, dtype=dtype, mode='r', offset=offset,
+                                  shape=shape, order='F' if fortran_order else 'C')
+        else:
+            with zipfile.ZipFile(self.filename, mode='r') as zf:
+                with zf.open(name + '.npy') as f:
+                    array = np.lib.format.read_array(f, allow_pickle=False)
+        self._cache[name] = array
+        return array
+
+    # The timestamps of the state history, t = 0, dt, ..., T dt.
+    def get_timesteps(self):
+        dt = self.metadata['dt']
+        return dt * np.arange(self['state'].shape[-2])
+
+    # The anchors as a dict of tag -> ndarray, as in the scripts.
+    def get_cable_anchors(self):
+        return {tag: np.array(anch) for tag, anch in self.metadata['cable_anchors'].items()}
+
+# Shortcut for RunFile(filename).
+def load_run(filename, mmap=True):
+    return RunFile(filename, mmap=mmap)
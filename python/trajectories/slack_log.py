@@ -0,0 +1,312 @@
+"""
+Run-length encoded log of when each cable was slack.
+
+Instead of the full (T, n) force history, keep, per cable, the list of
+intervals [start, end) during which it was slack, with the start and end
+times interpolated between timesteps where the force crosses the bound.
+The intervals are sorted and disjoint, so both questions we actually ask
+of a run are a binary search away:
+    log.get_slack_tags(t)            which cables are slack at time t
+    log.get_total_slack_time(t0, t1) how long each cable was slack in [t0, t1]
+A cable that's slack the whole run is one interval; one that never goes
+slack is none. A Simulation builds the logs of its members as it runs
+(SlackRecorder), from the unclipped force at each step, and only ever
+keeps the crossings: sim.get_slack_log(), and the run files it writes
+hold them as arrays (SlackLog.from_run reads them.) Logs can also be
+built from saved histories with from_histories / from_forces.
+
+Conventions: the force at step t acts over [t dt, (t+1) dt), and slack
+means force <= bound (the scripts' eps.) A crossing between steps t-1 and
+t is placed where the straight line between the two forces meets the
+bound. With the unclipped forces (the rig's get_unclipped_forces, which
+rigs with other force laws override) that's a real estimate of the
+crossing; with the recorded, clipped forces it's only accurate to about
+a timestep, since every slack force is recorded as zero.
+
+In a run file, the logs of all its members are stored flat, member after
+member, cable after cable: arrays slack_starts, slack_ends, slack_offsets
+(N n + 1) and slack_t_end (N,), with the bound as metadata 'slack_bound'.
+"""
+
+# need to do linear alg
+import numpy as np
+from trajectories import run_file
+
+class SlackLog:
+    # The intervals are stored flat, cable after cable (like a sparse
+    # matrix): cable i's intervals are starts[offsets[i]:offsets[i+1]],
+    # ends[offsets[i]:offsets[i+1]]. t_end is the end of the run.
+
+    def __init__(self, tags, starts, ends, offsets, t_end, bound=1E-10):
+        self.tags = list(tags)
+        self.starts = np.asarray(starts, dtype=float)
+        self.ends = np.asarray(ends, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.t_end = float(t_end)
+        self.bound = bound
+        self._index = {tag: i for i, tag in enumerate(self.tags)}
+        # Slack time before each interval starts, per cable, for the
+        # total slack time queries. Restarts at zero for each cable.
+        durations = self.ends - self.starts
+        self._before = np.zeros(len(self.starts))
+        for i in range(len(self.tags)):
+            lo, hi = self.offsets[i], self.offsets[i+1]
+            if hi > lo:
+                self._before[lo+1:hi] = np.cumsum(durations[lo:hi-1])
+
+    # Build from scalar forces (T, n) sampled every dt.
+    @classmethod
+    def from_forces(cls, force, dt, tags, bound=1E-10):
+        force = np.asarray(force)
+        T, n = force.shape
+        all_starts = []
+        all_ends = []
+        offsets = np.zeros(n+1, dtype=np.int64)
+        for i in range(n):
+            starts, ends = _find_intervals(force[:, i], dt, bound)
+            all_starts.append(starts)
+            all_ends.append(ends)
+            offsets[i+1] = offsets[i] + len(starts)
+        return cls(tags, np.concatenate(all_starts), np.concatenate(all_ends),
+                   offsets, T * dt, bound)
+
+    # Build from a state history (T+1, 6) and control history (T, n) of
+    # a simulators.rig.CableRig, using the unclipped forces so the crossing
+    # times are interpolated properly.
+    @classmethod
+    def from_histories(cls, rig, state, control, dt, bound=1E-10):
+        ell, dot_ell, _ = rig.get_kinematics(np.asarray(state)[0:len(control)])
+        force = rig.get_unclipped_forces(ell, dot_ell, np.asarray(control))
+        return cls.from_forces(force, dt, rig.tags, bound)
+
+    # Build from a run file (run_file.RunFile): member's log, if the run
+    # has them (see above), else from its 'force' (a single run), using
+    # the eps it was saved with as the bound.
+    @classmethod
+    def from_run(cls, run, member=0):
+        tags = run.metadata['cable_tags']
+        if 'slack_starts' not in run:
+            return cls.from_forces(run['force'], run.metadata['dt'], tags,
+                                   run.metadata.get('eps', 1E-10))
+        n = len(tags)
+        offsets = np.array(run['slack_offsets'][member*n : (member+1)*n + 1])
+        lo, hi = offsets[0], offsets[-1]
+        return cls(tags, run['slack_starts'][lo:hi], run['slack_ends'][lo:hi],
+                   offsets - lo, run['slack_t_end'][member],
+                   run.metadata.get('slack_bound', run.metadata.get('eps', 1E-10)))
+
+    @property
+    def num_cables(self):
+        return len(self.tags)
+
+    @property
+    def num_intervals(self):
+        return len(self.starts)
+
+    # Bytes used by the log itself (compare to force_history.nbytes.)
+    @property
+    def nbytes(self):
+        return self.starts.nbytes + self.ends.nbytes + self.offsets.nbytes
+
+    # The slack intervals of one cable, as (starts, ends) views.
+    def get_intervals(self, tag):
+        i = self._index[tag]
+        lo, hi = self.offsets[i], self.offsets[i+1]
+        return self.starts[lo:hi], self.ends[lo:hi]
+
+    # Whether each cable is slack at time(s) t. Returns (n,) bools for a
+    # scalar t, or (n, len(t)) for an array of times.
+    def is_slack(self, t):
+        t = np.asarray(t, dtype=float)
+        slack = np.zeros((self.num_cables,) + t.shape, dtype=bool)
+        for i, tag in enumerate(self.tags):
+            starts, ends = self.get_intervals(tag)
+            if len(starts) == 0:
+                continue
+            # the last interval starting at or before t.
+            j = np.searchsorted(starts, t, side='right') - 1
+            slack[i] = (j >= 0) & (t < ends[np.maximum(j, 0)])
+        return slack
+
+    # The tags of the cables that are slack at time t.
+    def get_slack_tags(self, t):
+        slack = self.is_slack(t)
+        return [tag for i, tag in enumerate(self.tags) if slack[i]]
+
+    # A helper: slack time of cable i in [0, t], for scalar or array t.
+    def _slack_time_until(self, i, t):
+        lo, hi = self.offsets[i], self.offsets[i+1]
+        starts = self.starts[lo:hi]
+        ends = self.ends[lo:hi]
+        if hi == lo:
+            return np.zeros(np.shape(t))
+        j = np.searchsorted(starts, t, side='right') - 1
+        jc = np.maximum(j, 0)
+        partial = np.minimum(t, ends[jc]) - starts[jc]
+        return np.where(j >= 0, self._before[lo:hi][jc] + partial, 0.)
+
+    # Total slack time of each cable in [t0, t1] (default: the whole
+    # run), as a dict of tag -> seconds.
+    def get_total_slack_time(self, t0=0., t1=None):
+        if t1 is None:
+            t1 = self.t_end
+        return {tag: float(self._slack_time_until(i, t1) - self._slack_time_until(i, t0))
+                for i, tag in enumerate(self.tags)}
+
+    # The slack/taut transitions in time order, as a list of
+    # (time, tag, 'slack' or 'taut'). A run that starts slack begins with
+    # a 'slack' event at 0, and one that ends slack doesn't get a 'taut'.
+    def get_events(self):
+        events = []
+        for i, tag in enumerate(self.tags):
+            starts, ends = self.get_intervals(tag)
+            events += [(float(s), tag, 'slack') for s in starts]
+            events += [(float(e), tag, 'taut') for e in ends if e < self.t_end]
+        return sorted(events, key=lambda event: event[0])
+
+    # The log as arrays + metadata, for run_file.save_run (in the run
+    # file layout above, as a run with one member.)
+    def to_arrays(self):
+        arrays = {'slack_starts':self.starts, 'slack_ends':self.ends,
+                  'slack_offsets':self.offsets, 'slack_t_end':np.array([self.t_end])}
+        metadata = {'slack_log':True, 'cable_tags':self.tags, 'slack_bound':self.bound}
+        return arrays, metadata
+
+class SlackRecorder:
+    # The slack logs of num_members runs, built step by step from the
+    # unclipped forces (rig.get_unclipped_forces), for a Simulation. Only
+    # the crossings are kept, in lists per member and cable, along with
+    # the forces of the last step each member took (to interpolate the
+    # next crossing.) An interval still open has no end yet.
+
+    def __init__(self, tags, num_members, dt, bound=1E-10):
+        self.tags = list(tags)
+        self.num_members = num_members
+        self.dt = dt
+        self.bound = bound
+        n = len(self.tags)
+        self._starts = [[] for _ in range(num_members * n)]
+        self._ends = [[] for _ in range(num_members * n)]
+        # NaN until a member's first step.
+        self._prev = np.full((num_members, n), np.nan)
+
+    # Record steps t0, ..., t0+k-1 of the members (indices, default all),
+    # from their unclipped forces U, (M, k, n). Each member's steps have
+    # to come in order, right after the last ones it recorded.
+    def update_block(self, t0, U, members=None):
+        U = np.asarray(U, dtype=float)
+        if members is None:
+            members = np.arange(self.num_members)
+        members = np.asarray(members)
+        prev = self._prev[members]
+        full = np.concatenate((prev[:, np.newaxis], U), axis=1)
+        # (NaN is never slack, so a member that starts slack begins an
+        # interval at its first step.)
+        slack = full <= self.bound
+        rows, steps, cables = np.nonzero(slack[:, 1:] != slack[:, 0:-1])
+        if len(rows) > 0:
+            before = full[rows, steps, cables]
+            after = full[rows, steps + 1, cables]
+            with np.errstate(invalid='ignore'):
+                frac = (before - self.bound) / (before - after)
+            t = t0 + steps
+            times = np.where(np.isnan(before), t * self.dt, (t - 1 + frac) * self.dt)
+            began = slack[rows, steps + 1, cables]
+            n = len(self.tags)
+            # (in step order for each member and cable, as nonzero goes.)
+            for m, c, time, b in zip(members[rows], cables, times, began):
+                (self._starts if b else self._ends)[m * n + c].append(float(time))
+        self._prev[members] = U[:, -1]
+
+    # Record step t of the members, from U (M, n).
+    def update(self, t, U, members=None):
+        self.update_block(t, np.asarray(U)[:, np.newaxis], members)
+
+    # The log of member i, with intervals still open ending at t_end.
+    def get_log(self, i, t_end):
+        arrays = self.get_arrays(np.array([t_end]), members=[i])
+        return SlackLog(self.tags, arrays['slack_starts'], arrays['slack_ends'],
+                        arrays['slack_offsets'], t_end, self.bound)
+
+    # A helper: the flat layout (see above) of the members, open
+    # intervals ending at NaN.
+    def _flatten(self, members):
+        n = len(self.tags)
+        lists = [(self._starts[m * n + c], self._ends[m * n + c])
+                 for m in members for c in range(n)]
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(starts) for starts, _ in lists])
+        starts = np.zeros(offsets[-1])
+        ends = np.full(offsets[-1], np.nan)
+        for j, (s, e) in enumerate(lists):
+            starts[offsets[j] : offsets[j+1]] = s
+            ends[offsets[j] : offsets[j] + len(e)] = e
+        return starts, ends, offsets
+
+    # The logs of the members (default all) as arrays for a run file,
+    # with each member's open intervals ending at t_end (M,).
+    def get_arrays(self, t_end, members=None):
+        if members is None:
+            members = range(self.num_members)
+        starts, ends, offsets = self._flatten(members)
+        t_end = np.asarray(t_end, dtype=float)
+        per_interval = np.repeat(np.repeat(t_end, len(self.tags)), np.diff(offsets))
+        ends = np.where(np.isnan(ends), per_interval, ends)
+        return {'slack_starts':starts, 'slack_ends':ends, 'slack_offsets':offsets,
+                'slack_t_end':t_end}
+
+    # The whole recorder as arrays (open intervals kept open), for
+    # checkpoints, and back.
+    def to_arrays(self):
+        starts, ends, offsets = self._flatten(range(self.num_members))
+        return {'slack_starts':starts, 'slack_ends':ends, 'slack_offsets':offsets,
+                'slack_prev':self._prev.copy()}
+
+    @classmethod
+    def from_arrays(cls, arrays, tags, dt, bound=1E-10):
+        prev = np.asarray(arrays['slack_prev'], dtype=float)
+        recorder = cls(tags, prev.shape[0], dt, bound)
+        recorder._prev[:] = prev
+        starts = np.asarray(arrays['slack_starts'])
+        ends = np.asarray(arrays['slack_ends'])
+        offsets = np.asarray(arrays['slack_offsets'])
+        for j in range(len(offsets) - 1):
+            lo, hi = offsets[j], offsets[j+1]
+            recorder._starts[j] = starts[lo:hi].tolist()
+            recorder._ends[j] = [e for e in ends[lo:hi].tolist() if not np.isnan(e)]
+        return recorder
+
+# A helper: the slack intervals of one force series, (starts, ends).
+def _find_intervals(F, dt, bound):
+    T = len(F)
+    slack = F <= bound
+    # +1 where slack begins at step t, -1 where it ends at step t.
+    change = np.diff(slack.astype(np.int8))
+    begin = np.nonzero(change == 1)[0] + 1
+    end = np.nonzero(change == -1)[0] + 1
+    starts = _get_crossing_times(F, begin, dt, bound)
+    ends = _get_crossing_times(F, end, dt, bound)
+    if T > 0 and slack[0]:
+        starts = np.concatenate(([0.], starts))
+    if T > 0 and slack[-1]:
+        ends = np.concatenate((ends, [T * dt]))
+    return starts, ends
+
+# A helper: the time the force crossed the bound between steps t-1 and t,
+# interpolated linearly, for each t in steps.
+def _get_crossing_times(F, steps, dt, bound):
+    before = F[steps-1]
+    after = F[steps]
+    frac = (before - bound) / (before - after)
+    return (steps - 1 + frac) * dt
+
+# Save a log to a run file, and read it back.
+def save_slack_log(filename, log):
+    arrays, metadata = log.to_arrays()
+    run_file.save_run(filename, arrays, metadata)
+
+def load_slack_log(filename):
+    run = run_file.load_run(filename, mmap=False)
+    if not run.metadata.get('slack_log', False):
+        raise Exception(filename + ' is not a slack log.')
+    return SlackLog.from_run(run)
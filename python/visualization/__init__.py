@@ -0,0 +1,3 @@
+# include everything from this directly.
+__all__ = ['cable_animation', 'video_export', 'decimate', 'html_viewer',
+           'figures']
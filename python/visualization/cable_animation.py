@@ -0,0 +1,144 @@
+"""
+Animation of the point mass and its cables, for long runs.
+
+The scripts' ani_update removed and re-created a scatter point every frame
+and rebuilt each cable's line from small np.arrays, with blitting off.
+Here every artist is created once and only its data changes per frame:
+the cables are one Line3DCollection whose segments and colours for every
+frame are computed up front as arrays, the mass is one marker, and the
+path is a line over a view of the state history. Cables are coloured
+slack or taut from the run's slack log (trajectories/slack_log.py), one
+binary search per cable for all the frames, rather than by checking the
+forces. Long runs can be played back every 'stride'-th step, and blitting
+is used when the canvas supports it. Example, with a run file:
+    renderer = cable_animation.CableAnimation(ax, run['state'], tags, anchors,
+                                              slack_log=slack_log.SlackLog.from_run(run),
+                                              stride=10)
+    ani = renderer.get_animation(interval=50)
+    plt.show()
+With blitting, rotating the 3D view mid-playback leaves the old
+background behind until the next full redraw; pass blit=False to rotate
+freely.
+"""
+
+# need to do linear alg
+import numpy as np
+import matplotlib.colors as mcolors
+from matplotlib.animation import FuncAnimation
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+from trajectories import slack_log as slack_logs
+
+class CableAnimation:
+    # state_history (T+1, 6), cable_tags, cable_anchors (dict tag -> 3-vector.)
+    # slack_log (a slack_log.SlackLog of the same run), if given, colours
+    # each cable slack_color while it's slack and taut_color otherwise.
+    # Without one, a force_history can be given instead, slack when the
+    # force is <= bound; it can be a (T, n) array (cables in the order of
+    # cable_tags) or the scripts' list of dicts, and is turned into a log.
+    # Without either, every cable is cable_color.
+    # Frame i shows state index frames[i]; stride picks every stride-th
+    # state, and the last state is always included (get_frames.)
+    # frame_range (first, last) only prepares frames first...last-1, and
+    # only reads those states (and the path up to them), e.g. for one
+    # segment of a video export; only they can be drawn.
+
+    def __init__(self, ax, state_history, cable_tags, cable_anchors,
+                 force_history=None, bound=1E-10, stride=1,
+                 cable_color='r', slack_color='r', taut_color='g',
+                 mass_color='blue', path_color=None, show_path=True, slack_log=None,
+                 frame_range=None):
+        self.ax = ax
+        self.state_history = state_history
+        self.cable_tags = cable_tags
+        self.anchors = np.array([cable_anchors[tag] for tag in cable_tags], dtype=float)
+        num_states = state_history.shape[0]
+        self.frames = get_frames(num_states, stride)
+        if frame_range is None:
+            frame_range = (0, len(self.frames))
+        self.first = frame_range[0]
+        drawn = self.frames[frame_range[0] : frame_range[1]]
+        n = len(cable_tags)
+        # Segments for every prepared frame, (F, n, 2, 3): mass position to anchor.
+        pos = np.asarray(state_history[drawn, 0:3], dtype=float)
+        self.segments = np.empty((len(drawn), n, 2, 3))
+        self.segments[:, :, 0, :] = pos[:, np.newaxis, :]
+        self.segments[:, :, 1, :] = self.anchors
+        # and colours, (F, n, 4).
+        # the state at index k is at time k dt, as the log has it.
+        if slack_log is not None:
+            step_dt = slack_log.t_end / max(num_states - 1, 1)
+        elif force_history is not None:
+            step_dt = 1.
+            slack_log = slack_logs.SlackLog.from_forces(
+                get_force_array(force_history, cable_tags), step_dt, cable_tags, bound)
+        if slack_log is None:
+            rgba = np.array(mcolors.to_rgba(cable_color))
+            self.colors = np.broadcast_to(rgba, (len(drawn), n, 4))
+        else:
+            # (the last state has no step after it, so it keeps the last
+            # step's colours.)
+            times = step_dt * np.minimum(drawn, max(num_states - 2, 0))
+            order = [slack_log.tags.index(tag) for tag in cable_tags]
+            slack = slack_log.is_slack(times)[order].T[..., np.newaxis]
+            self.colors = np.where(slack, np.array(mcolors.to_rgba(slack_color)),
+                                   np.array(mcolors.to_rgba(taut_color)))
+        # The artists, created once.
+        self.cable_lines = Line3DCollection(self.segments[0], colors=self.colors[0])
+        ax.add_collection3d(self.cable_lines)
+        self.mass_marker = ax.plot(pos[0:1, 0], pos[0:1, 1], pos[0:1, 2], linestyle='',
+                                   marker='o', markersize=8, color=mass_color)[0]
+        self.path_line = None
+        if show_path:
+            self.path_line = ax.plot(pos[0:1, 0], pos[0:1, 1], pos[0:1, 2],
+                                     color=path_color)[0]
+        self.artists = [a for a in [self.path_line, self.cable_lines, self.mass_marker]
+                        if a is not None]
+
+    @property
+    def num_frames(self):
+        return len(self.frames)
+
+    # Set every artist to frame i (an index into self.frames.) Returns the
+    # artists that changed, as FuncAnimation wants for blitting.
+    def draw_frame(self, i):
+        k = self.frames[i]
+        j = i - self.first
+        self.cable_lines.set_segments(self.segments[j])
+        self.cable_lines.set_color(self.colors[j])
+        p = self.segments[j, 0, 0]
+        self.mass_marker.set_data_3d(p[0:1], p[1:2], p[2:3])
+        if self.path_line is not None:
+            path = self.state_history[0:k+1]
+            self.path_line.set_data_3d(path[:, 0], path[:, 1], path[:, 2])
+        return self.artists
+
+    def _init(self):
+        return self.draw_frame(self.first)
+
+    # A FuncAnimation over all the (prepared) frames. blit=None blits if
+    # the figure's canvas supports it.
+    def get_animation(self, interval=50, blit=None, repeat=True):
+        fig = self.ax.figure
+        if blit is None:
+            blit = fig.canvas.supports_blit
+        for artist in self.artists:
+            artist.set_animated(blit)
+        frames = range(self.first, self.first + len(self.segments))
+        return FuncAnimation(fig=fig, func=self.draw_frame, frames=frames,
+                             init_func=self._init, interval=interval, blit=blit,
+                             repeat=repeat)
+
+# The state indices of the frames of num_states states at stride: every
+# stride-th, and the last.
+def get_frames(num_states, stride=1):
+    frames = np.arange(0, num_states, stride)
+    if frames[-1] != num_states - 1:
+        frames = np.append(frames, num_states - 1)
+    return frames
+
+# Scalar forces as a (T, n) array, from either an array or the scripts'
+# list of dicts of tag -> force.
+def get_force_array(force_history, cable_tags):
+    if isinstance(force_history, list):
+        return np.array([[f[tag] for tag in cable_tags] for f in force_history])
+    return np.asarray(force_history)
@@ -0,0 +1,181 @@
+"""
+Decimated line plots for long time series.
+
+A line with more points than the axes has pixels draws no differently with
+fewer, so here a series is cut down to about two points per pixel column
+before matplotlib sees it, keeping its shape:
+    'minmax' - the min and the max of each bucket of samples, so spikes
+               and envelopes survive (the default.)
+    'lttb'   - Largest Triangle Three Buckets: one point per bucket, the
+               one making the biggest triangle with its neighbours.
+For 'minmax' the buckets come from a pyramid of levels (bucket sizes 2,
+4, 8, ...) built once per series, so zooming in only picks buckets out of
+a cached level; LTTB results are cached by range and size.
+    lines = decimate.plot(ax, timesteps, V_history)
+    lines = decimate.plot(ax, times, force, method='lttb')   # (T, n): n lines
+The lines are re-decimated to the visible range when the x limits change
+(zooming, panning). For saving, the points are what's on screen, so EPS
+and PDF files stay small. x must be increasing.
+"""
+
+# need to do linear alg
+import numpy as np
+
+# Indices of the samples LTTB keeps of (x, y), num_out of them, including
+# the first and last.
+def lttb_indices(x, y, num_out):
+    N = len(y)
+    if num_out >= N or num_out < 3:
+        return np.arange(N)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # num_out-2 buckets between the first and last points.
+    edges = np.linspace(1, N-1, num_out-1).astype(np.int64)
+    out = np.zeros(num_out, dtype=np.int64)
+    out[-1] = N-1
+    a = 0
+    for i in range(num_out-2):
+        lo, hi = edges[i], edges[i+1]
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i+1], edges[i+2]
+        else:
+            next_lo, next_hi = N-1, N
+        avg_x = np.mean(x[next_lo:next_hi])
+        avg_y = np.mean(y[next_lo:next_hi])
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + np.argmax(area)
+        out[i+1] = a
+    return out
+
+class MinMaxPyramid:
+    # For y (N,), the index of the min and of the max of every bucket of
+    # 2^k samples, for k = 1, 2, ... until one bucket covers everything.
+    # Each level is built from the one below, about 2N indices in all.
+
+    def __init__(self, y):
+        self.y = np.asarray(y)
+        N = len(self.y)
+        self.levels = []
+        imin = np.arange(N)
+        imax = np.arange(N)
+        while len(imin) > 1:
+            if len(imin) % 2 == 1:
+                imin = np.append(imin, imin[-1])
+                imax = np.append(imax, imax[-1])
+            a, b = imin[0::2], imin[1::2]
+            imin = np.where(self.y[a] <= self.y[b], a, b)
+            a, b = imax[0::2], imax[1::2]
+            imax = np.where(self.y[a] >= self.y[b], a, b)
+            self.levels.append((imin, imax))
+
+    # Indices of about max_points samples in [first, last): the mins and
+    # maxes of the smallest buckets that give few enough, in order, with
+    # the first and last samples.
+    def get_indices(self, first, last, max_points):
+        if last - first <= max_points or len(self.levels) == 0:
+            return np.arange(first, last)
+        k = 0
+        while k < len(self.levels) - 1 and 2 * (last - first) / 2**(k+1) > max_points:
+            k += 1
+        size = 2**(k+1)
+        imin, imax = self.levels[k]
+        lo = first // size
+        hi = -(-last // size)
+        idx = np.concatenate((imin[lo:hi], imax[lo:hi], [first, last-1]))
+        idx = np.unique(idx)
+        return idx[(idx >= first) & (idx < last)]
+
+class DecimatedSeries:
+    # One series (x, y), decimated on demand, with its pyramid built the
+    # first time it's needed and LTTB results kept.
+
+    def __init__(self, x, y):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        if len(self.x) != len(self.y):
+            raise Exception('x and y need the same length to decimate, got '
+                            + str(len(self.x)) + ' and ' + str(len(self.y)) + '.')
+        self._pyramid = None
+        self._lttb = {}
+
+    # Indices of about max_points samples with x0 <= x <= x1 (default: all),
+    # plus one sample either side so the line reaches the edges.
+    def get_indices(self, max_points, method='minmax', x0=None, x1=None):
+        N = len(self.x)
+        first = 0 if x0 is None else max(np.searchsorted(self.x, x0, side='left') - 1, 0)
+        last = N if x1 is None else min(np.searchsorted(self.x, x1, side='right') + 1, N)
+        if method == 'minmax':
+            if self._pyramid is None:
+                self._pyramid = MinMaxPyramid(self.y)
+            return self._pyramid.get_indices(first, last, max_points)
+        if method == 'lttb':
+            key = (first, last, max_points)
+            if key not in self._lttb:
+                self._lttb[key] = first + lttb_indices(self.x[first:last],
+                                                       self.y[first:last], max_points)
+            return self._lttb[key]
+        raise Exception('Unknown decimation method ' + str(method) + ', use minmax or lttb.')
+
+    def get_points(self, max_points, method='minmax', x0=None, x1=None):
+        idx = self.get_indices(max_points, method, x0, x1)
+        return self.x[idx], self.y[idx]
+
+# (x, y) cut down to about max_points, for when there are no axes
+# (e.g. writing the points out.) y can be (N,) or (N, n), then a list of
+# one (x, y) per column.
+def decimate(x, y, max_points, method='minmax'):
+    y = np.asarray(y)
+    if y.ndim == 1:
+        return DecimatedSeries(x, y).get_points(max_points, method)
+    return [DecimatedSeries(x, y[:, i]).get_points(max_points, method)
+            for i in range(y.shape[1])]
+
+class DecimatedLines:
+    # Lines on ax for the series, kept decimated to points_per_pixel
+    # points per pixel of the axes' width (or max_points, if given) over
+    # the visible x range.
+
+    def __init__(self, ax, series, lines, method='minmax', max_points=None,
+                 points_per_pixel=2):
+        self.ax = ax
+        self.series = series
+        self.lines = lines
+        self.method = method
+        self.max_points = max_points
+        self.points_per_pixel = points_per_pixel
+        self.update()
+        self._cid = ax.callbacks.connect('xlim_changed', lambda ax: self.update())
+
+    # Number of points to draw per line.
+    def get_max_points(self):
+        if self.max_points is not None:
+            return self.max_points
+        width = self.ax.get_window_extent().width
+        return max(int(self.points_per_pixel * width), 16)
+
+    # Re-decimate every line to the current x limits.
+    def update(self):
+        x0, x1 = self.ax.get_xlim()
+        if x0 > x1:
+            x0, x1 = x1, x0
+        max_points = self.get_max_points()
+        for series, line in zip(self.series, self.lines):
+            line.set_data(*series.get_points(max_points, self.method, x0, x1))
+
+    def disconnect(self):
+        self.ax.callbacks.disconnect(self._cid)
+
+# Like ax.plot(x, y, ...) for long series: y is (N,) or (N, n) for n
+# lines. The axes' x limits are set to x's range, as ax.plot would.
+# Returns the DecimatedLines (its .lines are the Line2Ds.)
+def plot(ax, x, y, *args, method='minmax', max_points=None, points_per_pixel=2, **kwargs):
+    y = np.asarray(y)
+    columns = [y] if y.ndim == 1 else [y[:, i] for i in range(y.shape[1])]
+    series = [DecimatedSeries(x, col) for col in columns]
+    # start from the whole range, decimated to a nominal width.
+    start = 2000 if max_points is None else max_points
+    lines = []
+    for s in series:
+        lines += ax.plot(*s.get_points(start, method), *args, **kwargs)
+    return DecimatedLines(ax, series, lines, method, max_points, points_per_pixel)
@@ -0,0 +1,189 @@
+"""
+A pipeline for result figures: each figure is a task over some input
+files, the figures are rendered in parallel in a process pool (Agg, no
+windows), and a figure is only rendered again when its inputs or its code
+changed, by content hash.
+
+    pipeline = figures.FigurePipeline('results/plots/.figures.json')
+    pipeline.add(figures.FigureTask('lyap', plot_lyap, inputs=[...npy files],
+                                    outputs=['img/lyap.eps', 'img/lyap.png'],
+                                    kwargs={'dt':0.01}))
+    pipeline.run()
+
+func(*inputs, **kwargs) returns a matplotlib Figure, and must be a
+top-level function (it's sent to the workers by name.) A task's key is a
+hash of its name, kwargs, outputs, the contents of its inputs, and its
+code: the file its func is defined in, the files of this project's
+modules that file imports (e.g. visualization/decimate.py), and any
+code_files given to the task. So editing the plotting code, or a helper
+it draws with, redraws those figures. The manifest keeps each figure's
+last key, plus the size, mtime and hash of every input seen, so
+unchanged inputs aren't re-read.
+See results/make_figures.py.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import sys
+import tempfile
+import time
+import concurrent.futures
+from trajectories import run_file
+
+class FigureTask:
+    # One figure: func(*inputs, **kwargs) -> Figure, saved to each of
+    # outputs (the format from the extension) with savefig_kwargs.
+    # code_files are more source files the figure depends on, that
+    # get_code_files doesn't find.
+
+    def __init__(self, name, func, inputs, outputs, kwargs=None, savefig_kwargs=None,
+                 code_files=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.kwargs = {} if kwargs is None else dict(kwargs)
+        self.savefig_kwargs = {} if savefig_kwargs is None else dict(savefig_kwargs)
+        self.code_files = [] if code_files is None else list(code_files)
+
+    # The task's key, given the hashes of its inputs (same order.)
+    def get_key(self, input_hashes):
+        code_files = get_code_files(self.func) + [os.path.abspath(f) for f in self.code_files]
+        spec = {'name':self.name, 'func':self.func.__module__ + '.' + self.func.__qualname__,
+                'code':[get_file_hash(f) for f in sorted(set(code_files))],
+                'kwargs':run_file.to_json_types(self.kwargs),
+                'savefig_kwargs':run_file.to_json_types(self.savefig_kwargs),
+                'outputs':self.outputs, 'inputs':input_hashes}
+        text = json.dumps(spec, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+# The source files func's figures depend on: the file it's defined in,
+# and those of the modules of this project (the directory above
+# visualization/) that file imports, or imports functions and classes
+# from, except this one.
+def get_code_files(func):
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+    files = [os.path.abspath(inspect.getsourcefile(func))]
+    for value in func.__globals__.values():
+        if inspect.isfunction(value) or inspect.isclass(value):
+            value = sys.modules.get(value.__module__, None)
+        if not inspect.ismodule(value) or value is sys.modules[__name__]:
+            continue
+        filename = getattr(value, '__file__', None)
+        if filename is not None and os.path.abspath(filename).startswith(base):
+            files.append(os.path.abspath(filename))
+    return sorted(set(files))
+
+# sha256 of a file's contents.
+def get_file_hash(filename, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# Render one task. Runs in a worker. Returns (name, seconds taken.)
+def render_task(task):
+    start = time.time()
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig = task.func(*task.inputs, **task.kwargs)
+    for output in task.outputs:
+        out_dir = os.path.dirname(os.path.abspath(output))
+        os.makedirs(out_dir, exist_ok=True)
+        fig.savefig(output, **task.savefig_kwargs)
+    plt.close(fig)
+    return (task.name, time.time() - start)
+
+class FigurePipeline:
+    # Tasks with unique names, and the manifest file (JSON) of what was
+    # rendered from what.
+
+    def __init__(self, manifest_filename):
+        self.manifest_filename = manifest_filename
+        self.tasks = {}
+        self.manifest = {'figures':{}, 'files':{}}
+        if os.path.exists(manifest_filename):
+            with open(manifest_filename) as f:
+                self.manifest = json.load(f)
+
+    def add(self, task):
+        if task.name in self.tasks:
+            raise Exception('There is already a figure named ' + task.name + '.')
+        self.tasks[task.name] = task
+
+    # The hash of an input, re-read only if its size or mtime changed.
+    def get_input_hash(self, filename):
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        seen = self.manifest['files'].get(path, None)
+        if seen is not None and seen[0] == stat.st_size and seen[1] == stat.st_mtime_ns:
+            return seen[2]
+        digest = get_file_hash(path)
+        self.manifest['files'][path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    # The names of the tasks to render, with their keys: those whose key
+    # changed or whose outputs are missing (all of them with force.)
+    def get_stale(self, names=None, force=False):
+        stale = {}
+        for name in (self.tasks if names is None else names):
+            task = self.tasks[name]
+            key = task.get_key([self.get_input_hash(f) for f in task.inputs])
+            if force or self.manifest['figures'].get(name, None) != key or \
+               not all(os.path.exists(out) for out in task.outputs):
+                stale[name] = key
+        return stale
+
+    # Render the stale figures (or only those in names) on num_workers
+    # processes (None is one per core, 1 renders here.) The manifest is
+    # updated for every figure that rendered; if any failed, raises after.
+    # Returns (rendered names, skipped names.)
+    def run(self, names=None, num_workers=None, force=False, verbose=True):
+        start = time.time()
+        stale = self.get_stale(names, force)
+        skipped = [name for name in (self.tasks if names is None else names) if name not in stale]
+        rendered = []
+        failed = {}
+        if num_workers == 1:
+            for name in stale:
+                try:
+                    self._done(render_task(self.tasks[name]), stale, rendered, verbose)
+                except Exception as err:
+                    failed[name] = err
+        elif len(stale) > 0:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as pool:
+                futures = {pool.submit(render_task, self.tasks[name]): name for name in stale}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        self._done(future.result(), stale, rendered, verbose)
+                    except Exception as err:
+                        failed[futures[future]] = err
+        self.save_manifest()
+        if verbose:
+            print(str(len(rendered)) + ' figures rendered, ' + str(len(skipped))
+                  + ' up to date, in ' + '{:.1f}'.format(time.time() - start) + ' s')
+        if len(failed) > 0:
+            raise Exception('Figures failed: ' + '; '.join(name + ': ' + repr(err)
+                                                           for name, err in failed.items()))
+        return rendered, skipped
+
+    # A helper: record a rendered figure.
+    def _done(self, result, stale, rendered, verbose):
+        name, seconds = result
+        self.manifest['figures'][name] = stale[name]
+        rendered.append(name)
+        if verbose:
+            print(name + ' (' + '{:.2f}'.format(seconds) + ' s)')
+
+    # Write the manifest, through a temporary file.
+    def save_manifest(self):
+        directory = os.path.dirname(os.path.abspath(self.manifest_filename))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_filename = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_filename, self.manifest_filename)
@@ -0,0 +1,210 @@
+"""
+A self-contained HTML viewer of a run, with plotly.
+
+The page has the anchors (and box edges), the particle's path, and a
+slider / play button over keyframes that moves the mass and redraws the
+cables, coloured slack or taut from the run's slack log
+(trajectories/slack_log.py, as the animations colour them), plus V and
+the cable forces against time with a marker at the current keyframe.
+The 3D scene and the 2D plots are WebGL traces (scatter3d, scattergl),
+the path and the 2D series are decimated by min/max (decimate.py, so
+their peaks stay), and only every stride-th step is a keyframe, so
+100k-step runs scrub smoothly. plotly.js is written into the file, so it
+opens offline, in any browser, with no Python:
+    html_viewer.export_run_viewer('results/runs/box/D.npz', 'box_D.html',
+                                  box_edges=video_export.BOX_EDGES)
+or export_viewer.py for many runs.
+"""
+
+# need to do linear alg
+import numpy as np
+from visualization import decimate
+from trajectories import run_file
+from trajectories import slack_log as slack_logs
+
+# plotly is optional, only the viewer needs it.
+try:
+    import plotly.graph_objs as go
+    from plotly.subplots import make_subplots
+except ImportError:
+    go = None
+
+# The indices of at most num_keyframes states out of num_states, evenly
+# spaced, with the first and last.
+def get_keyframes(num_states, num_keyframes):
+    if num_states <= num_keyframes:
+        return np.arange(num_states)
+    return np.unique(np.linspace(0, num_states - 1, num_keyframes).round().astype(np.int64))
+
+# A helper: the cables at state index i, as one line with gaps (None)
+# between cables, and a colour value per vertex (1 slack, 0 taut.)
+def _get_cable_lines(pos, anchor_array, slack):
+    n = anchor_array.shape[0]
+    xyz = np.full((3*n, 3), np.nan)
+    xyz[0::3] = anchor_array
+    xyz[1::3] = pos
+    color = np.repeat(slack.astype(float), 3)
+    coords = [[None if np.isnan(v) else float(v) for v in xyz[:, j]] for j in range(3)]
+    return coords, color
+
+# The indices of at most max_points states on the path: the min and max
+# of each coordinate over buckets of time (decimate.py), so the path's
+# turning points are kept. The coordinates' points mostly coincide, so
+# each gets all of max_points, halved until their union fits.
+def get_path_indices(state, max_points):
+    series = [decimate.DecimatedSeries(np.arange(state.shape[0]), state[:, j])
+              for j in range(3)]
+    budget = max_points
+    while True:
+        idx = np.unique(np.concatenate([s.get_indices(budget) for s in series]))
+        if len(idx) <= max_points or budget <= 2:
+            return idx
+        budget //= 2
+
+# The viewer for a run: state (T+1, 6), cables 'tags' with 'anchors'
+# (dict tag -> 3-vector), and the timestep dt. slack_log (a
+# slack_log.SlackLog of the run) colours the cables; without one, it's
+# built from force (force <= bound is slack), if given. force (T, n) and
+# V (T+1,) are plotted, if given. num_keyframes is the number of slider
+# positions, max_points the number of points per decimated series.
+# Returns the plotly Figure.
+def make_figure(state, tags, anchors, dt, force=None, V=None, bound=1E-10,
+                num_keyframes=500, max_points=4000, box_edges=None, equilibrium=None,
+                slack_color='red', taut_color='green', title='Cable-driven robot (particle)',
+                slack_log=None):
+    if go is None:
+        raise Exception('The HTML viewer needs plotly (pip install plotly).')
+    state = np.asarray(state)
+    anchor_array = np.array([anchors[tag] for tag in tags], dtype=float)
+    num_states = state.shape[0]
+    times = dt * np.arange(num_states)
+    keyframes = get_keyframes(num_states, num_keyframes)
+    if force is not None:
+        force = np.asarray(force)
+    # which cables are slack at each keyframe, (K, n). The state at index
+    # i is at time i dt, and the last one keeps the last step's colours.
+    if slack_log is None and force is not None and force.shape[0] > 0:
+        slack_log = slack_logs.SlackLog.from_forces(force, dt, tags, bound)
+    if slack_log is None:
+        slack = np.zeros((len(keyframes), len(tags)), dtype=bool)
+    else:
+        order = [slack_log.tags.index(tag) for tag in tags]
+        slack = slack_log.is_slack(dt * np.minimum(keyframes, max(num_states - 2, 0)))[order].T
+    plots_2d = [name for name, series in (('V', V), ('force', force)) if series is not None]
+    if len(plots_2d) > 0:
+        specs = [[{'type':'scene', 'rowspan':len(plots_2d)}, {'type':'xy'}]]
+        specs += [[None, {'type':'xy'}] for _ in plots_2d[1:]]
+        fig = make_subplots(rows=len(plots_2d), cols=2, specs=specs, column_widths=[0.6, 0.4],
+                            subplot_titles=[''] + [name for name in plots_2d])
+    else:
+        fig = make_subplots(rows=1, cols=1, specs=[[{'type':'scene'}]])
+    # the static parts: anchors, box edges, equilibrium, path.
+    fig.add_trace(go.Scatter3d(x=anchor_array[:, 0], y=anchor_array[:, 1],
+                               z=anchor_array[:, 2], mode='markers+text', text=list(tags),
+                               marker={'size':4, 'color':'black', 'symbol':'diamond'},
+                               name='anchors'), row=1, col=1)
+    if box_edges is not None:
+        edge_xyz = [[], [], []]
+        for tag1, tag2 in box_edges:
+            for j in range(3):
+                edge_xyz[j] += [anchors[tag1][j], anchors[tag2][j], None]
+        fig.add_trace(go.Scatter3d(x=edge_xyz[0], y=edge_xyz[1], z=edge_xyz[2], mode='lines',
+                                   line={'color':'black', 'width':2}, name='box',
+                                   hoverinfo='skip'), row=1, col=1)
+    if equilibrium is not None:
+        fig.add_trace(go.Scatter3d(x=[equilibrium[0]], y=[equilibrium[1]], z=[equilibrium[2]],
+                                   mode='markers+text', text=['eq'], name='equilibrium',
+                                   marker={'size':4, 'color':'magenta'}), row=1, col=1)
+    path = get_path_indices(state, max_points)
+    fig.add_trace(go.Scatter3d(x=state[path, 0], y=state[path, 1], z=state[path, 2],
+                               mode='lines', line={'color':'blue', 'width':2}, opacity=0.5,
+                               name='path', hoverinfo='skip'), row=1, col=1)
+    # the animated parts: mass, cables, and the markers on the 2D plots.
+    i0 = keyframes[0]
+    animated = []
+    animated.append(len(fig.data))
+    fig.add_trace(go.Scatter3d(x=[state[i0, 0]], y=[state[i0, 1]], z=[state[i0, 2]],
+                               mode='markers', marker={'size':6, 'color':'blue'},
+                               name='mass'), row=1, col=1)
+    coords, color = _get_cable_lines(state[i0, 0:3], anchor_array, slack[0])
+    colorscale = [[0., taut_color], [1., slack_color]]
+    animated.append(len(fig.data))
+    fig.add_trace(go.Scatter3d(x=coords[0], y=coords[1], z=coords[2], mode='lines',
+                               line={'color':color, 'colorscale':colorscale, 'cmin':0.,
+                                     'cmax':1., 'width':4},
+                               name='cables', hoverinfo='skip'), row=1, col=1)
+    markers = []
+    for row, name in enumerate(plots_2d):
+        if name == 'V':
+            x, y = decimate.DecimatedSeries(times, V).get_points(max_points)
+            fig.add_trace(go.Scattergl(x=x, y=y, mode='lines', name='V'), row=row+1, col=2)
+            get_y = lambda i: [float(V[i])]
+        else:
+            for c, tag in enumerate(tags):
+                x, y = decimate.DecimatedSeries(times[0:force.shape[0]],
+                                                force[:, c]).get_points(max_points)
+                fig.add_trace(go.Scattergl(x=x, y=y, mode='lines', name=tag),
+                              row=row+1, col=2)
+            get_y = lambda i: [float(np.max(force[min(i, force.shape[0] - 1)]))]
+        markers.append(get_y)
+        animated.append(len(fig.data))
+        fig.add_trace(go.Scattergl(x=[times[i0]], y=get_y(i0), mode='markers',
+                                   marker={'size':9, 'color':'black'}, showlegend=False,
+                                   hoverinfo='skip'), row=row+1, col=2)
+        fig.update_xaxes(title_text='Time (sec)', row=row+1, col=2)
+    # one frame per keyframe, with only the animated traces' data.
+    frames = []
+    for k, i in enumerate(keyframes):
+        coords, color = _get_cable_lines(state[i, 0:3], anchor_array, slack[k])
+        data = [go.Scatter3d(x=[state[i, 0]], y=[state[i, 1]], z=[state[i, 2]]),
+                go.Scatter3d(x=coords[0], y=coords[1], z=coords[2],
+                             line={'color':color, 'colorscale':colorscale,
+                                   'cmin':0., 'cmax':1., 'width':4})]
+        data += [go.Scattergl(x=[times[i]], y=get_y(i)) for get_y in markers]
+        frames.append(go.Frame(data=data, traces=animated, name=str(i)))
+    fig.frames = frames
+    # scene limits from the anchors, so the view doesn't jump around.
+    points = np.vstack((anchor_array, state[path, 0:3]))
+    margin = 0.1 * np.max(np.ptp(points, axis=0))
+    low = np.min(points, axis=0) - margin
+    high = np.max(points, axis=0) + margin
+    fig.update_scenes(xaxis={'range':[low[0], high[0]], 'title':'X (m)'},
+                      yaxis={'range':[low[1], high[1]], 'title':'Y (m)'},
+                      zaxis={'range':[low[2], high[2]], 'title':'Z (m)'},
+                      aspectmode='cube')
+    frame_args = {'frame':{'duration':0, 'redraw':True}, 'mode':'immediate',
+                  'transition':{'duration':0}}
+    play_args = {'frame':{'duration':30, 'redraw':True}, 'fromcurrent':True,
+                 'transition':{'duration':0}}
+    steps = [{'args':[[str(i)], frame_args], 'label':'{:.2f}'.format(times[i]),
+              'method':'animate'} for i in keyframes]
+    fig.update_layout(title=title, height=700,
+                      sliders=[{'steps':steps, 'currentvalue':{'prefix':'t = ', 'suffix':' s'},
+                                'pad':{'t':30}}],
+                      updatemenus=[{'type':'buttons', 'direction':'left', 'x':0., 'y':0.,
+                                    'xanchor':'right', 'yanchor':'top', 'pad':{'t':30},
+                                    'buttons':[{'label':'Play', 'method':'animate',
+                                                'args':[None, play_args]},
+                                               {'label':'Pause', 'method':'animate',
+                                                'args':[[None], frame_args]}]}])
+    return fig
+
+# Write a figure as one HTML file with plotly.js inside (works offline.)
+def write_viewer(fig, filename):
+    fig.write_html(filename, include_plotlyjs=True, full_html=True, auto_play=False,
+                   config={'scrollZoom':True, 'displaylogo':False})
+    return filename
+
+# The viewer for a run file (trajectories/run_file.py), written to
+# filename. Keyword arguments go to make_figure; the equilibrium and the
+# slack log are the run's, if it has them.
+def export_run_viewer(run_filename, filename, **kwargs):
+    run = run_file.load_run(run_filename)
+    kwargs.setdefault('equilibrium', run.metadata.get('equilibrium', None))
+    kwargs.setdefault('bound', run.metadata.get('eps', 1E-10))
+    if 'slack_log' not in kwargs and ('slack_starts' in run or 'force' in run):
+        kwargs['slack_log'] = slack_logs.SlackLog.from_run(run)
+    fig = make_figure(run['state'], run.metadata['cable_tags'], run.get_cable_anchors(),
+                      run.metadata['dt'], force=run['force'] if 'force' in run else None,
+                      V=run['V'] if 'V' in run else None, **kwargs)
+    return write_viewer(fig, filename)
@@ -0,0 +1,221 @@
+"""
+Headless, parallel export of cable animations to MP4.
+
+ani.save() renders every frame one after another through FuncAnimation,
+and can't run while the interactive window is open. Here the frame range
+is split into contiguous chunks, one per worker process; each worker
+builds its own figure on an off-screen Agg canvas, draws its frames, and
+pipes the raw RGBA pixels straight into its own ffmpeg process, which
+encodes one segment. The segments are then joined by ffmpeg's concat
+demuxer without re-encoding. Example, a run file on all cores:
+    video_export.export_run_video('results/runs/box/D.npz', 'box_D.mp4',
+                                  scene_kwargs={'stride':5, 'box_edges':BOX_EDGES})
+or for many runs at once, export_videos.py.
+
+The scene is built in each worker by a top-level function (so it can be
+sent to the worker by name) that returns (fig, renderer), where renderer
+has num_frames and draw_frame(i), like cable_animation.CableAnimation.
+It's called with frame_range=(first, last), the frames that worker draws,
+so it only needs to prepare those. To split the frames, the scene
+function's get_num_frames attribute (a function of the same keyword
+arguments) counts them without building the scene; without one, the
+scene is built here once to count them. make_run_scene does all that
+for a run file (trajectories/run_file.py.)
+
+ffmpeg is found like matplotlib finds it: rcParams['animation.ffmpeg_path'],
+which is 'ffmpeg' on the PATH unless set.
+"""
+
+# need to do linear alg
+import numpy as np
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import concurrent.futures
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from visualization import cable_animation
+from trajectories import run_file
+from trajectories import slack_log
+
+# The box's edges, as pairs of anchor tags (as in simulation_particle_box_3D.py.)
+BOX_EDGES = [['A','B'], ['B','C'], ['C','D'], ['D','A'],
+             ['E','F'], ['F','G'], ['G','H'], ['H','E'],
+             ['A','E'], ['B','F'], ['C','G'], ['D','H']]
+
+def get_ffmpeg_path():
+    return matplotlib.rcParams['animation.ffmpeg_path']
+
+# A scene for a run file: anchors, optional box edges and equilibrium,
+# the starting point, and the animated cables / mass / path, for the
+# frames in frame_range (default all.) The run's arrays are memory-mapped
+# and the renderer only prepares those frames, so a worker only reads the
+# states it draws (and the path up to them.)
+# With color_slack, cables are coloured by the run's slack log (or its
+# forces vs. its eps, for runs saved without one.)
+def make_run_scene(filename, stride=1, elev=16., azim=-70., limits=None,
+                   box_edges=None, equilibrium=None, color_slack=True,
+                   figsize=(6.4, 4.8), dpi=100,
+                   title='Cable-driven robot (particle) position, closed-loop control',
+                   frame_range=None):
+    run = run_file.load_run(filename)
+    state = run['state']
+    tags = run.metadata['cable_tags']
+    anchors = run.get_cable_anchors()
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111, projection='3d')
+    ax.view_init(elev=elev, azim=azim)
+    for tag in tags:
+        anch = anchors[tag]
+        ax.scatter(anch[0], anch[1], anch[2], s=60, color='black', marker='v')
+    if box_edges is not None:
+        for tag1, tag2 in box_edges:
+            edge = np.array([anchors[tag1], anchors[tag2]])
+            ax.plot(edge[:, 0], edge[:, 1], edge[:, 2], color='black')
+        ax.grid(False)
+    if equilibrium is not None:
+        ax.scatter(equilibrium[0], equilibrium[1], equilibrium[2], color='m', marker='o')
+        ax.text(equilibrium[0], equilibrium[1], equilibrium[2], 'eq')
+    ax.scatter(state[0, 0], state[0, 1], state[0, 2], color='blue', marker='o', s=60)
+    ax.text(state[0, 0], state[0, 1], state[0, 2], 't0')
+    if limits is None:
+        # the anchors, with a bit of room.
+        points = np.array([anchors[tag] for tag in tags])
+        margin = 0.1 * np.max(np.ptp(points, axis=0))
+        limits = list(zip(np.min(points, axis=0) - margin, np.max(points, axis=0) + margin))
+    ax.set_xlim(*limits[0])
+    ax.set_ylim(*limits[1])
+    ax.set_zlim(*limits[2])
+    ax.set(xlabel='Pos, X (m)', ylabel='Pos, Y (m)', zlabel='Pos, Z (m)', title=title)
+    log = None
+    if color_slack and ('slack_starts' in run or 'force' in run):
+        log = slack_log.SlackLog.from_run(run)
+    renderer = cable_animation.CableAnimation(ax, state, tags, anchors, slack_log=log,
+                                              stride=stride, frame_range=frame_range)
+    return fig, renderer
+
+# The number of frames make_run_scene has, from the shape of the run's
+# state history (its data isn't read.)
+def get_run_num_frames(filename, stride=1, **scene_kwargs):
+    num_states = run_file.load_run(filename)['state'].shape[0]
+    return len(cable_animation.get_frames(num_states, stride))
+
+make_run_scene.get_num_frames = get_run_num_frames
+
+# A helper: start an ffmpeg process that reads raw RGBA frames of
+# width x height from stdin, and writes H.264 to filename.
+def _open_ffmpeg(filename, width, height, fps, bitrate, ffmpeg_path):
+    command = [ffmpeg_path, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', str(width) + 'x' + str(height),
+               '-r', str(fps), '-i', '-',
+               # H.264 with yuv420p needs even dimensions.
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+               '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-b:v', str(bitrate) + 'k',
+               filename]
+    return subprocess.Popen(command, stdin=subprocess.PIPE)
+
+# Render frames [first, last) of a scene into one video segment. Runs in
+# a worker. Returns (segment filename, number of frames, seconds taken.)
+def render_segment(scene_func, scene_kwargs, first, last, segment_filename,
+                   fps=15, bitrate=1800, ffmpeg_path='ffmpeg'):
+    start = time.time()
+    fig, renderer = scene_func(frame_range=(first, last), **scene_kwargs)
+    canvas = fig.canvas
+    canvas.draw()
+    width, height = canvas.get_width_height(physical=True)
+    proc = _open_ffmpeg(segment_filename, width, height, fps, bitrate, ffmpeg_path)
+    try:
+        for i in range(first, last):
+            renderer.draw_frame(i)
+            canvas.draw()
+            proc.stdin.write(canvas.buffer_rgba())
+    finally:
+        proc.stdin.close()
+        if proc.wait() != 0:
+            raise Exception('ffmpeg failed on ' + segment_filename)
+    return (segment_filename, last - first, time.time() - start)
+
+# Join segments into filename, in order, without re-encoding.
+def concat_segments(segment_filenames, filename, ffmpeg_path='ffmpeg'):
+    list_filename = filename + '.segments.txt'
+    with open(list_filename, 'w') as f:
+        for segment in segment_filenames:
+            f.write("file '" + os.path.abspath(segment).replace("'", "'\\''") + "'\n")
+    try:
+        subprocess.run([ffmpeg_path, '-y', '-loglevel', 'error', '-f', 'concat',
+                        '-safe', '0', '-i', list_filename, '-c', 'copy', filename],
+                       check=True)
+    finally:
+        os.remove(list_filename)
+
+# Export scenes to MP4s. jobs is a list of (scene_func, scene_kwargs,
+# filename). Every video's frames are split into num_segments chunks
+# (default: one per worker), all the chunks of all the videos are
+# rendered in one pool of num_workers processes (None is one per core,
+# 1 renders here), then each video's chunks are joined.
+def export_videos(jobs, fps=15, bitrate=1800, num_workers=None, num_segments=None,
+                  verbose=True):
+    ffmpeg_path = get_ffmpeg_path()
+    if shutil.which(ffmpeg_path) is None:
+        raise Exception('ffmpeg not found (' + ffmpeg_path + "), install it or set "
+                        "matplotlib.rcParams['animation.ffmpeg_path'].")
+    start = time.time()
+    if num_workers is None:
+        num_workers = os.cpu_count()
+    if num_segments is None:
+        num_segments = num_workers
+    tmp_dirs = []
+    args = []
+    segments = []
+    try:
+        for scene_func, scene_kwargs, filename in jobs:
+            # the number of frames, without building the scene if it can.
+            if hasattr(scene_func, 'get_num_frames'):
+                num_frames = scene_func.get_num_frames(**scene_kwargs)
+            else:
+                num_frames = scene_func(**scene_kwargs)[1].num_frames
+            k = max(1, min(num_segments, num_frames))
+            bounds = np.linspace(0, num_frames, k + 1).astype(int)
+            tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                       prefix='.segments_')
+            tmp_dirs.append(tmp_dir)
+            segments.append([os.path.join(tmp_dir, 'segment_' + str(j) + '.mp4')
+                             for j in range(k)])
+            args += [(scene_func, scene_kwargs, bounds[j], bounds[j+1], segments[-1][j],
+                      fps, bitrate, ffmpeg_path) for j in range(k)]
+        if num_workers == 1:
+            for a in args:
+                render_segment(*a)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as pool:
+                futures = [pool.submit(render_segment, *a) for a in args]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+        for (_, _, filename), video_segments in zip(jobs, segments):
+            concat_segments(video_segments, filename, ffmpeg_path)
+    finally:
+        for tmp_dir in tmp_dirs:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    if verbose:
+        print(str(len(jobs)) + ' videos, ' + str(len(args)) + ' segments in '
+              + '{:.1f}'.format(time.time() - start) + ' s')
+    return [job[2] for job in jobs]
+
+# Export one scene to an MP4 (see export_videos.)
+def export_video(scene_func, scene_kwargs, filename, fps=15, bitrate=1800,
+                 num_workers=None, num_segments=None, verbose=True):
+    return export_videos([(scene_func, scene_kwargs, filename)], fps, bitrate,
+                         num_workers, num_segments, verbose)[0]
+
+# Shortcut: export a run file with make_run_scene.
+def export_run_video(run_filename, filename, scene_kwargs=None, fps=15, bitrate=1800,
+                     num_workers=None, verbose=True):
+    kwargs = {'filename':run_filename}
+    if scene_kwargs is not None:
+        kwargs.update(scene_kwargs)
+    return export_video(make_run_scene, kwargs, filename, fps, bitrate,
+                        num_workers, verbose=verbose)